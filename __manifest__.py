@@ -1,6 +1,6 @@
 {
     'name': 'Sales Store Expense Report',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.2.0',
     'category': 'Sales/Reporting',
     'summary': 'Store expense category wise sales and expense reporting',
     'description': """
@@ -12,6 +12,11 @@
     'depends': ['sale', 'account', 'web'], # <-- CRITICAL FIX: ADDED 'web'
     'data': [
         'security/ir.model.access.csv', 
+        'security/sales_report_job_security.xml',
+        'security/sales_store_expense_daily_security.xml',
+        'data/ir_cron_data.xml',
+        'views/sales_report_job_views.xml',
+        'views/sales_report_run_views.xml',
         'views/sale_order_views.xml',        
         'views/report_store_expense_wizard_pdf.xml',
         'views/product_category_report_pdf.xml',
@@ -19,15 +24,19 @@
         'wizards/store_expense_report_wizard_views.xml',
         'views/sales_lines_wizard_views.xml',
         'reports/store_expense_report_templates.xml',
+        'reports/sales_report_chunk_templates.xml',
         'views/product_category_wizard_views.xml'
     ],
     'assets': {
         'web.assets_backend': [
+            'sales_store_expense_report/static/src/js/report_payload.js',
             'sales_store_expense_report/static/src/js/report_matrix_widget.js',
             'sales_store_expense_report/static/src/js/product_category_widget.js',
+            'sales_store_expense_report/static/src/js/report_job_status_widget.js',
 
             'sales_store_expense_report/static/src/xml/report_matrix_template.xml',
             'sales_store_expense_report/static/src/xml/product_category_template.xml',
+            'sales_store_expense_report/static/src/xml/report_job_status_template.xml',
         ],
     },
     'demo': [],
@@ -0,0 +1,3 @@
+from . import main
+from . import export
+from . import data
@@ -0,0 +1,74 @@
+import gzip
+import json
+
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound
+
+from odoo import http
+from odoo.http import request
+from odoo.addons.sales_store_expense_report.models.report_payload import GZIP_THRESHOLD
+from odoo.addons.sales_store_expense_report.models.sales_report_mixin import REPORT_USER_GROUP
+from odoo.addons.sales_store_expense_report.models.sales_report_run import report_run
+
+from .export import EXPORT_DATASETS
+
+# Options of the report data, besides the wizard filters
+DATA_OPTIONS = ('partner_id', 'offset', 'limit')
+
+
+class SalesReportDataController(http.Controller):
+    """
+    Read-only JSON report data for dashboards, computed from the filters given as query
+    parameters (as for the exports) on an unsaved wizard:
+
+    - ``store_expense_matrix``, ``product_category_matrix``: the encoded matrix of
+      report_payload.encode_matrix;
+    - ``sales_lines``: the preview summary with a page of customer groups (``offset``,
+      ``limit``), or with ``partner_id`` a page of the lines of that customer.
+
+    The data is the ``_get_report_api_data(**options)`` of the wizard of the dataset.
+    The response carries an ETag derived from the data version of the report (see
+    _get_report_data_etag); a request with a matching If-None-Match is answered
+    304 Not Modified without computing the report.
+
+    As for the exports, only the salesmen get the data, restricted to the orders they
+    can read.
+    """
+
+    @http.route('/sales_store_expense_report/data/<string:dataset>', type='http', auth='user', methods=['GET'])
+    def report_data(self, dataset, **params):
+        if dataset not in EXPORT_DATASETS:
+            raise NotFound()
+        # Checked first: the ETag must not tell anything to the other users either
+        if not request.env.user.has_group(REPORT_USER_GROUP):
+            raise Forbidden()
+        Wizard = request.env[EXPORT_DATASETS[dataset][0]]
+        Wizard.check_access('read')
+        try:
+            wizard = Wizard._new_from_http_params(params)
+            options = {name: int(params[name]) for name in DATA_OPTIONS if params.get(name)}
+        except ValueError as e:
+            raise BadRequest(str(e))
+        if options and dataset != 'sales_lines':
+            raise BadRequest("partner_id, offset and limit are only supported by the sales_lines data")
+
+        with report_run(wizard, 'data') as recorder:
+            etag = wizard._get_report_data_etag(**options)
+            headers = [
+                ('ETag', f'"{etag}"'),
+                # Cached by the browser, but always revalidated
+                ('Cache-Control', 'private, no-cache'),
+                ('Vary', 'Accept-Encoding'),
+            ]
+            if request.httprequest.if_none_match.contains_weak(etag):
+                recorder.extra['not_modified'] = True
+                return request.make_response(b'', headers=headers, status=304)
+
+            data = wizard._get_report_api_data(**options)
+            with wizard._report_phase('serialization'):
+                body = json.dumps(data, separators=(',', ':'), default=str).encode()
+                if len(body) > GZIP_THRESHOLD and 'gzip' in request.httprequest.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    headers.append(('Content-Encoding', 'gzip'))
+            recorder.payload_bytes = len(body)
+        headers.append(('Content-Type', 'application/json'))
+        return request.make_response(body, headers=headers)
@@ -0,0 +1,160 @@
+import csv
+import io
+import json
+import zlib
+from datetime import datetime, timezone
+
+from werkzeug.exceptions import BadRequest, Forbidden, NotFound
+
+from odoo import api, http
+from odoo.http import request, content_disposition
+from odoo.addons.sales_store_expense_report.models.sales_lines_wizard import SALES_LINES_COLUMNS
+from odoo.addons.sales_store_expense_report.models.sales_report_mixin import REPORT_USER_GROUP
+from odoo.addons.sales_store_expense_report.models.sales_report_run import report_run
+
+# Exported datasets: wizard model, and whether the rows are the detailed sales lines
+EXPORT_DATASETS = {
+    'sales_lines': ('sales.lines.report.wizard', True),
+    'store_expense_matrix': ('sales.store.expense.category.wizard', False),
+    'product_category_matrix': ('sales.product.category.wizard', False),
+}
+EXPORT_FORMATS = {
+    'csv': 'text/csv; charset=utf-8',
+    'jsonl': 'application/x-ndjson',
+}
+SALES_LINES_EXPORT_COLUMNS = ['line_id', 'write_date'] + [key for key, _label in SALES_LINES_COLUMNS] + ['expense_category_id']
+MATRIX_EXPORT_COLUMNS = ['row_id', 'row_name', 'column_id', 'column_name', 'value']
+# Size of the chunks sent to the client
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+
+def _parse_updated_since(value):
+    """ISO 8601 watermark as a naive UTC datetime (like the write_date columns)"""
+    updated_since = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if updated_since.tzinfo:
+        updated_since = updated_since.astimezone(timezone.utc).replace(tzinfo=None)
+    return updated_since
+
+
+def _iter_matrix_rows(wizard):
+    """One row per non-zero cell of the report matrix, the row totals in column 'total'"""
+    matrix = wizard._get_report_data()
+    values = matrix['values']
+    row_totals = matrix.get('row_totals', {})
+    for row in matrix['rows']:
+        for column in matrix['columns']:
+            value = values.get(f"{row['id']}_{column['id']}")
+            if value:
+                yield {
+                    'row_id': row['id'], 'row_name': row['name'],
+                    'column_id': column['id'], 'column_name': column['name'],
+                    'value': value,
+                }
+        if row_totals.get(row['id']):
+            yield {
+                'row_id': row['id'], 'row_name': row['name'],
+                'column_id': 'total', 'column_name': 'Total',
+                'value': row_totals[row['id']],
+            }
+
+
+class SalesReportExportController(http.Controller):
+    """
+    Streaming exports of the report datasets for BI ingestion, as CSV or JSON Lines.
+
+    The filters are the fields of the wizards given as query parameters (ids comma
+    separated, dates in ISO format, date_from and date_to required), e.g.::
+
+        /sales_store_expense_report/export/sales_lines.jsonl?date_from=2024-01-01&date_to=2024-12-31&company_id=1
+
+    The sales lines are read through a server-side cursor and the response is sent in
+    chunks as it is produced, gzip compressed when the client accepts it (or with
+    ``gzip=1``), so that the memory used does not depend on the size of the export.
+    ``updated_since`` (ISO datetime) only exports the sales lines written since then.
+
+    Only the salesmen can export, and only the orders they can read: the queries of the
+    wizards restrict their raw SQL to the record rules of the user.
+    """
+
+    @http.route('/sales_store_expense_report/export/<string:dataset>.<string:fmt>', type='http', auth='user', methods=['GET'])
+    def export(self, dataset, fmt, updated_since=None, gzip=None, **params):
+        if dataset not in EXPORT_DATASETS or fmt not in EXPORT_FORMATS:
+            raise NotFound()
+        if not request.env.user.has_group(REPORT_USER_GROUP):
+            raise Forbidden()
+        model, is_lines = EXPORT_DATASETS[dataset]
+        Wizard = request.env[model]
+        Wizard.check_access('read')
+
+        # Validate everything before the response starts: errors can no longer be reported after
+        try:
+            wizard = Wizard._new_from_http_params(params)
+            if updated_since is not None:
+                if not is_lines:
+                    raise ValueError("updated_since is only supported by the sales_lines export")
+                updated_since = _parse_updated_since(updated_since)
+        except ValueError as e:
+            raise BadRequest(str(e))
+
+        compress = gzip in ('1', 'true') or 'gzip' in request.httprequest.headers.get('Accept-Encoding', '')
+        filename = f'{dataset}_{wizard.date_from}_{wizard.date_to}.{fmt}'
+        headers = [
+            ('Content-Type', EXPORT_FORMATS[fmt]),
+            ('Content-Disposition', content_disposition(filename)),
+            ('Cache-Control', 'no-store'),
+        ]
+        if compress:
+            headers.append(('Content-Encoding', 'gzip'))
+        body = self._generate_export(
+            request.env.registry, request.env.uid, dict(request.env.context),
+            model, params, fmt, updated_since, compress,
+        )
+        return request.make_response(body, headers=headers)
+
+    @staticmethod
+    def _generate_export(registry, uid, context, model, params, fmt, updated_since, compress):
+        """
+        Produce the export body by chunks. The generator is consumed after the request
+        cursor is closed, so it works in its own cursor and environment.
+        """
+        encoder = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None
+        buffer = io.StringIO()
+
+        def flush():
+            data = buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+            return encoder.compress(data) if encoder else data
+
+        with registry.cursor() as cr:
+            env = api.Environment(cr, uid, context)
+            Wizard = env[model]
+            wizard = Wizard._new_from_http_params(params)
+            is_lines = model == 'sales.lines.report.wizard'
+            columns = SALES_LINES_EXPORT_COLUMNS if is_lines else MATRIX_EXPORT_COLUMNS
+            writer = None
+            if fmt == 'csv':
+                writer = csv.DictWriter(buffer, fieldnames=columns, extrasaction='ignore')
+                writer.writeheader()
+
+            with report_run(wizard, f'export_{fmt}') as recorder:
+                rows = wizard._iter_export_rows(updated_since) if is_lines else _iter_matrix_rows(wizard)
+                count = size = 0
+                for row in rows:
+                    if writer:
+                        writer.writerow(row)
+                    else:
+                        buffer.write(json.dumps({key: row.get(key) for key in columns}, default=str))
+                        buffer.write('\n')
+                    count += 1
+                    if buffer.tell() >= EXPORT_CHUNK_SIZE:
+                        chunk = flush()
+                        size += len(chunk)
+                        if chunk:
+                            yield chunk
+                chunk = flush() + (encoder.flush() if encoder else b'')
+                size += len(chunk)
+                recorder.rows = max(recorder.rows, count)
+                recorder.payload_bytes = size
+                recorder.extra['exported_rows'] = count
+            yield chunk
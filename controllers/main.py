@@ -0,0 +1,86 @@
+import os
+import tempfile
+
+from werkzeug.exceptions import NotFound
+from werkzeug.wsgi import wrap_file
+
+from odoo import http
+from odoo.http import request, content_disposition
+from odoo.addons.sales_store_expense_report.models.matrix_export import EXPORT_MIMETYPES
+from odoo.addons.sales_store_expense_report.models.sales_report_export_store import EXPORT_FILE_MIMETYPES
+from odoo.addons.sales_store_expense_report.models.sales_report_job import XLSX_MIMETYPE
+from odoo.addons.sales_store_expense_report.models.sales_report_run import report_run
+
+# Wizards whose matrix exports are generated by the download route
+MATRIX_DOWNLOAD_MODELS = ('sales.store.expense.category.wizard', 'sales.product.category.wizard')
+
+
+def _stream_file(path, filename, mimetype, remove=False):
+    """Stream a file as a download; with ``remove``, the file is removed once opened"""
+    file = open(path, 'rb')
+    size = os.fstat(file.fileno()).st_size
+    if remove:
+        os.unlink(path)
+    headers = [
+        ('Content-Type', mimetype),
+        ('Content-Length', size),
+        ('Content-Disposition', content_disposition(filename)),
+    ]
+    return request.make_response(wrap_file(request.httprequest.environ, file), headers=headers)
+
+
+class SalesStoreExpenseReportController(http.Controller):
+
+    @http.route('/sales_store_expense_report/sales_lines/xlsx/<int:wizard_id>', type='http', auth='user')
+    def sales_lines_xlsx(self, wizard_id, **kwargs):
+        """Detailed sales lines XLSX, written in constant memory to a temporary file"""
+        wizard = request.env['sales.lines.report.wizard'].browse(wizard_id).exists()
+        if not wizard:
+            raise NotFound()
+        wizard.check_access('read')
+
+        fd, path = tempfile.mkstemp(suffix='.xlsx', prefix='sales_lines_')
+        os.close(fd)
+        try:
+            with report_run(wizard, 'xlsx'):
+                wizard._write_sales_lines_xlsx(path)
+        except Exception:
+            os.unlink(path)
+            raise
+        filename = f'Sales_Lines_Report_{wizard.date_from}_{wizard.date_to}.xlsx'
+        return _stream_file(path, filename, XLSX_MIMETYPE, remove=True)
+
+    @http.route('/sales_store_expense_report/download/<string:model>/<int:wizard_id>.<string:export_format>',
+                type='http', auth='user')
+    def matrix_download(self, model, wizard_id, export_format, **kwargs):
+        """
+        XLSX / CSV / ODS export of a matrix wizard, written to a temporary file and streamed
+        from it, without being stored
+        """
+        if model not in MATRIX_DOWNLOAD_MODELS or export_format not in EXPORT_MIMETYPES:
+            raise NotFound()
+        wizard = request.env[model].browse(wizard_id).exists()
+        if not wizard:
+            raise NotFound()
+        wizard.check_access('read')
+
+        fd, path = tempfile.mkstemp(suffix=f'.{export_format}', prefix='sales_report_matrix_')
+        os.close(fd)
+        try:
+            with report_run(wizard, export_format):
+                wizard._build_xlsx_report(export_format, path=path)
+                wizard._report_metrics(payload_bytes=os.path.getsize(path))
+        except Exception:
+            os.unlink(path)
+            raise
+        filename = wizard._get_xlsx_file_name(export_format)
+        return _stream_file(path, filename, EXPORT_MIMETYPES[export_format], remove=True)
+
+    @http.route('/sales_store_expense_report/export_file/<string:token>', type='http', auth='user')
+    def export_file(self, token, filename='report', **kwargs):
+        """Report kept in the export storage (sales.report.export.store), until it expires"""
+        path = request.env['sales.report.export.store']._get_path(token)
+        if not path:
+            raise NotFound()
+        mimetype = EXPORT_FILE_MIMETYPES.get(filename.rpartition('.')[2].lower(), 'application/octet-stream')
+        return _stream_file(path, filename, mimetype)
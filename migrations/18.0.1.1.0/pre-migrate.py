@@ -0,0 +1,51 @@
+import logging
+
+from odoo.sql_db import db_connect
+
+_logger = logging.getLogger(__name__)
+
+# Reporting indexes of 18.0.1.1.0: (name, table, definition). The names of the field
+# indexes are the ones the ORM gives them, so that the module update finds them created.
+INDEXES = [
+    ('store_expense_company_date_index', 'store_expense',
+     'ON store_expense (company_id, date)'),
+    ('store_expense_company_category_date_index', 'store_expense',
+     'ON store_expense (company_id, category_id, date)'),
+    ('store_expense__location_id_index', 'store_expense',
+     'ON store_expense USING btree (location_id)'),
+    ('store_expense__customer_id_index', 'store_expense',
+     'ON store_expense USING btree (customer_id) WHERE customer_id IS NOT NULL'),
+    ('sale_order_line__store_expense_id_index', 'sale_order_line',
+     'ON sale_order_line USING btree (store_expense_id) WHERE store_expense_id IS NOT NULL'),
+    ('sale_order_report_company_date_index', 'sale_order',
+     "ON sale_order (company_id, date_order) WHERE state IN ('sale', 'done')"),
+]
+
+
+def migrate(cr, version):
+    """
+    Create the reporting indexes with CREATE INDEX CONCURRENTLY so that existing
+    databases keep accepting orders while they are built. CONCURRENTLY cannot run in
+    a transaction and waits for every older transaction, including the one of the
+    upgrade: commit it first and build the indexes on an autocommit connection.
+    """
+    if not version:
+        return
+    cr.commit()
+    with db_connect(cr.dbname).cursor() as index_cr:
+        index_cr._cnx.autocommit = True
+        for name, table, definition in INDEXES:
+            # An interrupted concurrent build leaves an invalid index behind
+            index_cr.execute("""
+                SELECT i.indisvalid
+                  FROM pg_index i
+                  JOIN pg_class c ON c.oid = i.indexrelid
+                 WHERE c.relname = %s
+            """, (name,))
+            row = index_cr.fetchone()
+            if row and row[0]:
+                continue
+            if row:
+                index_cr.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+            _logger.info("Creating index %s on %s", name, table)
+            index_cr.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" {definition}')
@@ -0,0 +1,27 @@
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """
+    The generated reports are no longer stored as attachments (exports are streamed,
+    kept files go to sales.report.export.store): remove the attachments of the former
+    job results and report downloads. The former product category exports were not
+    linked to a record and cannot be told apart from the user's files: they are kept.
+    """
+    if not version:
+        return
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    Attachment = env['ir.attachment']
+    attachments = Attachment.search([
+        ('res_model', 'in', ('sales.report.job', 'sales.lines.report.wizard', 'sales.store.expense.category.wizard')),
+    ])
+    attachments |= Attachment.search([
+        ('res_model', '=', 'store.expense.report.download'),
+        ('res_field', '=', 'excel_file'),
+    ])
+    _logger.info("Removing %s stored report attachments", len(attachments))
+    attachments.unlink()
@@ -1,5 +1,13 @@
+from . import sales_report_mixin
+from . import sales_report_job
 from . import store_expense_models
 from . import store_expense_report_wizard
 from . import product_category_wizard
 from . import sales_lines_wizard
 from . import sale_order
+from . import sales_daily_aggregate
+from . import sales_report_cache
+from . import sales_report_run
+from . import sales_report_pdf
+from . import sales_report_export_store
+from . import sales_report_benchmark
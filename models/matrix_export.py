@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+"""
+Bulk export of the report matrices to XLSX, CSV and ODS.
+
+The verbose matrix dict of the wizards' _get_report_data is converted once to a
+DenseMatrix (flat array of the cell values, row-major, plus the totals). MatrixExporter
+then produces the lines of the sheet (title, filters, header, one line per row, totals)
+in a single code path, and every format only maps those lines to its output:
+
+- XLSX: xlsxwriter in ``constant_memory`` mode, one ``write_row`` per line with one of
+  a few formats created once per workbook;
+- CSV: the header, rows and totals only (for spreadsheets and BI tools);
+- ODS: a minimal OpenDocument spreadsheet, content.xml streamed into the zip file.
+"""
+
+import csv
+import io
+import zipfile
+from array import array
+from xml.sax.saxutils import escape, quoteattr
+
+import xlsxwriter
+
+EXPORT_MIMETYPES = {
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+    'csv': 'text/csv',
+    'ods': 'application/vnd.oasis.opendocument.spreadsheet',
+}
+
+# Cell formats of the sheet lines (xlsxwriter properties), by style name
+DEFAULT_STYLES = {
+    'title': {'bold': True, 'font_size': 16},
+    'info': {},
+    'header': {'bold': True, 'bg_color': '#F0F0F0', 'border': 1, 'align': 'center'},
+    'label': {'bold': True, 'border': 1, 'align': 'left', 'bg_color': '#F0F0F0'},
+    'cell': {'border': 1, 'align': 'right', 'num_format': '#,##0.00'},
+    'total_label': {'bold': True, 'bg_color': '#E6E6E6', 'border': 1, 'align': 'left'},
+    'total': {'bold': True, 'bg_color': '#E6E6E6', 'border': 1, 'align': 'right', 'num_format': '#,##0.00'},
+}
+
+
+class DenseMatrix:
+    """Matrix of amounts with its row / column names, values in a flat row-major array"""
+
+    def __init__(self, row_names, column_names, values, row_totals, column_totals, grand_total, total_rows=()):
+        self.row_names = row_names
+        self.column_names = column_names
+        self.values = values
+        self.row_totals = row_totals
+        self.column_totals = column_totals
+        self.grand_total = grand_total
+        # Indices of the rows that are subtotals / totals themselves
+        self.total_rows = frozenset(total_rows)
+
+    @classmethod
+    def from_report_data(cls, matrix_data):
+        """
+        Dense matrix of a verbose matrix dict (values keyed by ``f"{row_id}_{column_id}"``).
+        The rows whose id starts with 'total' are total rows.
+        """
+        rows, columns = matrix_data['rows'], matrix_data['columns']
+        values = matrix_data['values']
+        row_totals = matrix_data.get('row_totals', {})
+        column_totals = matrix_data.get('column_totals', {})
+        # Build the "_{column_id}" key suffixes once, not once per cell
+        suffixes = [f"_{column['id']}" for column in columns]
+        dense = array('d')
+        for row in rows:
+            prefix = str(row['id'])
+            dense.extend([values.get(prefix + suffix, 0.0) for suffix in suffixes])
+        return cls(
+            row_names=[row['name'] for row in rows],
+            column_names=[column['name'] for column in columns],
+            values=dense,
+            row_totals=array('d', [row_totals.get(row['id'], 0.0) for row in rows]),
+            column_totals=array('d', [column_totals.get(column['id'], 0.0) for column in columns]),
+            grand_total=matrix_data.get('grand_total', 0.0),
+            total_rows=[index for index, row in enumerate(rows) if str(row['id']).startswith('total')],
+        )
+
+    @property
+    def shape(self):
+        return len(self.row_names), len(self.column_names)
+
+    def row(self, index):
+        width = len(self.column_names)
+        return self.values[index * width:(index + 1) * width]
+
+
+class MatrixExporter:
+    """
+    Sheet of a DenseMatrix: ``title`` and ``info`` lines, a header (``label_header`` then
+    the column names), one line per row and the totals.
+
+    :param row_totals: add a 'Total' column with the row totals
+    :param column_totals: add a 'TOTAL' line with the column totals and grand total
+    :param styles: xlsxwriter properties overriding DEFAULT_STYLES, by style name (None
+        removes a default property)
+    """
+
+    def __init__(self, matrix, title, info=(), label_header='', sheet_name='Report',
+                 row_totals=True, column_totals=True, styles=None, label_width=25, value_width=15):
+        self.matrix = matrix
+        self.title = title
+        self.info = list(info)
+        self.label_header = label_header
+        self.sheet_name = sheet_name[:31]
+        self.row_totals = row_totals
+        self.column_totals = column_totals
+        self.styles = {}
+        for name, props in DEFAULT_STYLES.items():
+            props = dict(props, **(styles or {}).get(name, {}))
+            self.styles[name] = {key: value for key, value in props.items() if value is not None}
+        self.label_width = label_width
+        self.value_width = value_width
+
+    def iter_lines(self, with_titles=True):
+        """
+        Lines of the sheet as ``(kind, label style, label, value style, values)``; kind is
+        'title', 'info' or 'blank' for the lines before the table ('header', 'row' or
+        'total' for the table itself)
+        """
+        matrix = self.matrix
+        if with_titles:
+            yield 'title', 'title', self.title, None, ()
+            for line in self.info:
+                yield 'info', 'info', line, None, ()
+            yield 'blank', None, None, None, ()
+        headers = list(matrix.column_names) + (['Total'] if self.row_totals else [])
+        yield 'header', 'header', self.label_header, 'header', headers
+        for index, name in enumerate(matrix.row_names):
+            values = matrix.row(index)
+            if self.row_totals:
+                values = values + array('d', [matrix.row_totals[index]])
+            if index in matrix.total_rows:
+                yield 'total', 'total_label', name, 'total', values
+            else:
+                yield 'row', 'label', name, 'cell', values
+        if self.column_totals:
+            values = matrix.column_totals + (array('d', [matrix.grand_total]) if self.row_totals else array('d'))
+            yield 'total', 'total_label', 'TOTAL', 'total', values
+
+    def export(self, fmt, extra_sheets=None, path=None):
+        """
+        Content of the export in ``fmt`` ('xlsx', 'csv' or 'ods'), or with ``path`` the
+        export written to that file (and None returned), e.g. to stream it from disk.
+
+        :param extra_sheets: for XLSX, ``callable(workbook, formats)`` adding more sheets
+            (the formats are the cached formats by style name)
+        """
+        if fmt == 'csv':
+            return self.to_csv(path)
+        if fmt == 'ods':
+            return self.to_ods(path)
+        return self.to_xlsx(extra_sheets, path)
+
+    def to_xlsx(self, extra_sheets=None, path=None):
+        output = io.BytesIO()
+        workbook = xlsxwriter.Workbook(path or output, {'constant_memory': True})
+        formats = {name: workbook.add_format(props) for name, props in self.styles.items()}
+        worksheet = workbook.add_worksheet(self.sheet_name)
+        # constant_memory: the columns must be formatted before the first row is written
+        worksheet.set_column(0, 0, self.label_width)
+        if self.matrix.column_names or self.row_totals:
+            worksheet.set_column(1, len(self.matrix.column_names) + int(self.row_totals), self.value_width)
+
+        header_row = None
+        for row_index, (kind, label_style, label, value_style, values) in enumerate(self.iter_lines()):
+            if kind == 'blank':
+                continue
+            worksheet.write(row_index, 0, label, formats[label_style])
+            if values:
+                worksheet.write_row(row_index, 1, values, formats[value_style])
+            if kind == 'header':
+                header_row = row_index
+        if header_row is not None:
+            worksheet.freeze_panes(header_row + 1, 1)
+
+        if extra_sheets:
+            extra_sheets(workbook, formats)
+        workbook.close()
+        return None if path else output.getvalue()
+
+    def to_csv(self, path=None):
+        output = open(path, 'w', newline='', encoding='utf-8') if path else io.StringIO()
+        with output:
+            writer = csv.writer(output)
+            for _kind, _label_style, label, _value_style, values in self.iter_lines(with_titles=False):
+                writer.writerow([label, *values])
+            return None if path else output.getvalue().encode()
+
+    def to_ods(self, path=None):
+        output = io.BytesIO()
+        with zipfile.ZipFile(path or output, 'w', zipfile.ZIP_DEFLATED) as ods:
+            # The mimetype must be the first entry, not compressed
+            ods.writestr(zipfile.ZipInfo('mimetype'), EXPORT_MIMETYPES['ods'], compress_type=zipfile.ZIP_STORED)
+            ods.writestr('META-INF/manifest.xml', _ODS_MANIFEST)
+            with ods.open('content.xml', 'w') as content:
+                self._write_ods_content(content)
+        return None if path else output.getvalue()
+
+    def _write_ods_content(self, content):
+        column_count = len(self.matrix.column_names) + int(self.row_totals)
+        content.write(_ODS_CONTENT_HEADER.format(
+            name=quoteattr(self.sheet_name),
+            label_width=self.label_width / 5,
+            value_width=self.value_width / 5,
+            column_count=max(column_count, 1),
+        ).encode())
+        bold_styles = {'title', 'header', 'label', 'total_label', 'total'}
+        for kind, label_style, label, value_style, values in self.iter_lines():
+            cells = []
+            if label is not None:
+                style = ' table:style-name="bold"' if label_style in bold_styles else ''
+                cells.append(f'<table:table-cell{style} office:value-type="string"><text:p>{escape(str(label))}</text:p></table:table-cell>')
+            else:
+                cells.append('<table:table-cell/>')
+            if kind == 'header':
+                cells.extend(
+                    f'<table:table-cell table:style-name="bold" office:value-type="string"><text:p>{escape(str(value))}</text:p></table:table-cell>'
+                    for value in values
+                )
+            else:
+                style = 'total' if value_style == 'total' else 'amount'
+                cells.extend(
+                    f'<table:table-cell table:style-name="{style}" office:value-type="float" office:value="{value!r}"/>'
+                    for value in values
+                )
+            content.write(f'<table:table-row>{"".join(cells)}</table:table-row>\n'.encode())
+        content.write(_ODS_CONTENT_FOOTER.encode())
+
+
+_ODS_MANIFEST = """<?xml version="1.0" encoding="UTF-8"?>
+<manifest:manifest xmlns:manifest="urn:oasis:names:tc:opendocument:xmlns:manifest:1.0" manifest:version="1.2">
+ <manifest:file-entry manifest:full-path="/" manifest:media-type="application/vnd.oasis.opendocument.spreadsheet"/>
+ <manifest:file-entry manifest:full-path="content.xml" manifest:media-type="text/xml"/>
+</manifest:manifest>
+"""
+
+_ODS_CONTENT_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<office:document-content
+    xmlns:office="urn:oasis:names:tc:opendocument:xmlns:office:1.0"
+    xmlns:style="urn:oasis:names:tc:opendocument:xmlns:style:1.0"
+    xmlns:text="urn:oasis:names:tc:opendocument:xmlns:text:1.0"
+    xmlns:table="urn:oasis:names:tc:opendocument:xmlns:table:1.0"
+    xmlns:number="urn:oasis:names:tc:opendocument:xmlns:datastyle:1.0"
+    xmlns:fo="urn:oasis:names:tc:opendocument:xmlns:xsl-fo-compatible:1.0"
+    office:version="1.2">
+<office:automatic-styles>
+ <number:number-style style:name="N2"><number:number number:decimal-places="2" number:min-integer-digits="1" number:grouping="true"/></number:number-style>
+ <style:style style:name="label_column" style:family="table-column"><style:table-column-properties style:column-width="{label_width}cm"/></style:style>
+ <style:style style:name="value_column" style:family="table-column"><style:table-column-properties style:column-width="{value_width}cm"/></style:style>
+ <style:style style:name="bold" style:family="table-cell"><style:text-properties fo:font-weight="bold"/></style:style>
+ <style:style style:name="amount" style:family="table-cell" style:data-style-name="N2"/>
+ <style:style style:name="total" style:family="table-cell" style:data-style-name="N2"><style:text-properties fo:font-weight="bold"/></style:style>
+</office:automatic-styles>
+<office:body><office:spreadsheet>
+<table:table table:name={name}>
+<table:table-column table:style-name="label_column"/>
+<table:table-column table:style-name="value_column" table:number-columns-repeated="{column_count}"/>
+"""
+
+_ODS_CONTENT_FOOTER = """</table:table>
+</office:spreadsheet></office:body>
+</office:document-content>
+"""
@@ -1,14 +1,21 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
-import io
-import base64
-import xlsxwriter
+from odoo.tools import SQL
 import json
 
+from . import report_payload
+from .matrix_export import DenseMatrix, MatrixExporter
+from .sales_report_cache import ReportCube
+from .sales_report_job import XLSX_MIMETYPE
+from .sales_report_run import instrumented_report
+
 class SalesProductCategoryWizard(models.TransientModel):
     _name = 'sales.product.category.wizard'
+    _inherit = ['sales.report.mixin', 'sales.report.job.mixin']
     _description = 'Sales Product Category Report Wizard'
 
+    _report_filter_fields = ('company_id', 'customer_ids', 'product_category_ids', 'date_from', 'date_to')
+
     # Configuration Fields
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company, required=True)
     customer_ids = fields.Many2many('res.partner', string='Customers', domain=[('customer_rank', '>', 0)])
@@ -48,6 +55,12 @@ class SalesProductCategoryWizard(models.TransientModel):
         return res
 
     def _get_report_data(self):
+        """Report data for the current filters, from the report cache when possible"""
+        self.ensure_one()
+        with self._report_phase('aggregation'):
+            return self.env['sales.report.cache']._get_or_compute(self, 'matrix', self._build_report_data)
+
+    def _build_report_data(self):
         """Get product category sales data and returns a JSON-serializable dict."""
         self.ensure_one()
         
@@ -55,18 +68,8 @@ class SalesProductCategoryWizard(models.TransientModel):
             raise UserError("Start date cannot be after end date.")
 
         # Build domain for sale orders
-        domain = [
-            ('company_id', '=', self.company_id.id),
-            ('state', 'in', ['sale', 'done']), 
-            ('date_order', '>=', self.date_from),
-            ('date_order', '<=', self.date_to),
-        ]
-        
-        if self.customer_ids:
-            domain.append(('partner_id', 'in', self.customer_ids.ids))
-        
-        # Fetch sale orders
-        orders = self.env['sale.order'].search(domain)
+        with self._report_phase('domain'):
+            domain = self._get_order_domain()
         
         # Initialize matrix structure
         matrix_data = {
@@ -91,10 +94,24 @@ class SalesProductCategoryWizard(models.TransientModel):
             categories = []  # Empty for processing logic
         
         # Determine the set of customers that will be the columns
+        Daily = self.env['sales.store.expense.daily']
+        use_daily = Daily._is_enabled_for(self, self.company_id)
+        # Without categories there are no amounts: only the customers are read
+        cube = self._get_sales_cube() if categories else None
         if self.customer_ids:
             customers = self.customer_ids
+        elif cube is not None:
+            customers = self.env['res.partner'].browse(cube.column_ids.tolist()).sorted(key=lambda c: c.name)
         else:
-            customers = orders.mapped('partner_id').sorted(key=lambda c: c.name) 
+            with self._report_phase('fetch'):
+                if use_daily:
+                    partner_groups = Daily._read_group(
+                        Daily._get_domain(self.company_id, self.date_from, self.date_to), ['partner_id'])
+                else:
+                    partner_groups = self.env['sale.order']._read_group(domain, ['partner_id'])
+            customers = self.env['res.partner'].union(
+                *(partner for partner, in partner_groups)
+            ).sorted(key=lambda c: c.name)
 
         # Build column headers
         matrix_data['columns'] = [{'id': cust.id, 'name': cust.name} for cust in customers]
@@ -109,27 +126,123 @@ class SalesProductCategoryWizard(models.TransientModel):
         for customer in customers:
             matrix_data['column_totals'][customer.id] = 0.0
         
-        # Only process orders if we have actual categories
+        # Only aggregate lines if we have actual categories
         if categories:
-            for order in orders:
-                customer_id = order.partner_id.id
-                if self.customer_ids and customer_id not in self.customer_ids.ids:
-                    continue
-
-                for line in order.order_line.filtered(lambda l: l.product_id.categ_id.id in categories.ids):
-                    category_id = line.product_id.categ_id.id
-                    amount = line.price_subtotal 
-                    
-                    key = f"{category_id}_{customer_id}" 
-                    
-                    if key in matrix_data['values']:
-                        matrix_data['values'][key] += amount
-                        matrix_data['row_totals'][category_id] += amount
-                        matrix_data['column_totals'][customer_id] += amount
-                        matrix_data['grand_total'] += amount
+            with self._report_phase('fetch'):
+                if cube is not None:
+                    totals = cube.slice(categories.ids, self.customer_ids.ids)
+                elif use_daily:
+                    totals = self._get_category_customer_totals_from_daily(categories)
+                else:
+                    totals = self._get_category_customer_totals(categories)
+            for category_id, customer_id, amount, _count in totals:
+                key = f"{category_id}_{customer_id}" 
+                
+                if key in matrix_data['values']:
+                    matrix_data['values'][key] += amount
+                    matrix_data['row_totals'][category_id] += amount
+                    matrix_data['column_totals'][customer_id] += amount
+                    matrix_data['grand_total'] += amount
         
         return matrix_data
 
+    def _get_sales_cube(self):
+        """
+        Sales per (product category, customer) of the company and dates, over the
+        categories sold in the period and the customers with orders, kept for the wizard
+        by the report cache: changing the customers or categories of the wizard slices it
+        instead of querying again.
+        """
+        def build():
+            wizard = self.new({'company_id': self.company_id.id, 'date_from': self.date_from, 'date_to': self.date_to})
+            Daily = self.env['sales.store.expense.daily']
+            with self._report_phase('fetch'):
+                if Daily._is_enabled_for(wizard, self.company_id):
+                    partner_groups = Daily._read_group(
+                        Daily._get_domain(self.company_id, self.date_from, self.date_to), ['partner_id'])
+                    totals = wizard._get_category_customer_totals_from_daily()
+                else:
+                    partner_groups = self.env['sale.order']._read_group(wizard._get_order_domain(), ['partner_id'])
+                    totals = wizard._get_category_customer_totals()
+            return ReportCube(totals, column_ids=[partner.id for partner, in partner_groups if partner])
+
+        params = {'company_id': self.company_id.id, 'date_from': self.date_from, 'date_to': self.date_to}
+        return self.env['sales.report.cache']._get_cube(self, params, build)
+
+    def _get_order_domain(self):
+        """Domain of the confirmed sale orders matching the filters"""
+        domain = [
+            ('company_id', '=', self.company_id.id),
+            ('state', 'in', ['sale', 'done']), 
+            *self._get_date_range_domain('date_order'),
+        ]
+        
+        if self.customer_ids:
+            domain.append(('partner_id', 'in', self.customer_ids.ids))
+        return domain
+
+    def _get_category_customer_totals_query(self, categories=None):
+        """Grouped query of _get_category_customer_totals"""
+        customer_filter = SQL()
+        if self.customer_ids:
+            customer_filter = SQL("AND so.partner_id = ANY(%s)", self.customer_ids.ids)
+        category_filter = SQL()
+        if categories is not None:
+            category_filter = SQL("AND pt.categ_id = ANY(%s)", categories.ids)
+
+        return SQL(
+            """
+            SELECT pt.categ_id, so.partner_id, SUM(sol.price_subtotal), COUNT(*)
+              FROM sale_order_line sol
+              JOIN sale_order so ON so.id = sol.order_id
+              JOIN product_product pp ON pp.id = sol.product_id
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE so.company_id = %(company_id)s
+               AND so.state IN ('sale', 'done')
+               AND sol.display_type IS NULL
+               AND %(date_range)s
+               AND %(visible_orders)s
+               %(category_filter)s
+               %(customer_filter)s
+          GROUP BY pt.categ_id, so.partner_id
+            """,
+            company_id=self.company_id.id,
+            date_range=self._get_date_range_sql(SQL("so.date_order")),
+            visible_orders=self._get_visible_orders_sql(SQL("so.id")),
+            category_filter=category_filter,
+            customer_filter=customer_filter,
+        )
+
+    def _get_category_customer_totals(self, categories=None):
+        """Sum order line subtotals per (product category, customer) in one grouped query.
+
+        Returns a list of ``(category_id, partner_id, amount, line count)`` tuples, for the
+        given categories (None: every category sold in the period).
+        """
+        self.env.flush_all()
+        self.env.cr.execute(self._get_category_customer_totals_query(categories))
+        rows = self.env.cr.fetchall()
+        self._report_metrics(rows=sum(count for _category_id, _partner_id, _amount, count in rows))
+        return rows
+
+    def _get_category_customer_totals_from_daily(self, categories=None):
+        """Same as _get_category_customer_totals, read from the daily sales aggregate"""
+        Daily = self.env['sales.store.expense.daily']
+        domain = Daily._get_domain(self.company_id, self.date_from, self.date_to, self.customer_ids.ids)
+        if categories is not None:
+            domain.append(('product_categ_id', 'in', categories.ids))
+        groups = Daily._read_group(domain, ['product_categ_id', 'partner_id'], ['amount:sum', 'line_count:sum'])
+        self._report_metrics(rows=sum(count for _category, _partner, _amount, count in groups))
+        return [(category.id, partner.id, amount, count) for category, partner, amount, count in groups]
+
+    def _get_report_queries(self):
+        categories = self.product_category_ids or self.env['product.category'].search([], limit=1)
+        return [
+            ('customers', self.env['sale.order']._search(self._get_order_domain()).select()),
+            ('category_customer_totals', self._get_category_customer_totals_query(categories)),
+        ]
+
+    @instrumented_report('preview')
     def action_preview(self):
         """Calculates report data, stores it in preview_data, and reloads the view."""
         self.ensure_one()
@@ -138,16 +251,22 @@ class SalesProductCategoryWizard(models.TransientModel):
         # if not self.product_category_ids:
         #     raise UserError("Please select at least one product category.")
 
-        # Get actual report data (will handle empty categories)
-        report_data = self._get_report_data()
+        # Get actual report data in the compact preview format (will handle empty categories)
+        payload = self._get_preview_payload()
+        with self._report_phase('serialization'):
+            preview_data = report_payload.dumps_compact(payload)
+        self._report_metrics(payload_bytes=len(preview_data))
         
         # Store preview data as JSON and set flag to True
         self.write({
-            'preview_data': json.dumps(report_data),
+            'preview_data': preview_data,
             'has_preview': True
         })
         
         # Return to same view with updated fields
+        return self._get_preview_action()
+
+    def _get_preview_action(self):
         return {
             'type': 'ir.actions.act_window',
             'name': f'Product Category Report Preview - {self.date_from} to {self.date_to}',
@@ -170,122 +289,91 @@ class SalesProductCategoryWizard(models.TransientModel):
             'company': self.company_id.name,
         })
 
+    @instrumented_report('pdf')
     def print_pdf_report(self):
         """Generates the final PDF report."""
         self.ensure_one()
-        report_data = self._get_report_data()
-        
-        return self.env.ref('sales_store_expense_report.report_product_category_sales').report_action(self, data={
-            'report_data': report_data,
+        return self.env.ref('sales_store_expense_report.report_product_category_sales').report_action(
+            self, data=self._get_pdf_report_values()
+        )
+
+    def _get_pdf_report_values(self):
+        return {
+            'report_data': self._get_report_data(),
             'date_from': self.date_from,
             'date_to': self.date_to,
             'company': self.company_id.name,
             'wizard_id': self.id,
+        }
+
+    def _get_preview_payload(self):
+        """Report data in the compact wire format of the preview widget"""
+        matrix = self._get_report_api_data()
+        with self._report_phase('serialization'):
+            return report_payload.compress(matrix)
+
+    def _get_report_api_data(self, **options):
+        """Encoded matrix (not compressed: the HTTP response is)"""
+        matrix_data = self._get_report_data()
+        with self._report_phase('serialization'):
+            return report_payload.encode_matrix(matrix_data, self.company_id.currency_id.decimal_places)
+
+    def _get_preview_job_payload(self):
+        return self._get_preview_payload()
+
+    def _open_preview_job_payload(self, payload):
+        self.write({
+            'preview_data': report_payload.dumps_compact(payload),
+            'has_preview': True
         })
+        return self._get_preview_action()
+
+    def _render_report_job(self, report_type):
+        """Renders the Excel or PDF report for a background job."""
+        if report_type == 'xlsx':
+            self._report_progress('Building Excel report', 10)
+            return self._get_xlsx_file_name(), self._build_xlsx_report(), XLSX_MIMETYPE
+        if report_type == 'pdf':
+            self._report_progress('Computing report data', 10)
+            report_data = self._get_pdf_report_values()
+            self._report_progress('Rendering PDF', 50)
+            with self._report_phase('render'):
+                content, _report_format = self.env['ir.actions.report']._render_qweb_pdf(
+                    'sales_store_expense_report.report_product_category_sales', self.ids, data=report_data
+                )
+            return f'product_category_sales_{self.date_from}_{self.date_to}.pdf', content, 'application/pdf'
+        return super()._render_report_job(report_type)
 
     def print_xls_report(self):
-        """Generates the Excel report."""
+        """Downloads the Excel report (CSV or ODS with the ``export_format`` context key)."""
         self.ensure_one()
+        # Generated by the download route and streamed, nothing is stored
+        return self._get_direct_download_action(self.env.context.get('export_format', 'xlsx'))
+
+    def _get_xlsx_file_name(self, export_format='xlsx'):
+        return f'product_category_sales_{self.date_from}_{self.date_to}.{export_format}'
+
+    def _build_xlsx_report(self, export_format='xlsx', path=None):
+        """Builds the Excel workbook (or the CSV / ODS file) and returns its content, or writes it to ``path``."""
         report_data = self._get_report_data()
-        
-        # Create Excel file
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('Product Category Sales')
-        
-        # Formats
-        header_format = workbook.add_format({'bold': True, 'bg_color': '#366092', 'font_color': 'white', 'border': 1})
-        total_format = workbook.add_format({'bold': True, 'bg_color': '#F2F2F2', 'border': 1})
-        currency_format = workbook.add_format({'num_format': '#,##0.00'})
-        currency_total_format = workbook.add_format({'num_format': '#,##0.00', 'bold': True, 'bg_color': '#F2F2F2', 'border': 1})
-        
-        # Write title
-        title_format = workbook.add_format({'bold': True, 'size': 16})
-        worksheet.merge_range(0, 0, 0, 2, 'Product Category Sales Report', title_format)
-        worksheet.merge_range(1, 0, 1, 2, f'Date Range: {self.date_from} to {self.date_to}')
-        worksheet.merge_range(2, 0, 2, 2, f'Company: {self.company_id.name}')
-        
-        # Get customers from report data
-        customer_ids_in_data = list(report_data['column_totals'].keys())
-        customers = self.env['res.partner'].browse(customer_ids_in_data)
-        
-        # Write headers
-        col_offset = 1
-        worksheet.write(4, 0, 'Product Category', header_format)
-        
-        for col_idx, customer in enumerate(customers):
-            worksheet.write(4, col_idx + col_offset, customer.name, header_format)
-        
-        total_col = len(customers) + col_offset
-        worksheet.write(4, total_col, 'Total', header_format)
-        
-        # Write data - handle both cases (with and without categories)
-        row = 5
-        if self.product_category_ids:
-            # Write actual categories
-            for category in self.product_category_ids:
-                worksheet.write(row, 0, category.name)
-                col_idx = 0
-                
-                for customer in customers:
-                    key = f"{category.id}_{customer.id}"
-                    amount = report_data['values'].get(key, 0.0)
-                    worksheet.write(row, col_idx + col_offset, amount, currency_format)
-                    col_idx += 1
-                
-                row_total = report_data['row_totals'].get(category.id, 0.0)
-                worksheet.write(row, total_col, row_total, currency_total_format)
-                row += 1
-        else:
-            # Write default rows when no categories selected
-            for row_data in report_data['rows']:
-                worksheet.write(row, 0, row_data['name'])
-                col_idx = 0
-                
-                for customer in customers:
-                    key = f"{row_data['id']}_{customer.id}"
-                    amount = report_data['values'].get(key, 0.0)
-                    worksheet.write(row, col_idx + col_offset, amount, currency_format)
-                    col_idx += 1
-                
-                row_total = report_data['row_totals'].get(row_data['id'], 0.0)
-                worksheet.write(row, total_col, row_total, currency_total_format)
-                row += 1
-        
-        # Write column totals
-        worksheet.write(row, 0, 'TOTAL', total_format)
-        
-        col_idx = 0
-        grand_total = 0.0
-        
-        for customer in customers:
-            col_total = report_data['column_totals'].get(customer.id, 0.0)
-            worksheet.write(row, col_idx + col_offset, col_total, currency_total_format)
-            grand_total += col_total
-            col_idx += 1
-        
-        worksheet.write(row, total_col, grand_total, currency_total_format)
-        
-        # Adjust column widths
-        worksheet.set_column(0, 0, 30)
-        worksheet.set_column(1, total_col, 15)
-        
-        workbook.close()
-        output.seek(0)
-        
-        # Return file download
-        file_data = base64.b64encode(output.getvalue())
-        filename = f'product_category_sales_{self.date_from}_{self.date_to}.xlsx'
-        
-        attachment = self.env['ir.attachment'].create({
-            'name': filename,
-            'datas': file_data,
-            'type': 'binary',
-            'mimetype': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        })
-        
-        return {
-            'type': 'ir.actions.act_url',
-            'url': f'/web/content/{attachment.id}?download=true',
-            'target': 'self',
-        }
\ No newline at end of file
+        with self._report_phase('render'):
+            return self._write_xlsx_report(report_data, export_format, path)
+
+    def _write_xlsx_report(self, report_data, export_format='xlsx', path=None):
+        # Rows are the selected categories (or the default rows), columns the customers of the report data
+        exporter = MatrixExporter(
+            DenseMatrix.from_report_data(report_data),
+            title='Product Category Sales Report',
+            info=[f'Date Range: {self.date_from} to {self.date_to}', f'Company: {self.company_id.name}'],
+            label_header='Product Category',
+            sheet_name='Product Category Sales',
+            styles={
+                'header': {'bg_color': '#366092', 'font_color': 'white', 'align': 'left'},
+                'label': {'bold': False, 'border': 0, 'bg_color': None},
+                'cell': {'border': 0, 'align': None},
+                'total_label': {'bg_color': '#F2F2F2'},
+                'total': {'bg_color': '#F2F2F2', 'align': None},
+            },
+            label_width=30,
+        )
+        return exporter.export(export_format, path=path)
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+"""
+Compact wire format of the report previews (decoded by static/src/js/report_payload.js).
+
+Matrix payload (``format: 'matrix'``): the row and column dimensions are sent once as
+lookup arrays and only the non-zero cells as three parallel arrays of (row index,
+column index, value); the totals are arrays parallel to the dimensions::
+
+    {"format": "matrix", "version": 1,
+     "rows": {"ids": [...], "names": [...]}, "columns": {"ids": [...], "names": [...]},
+     "cells": {"row": [...], "column": [...], "value": [...]},
+     "row_totals": [...], "column_totals": [...], "grand_total": 0.0, ...extra keys}
+
+The optional trend series and comparison amounts are sparse as well, column ``-1``
+standing for the row total::
+
+     "buckets": [{"id": "2024-01-01", "name": "Jan 2024"}, ...],
+     "series": {"row": [...], "column": [...], "values": [[...], ...]},
+     "comparison": {"label": ..., "date_from": ..., "date_to": ...,
+                    "cells": {"row": [...], "column": [...], "value": [...]},
+                    "column_totals": [...], "grand_total": 0.0}
+
+Lines payload (``format: 'lines'``): one array per column; the columns with many repeated
+values are dictionary encoded (an array of distinct values plus an array of indices)::
+
+    {"format": "lines", "version": 1, "length": n, "columns": [...],
+     "data": {"order_reference": [...], "customer_name": [0, 0, 1, ...], ...},
+     "dictionaries": {"customer_name": ["A", "B"], ...}}
+
+Payloads larger than GZIP_THRESHOLD bytes are sent gzip compressed and base64 encoded in
+an envelope ``{"format", "version", "encoding": "gzip", "grand_total", "data"}``.
+"""
+
+import base64
+import gzip
+import json
+
+PAYLOAD_VERSION = 1
+# Serialized size from which the payload is compressed
+GZIP_THRESHOLD = 64 * 1024
+
+# Keys of the verbose matrix dict that are re-encoded; the other keys are passed through
+MATRIX_KEYS = {'rows', 'columns', 'values', 'row_totals', 'column_totals', 'grand_total', 'series', 'comparison'}
+
+
+def dumps_compact(payload):
+    return json.dumps(payload, separators=(',', ':'))
+
+
+def encode_matrix(matrix, digits=2):
+    """
+    Encode the verbose matrix dict of the wizards' _get_report_data (values keyed by
+    ``f"{row_id}_{column_id}"``, totals keyed by row / column id)
+    """
+    rows, columns = matrix['rows'], matrix['columns']
+    values = matrix['values']
+    row_totals = matrix.get('row_totals', {})
+    column_totals = matrix.get('column_totals', {})
+
+    cell_rows, cell_columns, cell_values = [], [], []
+    for row_index, row in enumerate(rows):
+        prefix = f"{row['id']}_"
+        for column_index, column in enumerate(columns):
+            value = values.get(prefix + str(column['id']))
+            if value:
+                cell_rows.append(row_index)
+                cell_columns.append(column_index)
+                cell_values.append(round(value, digits))
+
+    extra = {}
+    if matrix.get('series'):
+        # Trend series keyed like the values, plus f"{row_id}_total" for the row totals
+        series = matrix['series']
+        series_rows, series_columns, series_values = [], [], []
+        for row_index, row in enumerate(rows):
+            for column_index, column_id in _cell_columns(columns):
+                points = series.get(f"{row['id']}_{column_id}")
+                if points and any(points):
+                    series_rows.append(row_index)
+                    series_columns.append(column_index)
+                    series_values.append([round(point, digits) for point in points])
+        extra['series'] = {'row': series_rows, 'column': series_columns, 'values': series_values}
+    if matrix.get('comparison'):
+        comparison = matrix['comparison']
+        comparison_values = dict(comparison['values'])
+        comparison_values.update(
+            (f'{row_id}_total', amount) for row_id, amount in comparison.get('row_totals', {}).items())
+        comparison_rows, comparison_columns, comparison_cells = [], [], []
+        for row_index, row in enumerate(rows):
+            for column_index, column_id in _cell_columns(columns):
+                value = comparison_values.get(f"{row['id']}_{column_id}")
+                if value:
+                    comparison_rows.append(row_index)
+                    comparison_columns.append(column_index)
+                    comparison_cells.append(round(value, digits))
+        extra['comparison'] = {
+            'label': comparison['label'],
+            'date_from': comparison['date_from'],
+            'date_to': comparison['date_to'],
+            'cells': {'row': comparison_rows, 'column': comparison_columns, 'value': comparison_cells},
+            'column_totals': [
+                round(comparison['column_totals'].get(column['id'], 0.0), digits) for column in columns],
+            'grand_total': round(comparison['grand_total'], digits),
+        }
+
+    payload = {key: value for key, value in matrix.items() if key not in MATRIX_KEYS}
+    payload.update({
+        'format': 'matrix',
+        'version': PAYLOAD_VERSION,
+        'rows': {'ids': [row['id'] for row in rows], 'names': [row['name'] for row in rows]},
+        'columns': {'ids': [column['id'] for column in columns], 'names': [column['name'] for column in columns]},
+        'cells': {'row': cell_rows, 'column': cell_columns, 'value': cell_values},
+        'row_totals': [round(row_totals.get(row['id'], 0.0), digits) for row in rows],
+        'column_totals': [round(column_totals.get(column['id'], 0.0), digits) for column in columns],
+        'grand_total': round(matrix.get('grand_total', 0.0), digits),
+        **extra,
+    })
+    return payload
+
+
+def _cell_columns(columns):
+    """(index, id) of the columns of a row, then (-1, 'total') for its row total"""
+    yield from ((index, column['id']) for index, column in enumerate(columns))
+    yield -1, 'total'
+
+
+def encode_lines(lines, columns, dictionary_columns=()):
+    """
+    Encode a list of line dicts column by column
+
+    :param columns: keys of the line dicts to send, in display order
+    :param dictionary_columns: keys whose values are dictionary encoded
+    """
+    data = {}
+    dictionaries = {}
+    for column in columns:
+        values = [line[column] for line in lines]
+        if column in dictionary_columns:
+            index_by_value = {}
+            data[column] = [index_by_value.setdefault(value, len(index_by_value)) for value in values]
+            dictionaries[column] = list(index_by_value)
+        else:
+            data[column] = values
+    return {
+        'format': 'lines',
+        'version': PAYLOAD_VERSION,
+        'length': len(lines),
+        'columns': list(columns),
+        'data': data,
+        'dictionaries': dictionaries,
+    }
+
+
+def compress(payload, threshold=GZIP_THRESHOLD):
+    """Wrap the payload in a gzip envelope when its serialized size reaches ``threshold``"""
+    serialized = dumps_compact(payload).encode()
+    if len(serialized) < threshold:
+        return payload
+    return {
+        'format': payload['format'],
+        'version': PAYLOAD_VERSION,
+        'encoding': 'gzip',
+        'grand_total': payload.get('grand_total', 0.0),
+        'data': base64.b64encode(gzip.compress(serialized, compresslevel=6)).decode(),
+    }
+
+
+def dumps(payload, threshold=GZIP_THRESHOLD):
+    """Serialize a payload for a preview field, compressed when large"""
+    return dumps_compact(compress(payload, threshold))
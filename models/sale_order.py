@@ -1,4 +1,12 @@
+import logging
+
 from odoo import models, fields, api
+from odoo.tools.sql import column_exists, create_column
+
+_logger = logging.getLogger(__name__)
+
+# Set when the keyword categories change: the next backfill run resolves the lines again
+RESOLVE_ALL_PARAM = 'sales_store_expense_report.resolve_all_expense_categories'
 
 # 1. Existing Sale Order Line Model Extension
 class SaleOrderLine(models.Model):
@@ -7,8 +15,167 @@ class SaleOrderLine(models.Model):
     store_expense_id = fields.Many2one(
         'store.expense.category',  # Adjust to your actual model name
         string='Store Expense Category',
+        index='btree_not_null',  # Explicit category; the reports use resolved_expense_category_id
         help='Store expense category for this order line'
     )
+    resolved_expense_category_id = fields.Many2one(
+        'store.expense.category',
+        string='Resolved Expense Category',
+        compute='_compute_resolved_expense_category_id',
+        store=True,
+        index=True,
+        copy=False,
+        help='Expense category used by the reports: the explicit store expense category, '
+             'else the product / product category mapping, else the keyword heuristic'
+    )
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['sales.store.expense.daily']._mark_orders_dirty(lines.order_id)
+        self.env['sales.report.cache']._invalidate(lines.order_id)
+        return lines
+
+    # Line fields read by the reports and the daily sales aggregate: the other writes
+    # (delivered / invoiced quantities, descriptions...) leave them unchanged
+    # (price_subtotal is recomputed without a write, from the price, discount and taxes)
+    REPORT_FIELDS = {
+        'price_subtotal', 'product_uom_qty', 'price_unit', 'discount', 'tax_id', 'product_id',
+        'product_uom', 'store_expense_id', 'display_type', 'order_id',
+    }
+
+    def write(self, vals):
+        if not self.REPORT_FIELDS & set(vals):
+            return super().write(vals)
+        Daily = self.env['sales.store.expense.daily']
+        Cache = self.env['sales.report.cache']
+        Daily._mark_orders_dirty(self.order_id)
+        Cache._invalidate(self.order_id)
+        res = super().write(vals)
+        if 'order_id' in vals:
+            Daily._mark_orders_dirty(self.order_id)
+            Cache._invalidate(self.order_id)
+        return res
+
+    def unlink(self):
+        self.env['sales.store.expense.daily']._mark_orders_dirty(self.order_id)
+        self.env['sales.report.cache']._invalidate(self.order_id)
+        return super().unlink()
+
+    def _auto_init(self):
+        # Create the column up front so that installing/upgrading the module does not
+        # compute it for every existing line; history is filled by the batched backfill
+        if not column_exists(self.env.cr, 'sale_order_line', 'resolved_expense_category_id'):
+            create_column(self.env.cr, 'sale_order_line', 'resolved_expense_category_id', 'int4')
+        return super()._auto_init()
+
+    def _get_resolved_expense_category_depends(self):
+        """Fields read by _resolve_product_expense_category (the mappings when they exist)"""
+        depends = ['store_expense_id', 'product_id', 'product_id.name', 'product_id.categ_id', 'product_id.categ_id.name']
+        if 'expense_category_id' in self.env['product.product']._fields:
+            depends.append('product_id.expense_category_id')
+        if 'expense_category_id' in self.env['product.category']._fields:
+            depends.append('product_id.categ_id.expense_category_id')
+        return depends
+
+    # The keyword categories are not a dependency: changing them would recompute every
+    # line in the same transaction, see _schedule_resolve_all_expense_categories
+    @api.depends(lambda self: self._get_resolved_expense_category_depends())
+    def _compute_resolved_expense_category_id(self):
+        category_by_product = {}
+        for line in self:
+            if line.store_expense_id:
+                line.resolved_expense_category_id = line.store_expense_id
+                continue
+            product = line.product_id
+            if product.id not in category_by_product:
+                category_by_product[product.id] = self._resolve_product_expense_category(product)
+            line.resolved_expense_category_id = category_by_product[product.id]
+
+    @api.model
+    def _resolve_product_expense_category(self, product):
+        """
+        MAP PRODUCTS/PRODUCT CATEGORIES TO STORE EXPENSE CATEGORIES
+        Returns a store.expense.category record (empty if no category exists)
+        """
+        Category = self.env['store.expense.category']
+
+        # Option 1: Check if product has a direct expense category mapping
+        if product and 'expense_category_id' in product._fields and product.expense_category_id:
+            return product.expense_category_id
+
+        # Option 2: Check if product category has an expense category mapping
+        product_category = product.categ_id if product else False
+        if product_category and 'expense_category_id' in product_category._fields and product_category.expense_category_id:
+            return product_category.expense_category_id
+
+        # Option 3: Keyword matching on the product category name, then the product name
+        matcher = Category._get_keyword_matcher()
+        category_id = matcher.match(
+            product_category.name if product_category else False,
+            product.name if product else False,
+        )
+        return Category.browse(category_id or [])
+
+    @api.model
+    def _backfill_resolved_expense_category(self, batch_size=1000, only_missing=True, limit=None):
+        """
+        Resolve the expense category of existing order lines in chunks of ``batch_size``,
+        committing after each chunk. With ``only_missing=False`` every line without an
+        explicit store expense category is resolved again (e.g. after the category
+        keywords changed).
+
+        :return: number of lines processed
+        """
+        field = self._fields['resolved_expense_category_id']
+        last_id = 0
+        processed = 0
+        while limit is None or processed < limit:
+            size = batch_size if limit is None else min(batch_size, limit - processed)
+            self.env.cr.execute(f"""
+                SELECT id FROM sale_order_line
+                 WHERE id > %s {'AND resolved_expense_category_id IS NULL' if only_missing else 'AND store_expense_id IS NULL'}
+              ORDER BY id
+                 LIMIT %s
+            """, (last_id, size))
+            ids = [row[0] for row in self.env.cr.fetchall()]
+            if not ids:
+                break
+
+            lines = self.browse(ids)
+            self.env.add_to_compute(field, lines)
+            lines.flush_recordset(['resolved_expense_category_id'])
+            self.env.cr.commit()
+            self.env.invalidate_all()
+
+            last_id = ids[-1]
+            processed += len(ids)
+            _logger.info("Resolved expense category for %s order lines (up to id %s)", processed, last_id)
+        return processed
+
+    @api.model
+    def _schedule_resolve_all_expense_categories(self):
+        """
+        Resolve the lines again in the background after the keyword categories changed
+        (their stored category may come from the keyword heuristic)
+        """
+        self.env['ir.config_parameter'].sudo().set_param(RESOLVE_ALL_PARAM, '1')
+        cron = self.env.ref('sales_store_expense_report.ir_cron_backfill_resolved_expense_category', raise_if_not_found=False)
+        if cron:
+            cron.sudo()._trigger()
+
+    @api.model
+    def _cron_backfill_resolved_expense_category(self):
+        if not self.env['store.expense.category'].sudo().search_count([], limit=1):
+            # Nothing to resolve to: the lines are resolved again once a category is created
+            return
+        ICP = self.env['ir.config_parameter'].sudo()
+        if ICP.get_param(RESOLVE_ALL_PARAM):
+            # Reset first: a change of the keywords during the run schedules another one
+            ICP.set_param(RESOLVE_ALL_PARAM, False)
+            self._backfill_resolved_expense_category(only_missing=False)
+        else:
+            self._backfill_resolved_expense_category()
 
 # 2. New Sale Order Model Extension to make date_order editable
 class SaleOrder(models.Model):
@@ -31,4 +198,30 @@ class SaleOrder(models.Model):
         # OPTIONAL: You can restrict this ability to only certain user groups 
         # For example, only allowing 'Sales Manager' to edit historical dates:
         # groups='sales_team.group_salemanager',
-    )
\ No newline at end of file
+    )
+
+    def init(self):
+        super().init()
+        # Every report reads the confirmed orders of one company in a date range
+        # (also created concurrently by the 18.0.1.1.0 migration)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS sale_order_report_company_date_index
+                ON sale_order (company_id, date_order)
+             WHERE state IN ('sale', 'done')
+        """)
+
+    # Order fields that move lines between cells of the daily sales aggregate (and
+    # therefore change the cached reports)
+    DAILY_AGGREGATE_FIELDS = {'state', 'date_order', 'partner_id', 'company_id'}
+
+    def write(self, vals):
+        if not self.DAILY_AGGREGATE_FIELDS & set(vals):
+            return super().write(vals)
+        Daily = self.env['sales.store.expense.daily']
+        Cache = self.env['sales.report.cache']
+        Daily._mark_orders_dirty(self)
+        Cache._invalidate(self)
+        res = super().write(vals)
+        Daily._mark_orders_dirty(self)
+        Cache._invalidate(self)
+        return res
@@ -0,0 +1,300 @@
+import logging
+
+import pytz
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+_logger = logging.getLogger(__name__)
+
+# Parameter enabling the aggregate table as data source for the report wizards
+USE_DAILY_AGGREGATE_PARAM = 'sales_store_expense_report.use_daily_aggregate'
+# Readers of the aggregate (see security/ir.model.access.csv)
+DAILY_AGGREGATE_GROUP = 'sales_team.group_sale_salesman_all_leads'
+
+
+class SalesStoreExpenseDaily(models.Model):
+    """
+    Daily sales fact table for the store expense reports.
+
+    One row per (day, company, customer, product category, store expense category,
+    resolved expense category) with the summed subtotal and quantity of the confirmed
+    order lines. The days are those of the company's timezone (the timezone of its
+    partner, else UTC): a report reads the table only when its own timezone is the
+    same (see _is_enabled_for), and the table must be rebuilt after changing the
+    timezone of a company (the consistency cron does it). Rows are refreshed per
+    (company, day, customer) at commit time from the order / order line writes that
+    touch them. Changes made outside of those writes (e.g. moving a product to another
+    category) are caught by _check_consistency() and repaired by _rebuild().
+    """
+    _name = 'sales.store.expense.daily'
+    _description = 'Daily Sales per Store Expense Category'
+    _order = 'date desc'
+    _log_access = False
+
+    date = fields.Date(string='Date', required=True, index=True, readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True)
+    partner_id = fields.Many2one('res.partner', string='Customer', readonly=True)
+    product_categ_id = fields.Many2one('product.category', string='Product Category', readonly=True)
+    store_expense_id = fields.Many2one('store.expense.category', string='Store Expense Category', readonly=True)
+    resolved_expense_category_id = fields.Many2one(
+        'store.expense.category', string='Resolved Expense Category', readonly=True)
+    amount = fields.Float(string='Amount', readonly=True)
+    quantity = fields.Float(string='Quantity', readonly=True)
+    line_count = fields.Integer(string='Lines', readonly=True)
+
+    def init(self):
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS sales_store_expense_daily_company_date_partner_index
+                ON sales_store_expense_daily (company_id, date, partner_id)
+        """)
+
+    # -------------------------------------------------------------------------
+    # Reading
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _is_enabled(self):
+        """Whether the report wizards should read from this table"""
+        param = self.env['ir.config_parameter'].sudo().get_param(USE_DAILY_AGGREGATE_PARAM)
+        return param in ('1', 'True', 'true')
+
+    @api.model
+    def _get_company_tz(self, company):
+        """Timezone of the days of the rows of ``company``"""
+        return company.sudo().partner_id.tz or 'UTC'
+
+    @api.model
+    def _is_enabled_for(self, wizard, companies):
+        """
+        Whether the report ``wizard`` on ``companies`` can read from this table: it is
+        enabled, the user can read it (the totals of all the salesmen: only the users
+        seeing all the orders) and its days are the report days, i.e. the report timezone
+        is the one of every company
+        """
+        if not self._is_enabled() or not self.env.user.has_group(DAILY_AGGREGATE_GROUP):
+            return False
+        tz = wizard._get_report_tz().zone
+        return all(self._get_company_tz(company) == tz for company in companies)
+
+    @api.model
+    def _get_domain(self, companies, date_from, date_to, partner_ids=None):
+        domain = [
+            ('company_id', 'in', companies.ids),
+            ('date', '>=', date_from),
+            ('date', '<=', date_to),
+        ]
+        if partner_ids:
+            domain.append(('partner_id', 'in', partner_ids))
+        return domain
+
+    # -------------------------------------------------------------------------
+    # Incremental maintenance
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _mark_orders_dirty(self, orders):
+        """
+        Schedule the (company, day, customer) cells of the confirmed ``orders`` for a
+        refresh at commit time. Call it with the values before and after a change.
+        """
+        keys = {
+            (order.company_id.id, self._get_local_date(order.company_id, order.date_order), order.partner_id.id)
+            for order in orders
+            if order.state in ('sale', 'done') and order.date_order and order.company_id and order.partner_id
+        }
+        if not keys:
+            return
+
+        precommit = self.env.cr.precommit
+        if 'sales_store_expense_daily.dirty' not in precommit.data:
+            precommit.data['sales_store_expense_daily.dirty'] = set()
+            precommit.add(self._flush_dirty_keys)
+        precommit.data['sales_store_expense_daily.dirty'].update(keys)
+
+    @api.model
+    def _get_local_date(self, company, date_order):
+        """Day of the UTC datetime ``date_order`` in the timezone of ``company``"""
+        tz = pytz.timezone(self._get_company_tz(company))
+        return pytz.utc.localize(date_order).astimezone(tz).date()
+
+    @api.model
+    def _flush_dirty_keys(self):
+        keys = self.env.cr.precommit.data.pop('sales_store_expense_daily.dirty', set())
+        if keys:
+            self._refresh_keys(keys)
+
+    @api.model
+    def _refresh_keys(self, keys):
+        """Recompute the rows of the given (company_id, date, partner_id) cells"""
+        self.env.flush_all()
+        company_ids, dates, partner_ids = (list(values) for values in zip(*keys))
+        keys_sql = SQL(
+            "unnest(%s::int[], %s::date[], %s::int[]) AS k(company_id, day, partner_id)",
+            company_ids, dates, partner_ids,
+        )
+        self.env.cr.execute(SQL(
+            """
+            DELETE FROM sales_store_expense_daily f
+             USING %(keys)s
+             WHERE f.company_id = k.company_id AND f.date = k.day AND f.partner_id = k.partner_id
+            """,
+            keys=keys_sql,
+        ))
+        # The UTC range around the day (any timezone) uses the date_order index, the
+        # local date picks the orders of the day
+        self._insert_from_lines(SQL(
+            """
+            JOIN %(keys)s
+              ON so.company_id = k.company_id
+             AND so.partner_id = k.partner_id
+             AND so.date_order >= k.day - 1
+             AND so.date_order < k.day + 2
+             AND %(local_date)s = k.day
+            """,
+            keys=keys_sql,
+            local_date=self._local_date_sql(),
+        ))
+
+    @api.model
+    def _local_date_sql(self):
+        """Day of so.date_order in the timezone of the company (see _lines_aggregate_query)"""
+        return SQL("timezone(COALESCE(company_partner.tz, 'UTC'), timezone('UTC', so.date_order))::date")
+
+    @api.model
+    def _lines_aggregate_query(self, join=SQL(), where=SQL("TRUE")):
+        """
+        Grouped SELECT over the confirmed order lines, in the column order of the table.
+        Without sections and notes, like the report queries.
+        """
+        return SQL(
+            """
+            SELECT %(local_date)s AS date,
+                   so.company_id,
+                   so.partner_id,
+                   pt.categ_id AS product_categ_id,
+                   sol.store_expense_id,
+                   sol.resolved_expense_category_id,
+                   SUM(sol.price_subtotal) AS amount,
+                   SUM(sol.product_uom_qty) AS quantity,
+                   COUNT(*) AS line_count
+              FROM sale_order_line sol
+              JOIN sale_order so ON so.id = sol.order_id
+              JOIN res_company company ON company.id = so.company_id
+              JOIN res_partner company_partner ON company_partner.id = company.partner_id
+              %(join)s
+         LEFT JOIN product_product pp ON pp.id = sol.product_id
+         LEFT JOIN product_template pt ON pt.id = pp.product_tmpl_id
+             WHERE so.state IN ('sale', 'done')
+               AND sol.display_type IS NULL
+               AND %(where)s
+          GROUP BY 1, 2, 3, 4, 5, 6
+            """,
+            local_date=self._local_date_sql(),
+            join=join,
+            where=where,
+        )
+
+    @api.model
+    def _insert_from_lines(self, join=SQL(), where=SQL("TRUE")):
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO sales_store_expense_daily
+                   (date, company_id, partner_id, product_categ_id, store_expense_id,
+                    resolved_expense_category_id, amount, quantity, line_count)
+            %s
+            """,
+            self._lines_aggregate_query(join, where),
+        ))
+
+    # -------------------------------------------------------------------------
+    # Rebuild & consistency check
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _range_filters(self, date_expr, company_expr, date_from=None, date_to=None, company_ids=None):
+        """SQL condition restricting ``date_expr`` to [date_from, date_to] and ``company_expr`` to company_ids"""
+        filters = [SQL("TRUE")]
+        if date_from:
+            filters.append(SQL("%s >= %s", date_expr, date_from))
+        if date_to:
+            filters.append(SQL("%s < %s::date + 1", date_expr, date_to))
+        if company_ids:
+            filters.append(SQL("%s = ANY(%s)", company_expr, list(company_ids)))
+        return SQL(" AND ").join(filters)
+
+    @api.model
+    def _rebuild(self, date_from=None, date_to=None, company_ids=None):
+        """Recompute the table (or a date range / set of companies of it) from the order lines"""
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            "DELETE FROM sales_store_expense_daily WHERE %s",
+            self._range_filters(SQL.identifier('date'), SQL.identifier('company_id'), date_from, date_to, company_ids),
+        ))
+        self._insert_from_lines(where=self._range_filters(
+            self._local_date_sql(), SQL("so.company_id"), date_from, date_to, company_ids,
+        ))
+        row_count = self.env.cr.rowcount
+        self.env.invalidate_all()
+        self.env['sales.report.cache']._invalidate()
+        _logger.info("Rebuilt daily sales aggregate (%s to %s, companies %s): %s rows",
+                     date_from or 'start', date_to or 'end', company_ids or 'all', row_count)
+        return True
+
+    @api.model
+    def _check_consistency(self, date_from=None, date_to=None, company_ids=None, tolerance=0.005):
+        """
+        Compare the table with the live order lines.
+
+        :return: list of dicts ``{key, expected_amount, stored_amount, expected_quantity, stored_quantity}``
+                 for every differing cell (empty when consistent)
+        """
+        self.env.flush_all()
+        self.env.cr.execute(SQL(
+            """
+            WITH live AS (%(live)s),
+                 stored AS (SELECT * FROM sales_store_expense_daily WHERE %(stored_where)s)
+            SELECT COALESCE(live.date, stored.date),
+                   COALESCE(live.company_id, stored.company_id),
+                   COALESCE(live.partner_id, stored.partner_id),
+                   COALESCE(live.product_categ_id, stored.product_categ_id),
+                   COALESCE(live.store_expense_id, stored.store_expense_id),
+                   COALESCE(live.resolved_expense_category_id, stored.resolved_expense_category_id),
+                   COALESCE(live.amount, 0), COALESCE(stored.amount, 0),
+                   COALESCE(live.quantity, 0), COALESCE(stored.quantity, 0)
+              FROM live
+         FULL JOIN stored
+                ON live.date = stored.date
+               AND live.company_id = stored.company_id
+               AND live.partner_id IS NOT DISTINCT FROM stored.partner_id
+               AND live.product_categ_id IS NOT DISTINCT FROM stored.product_categ_id
+               AND live.store_expense_id IS NOT DISTINCT FROM stored.store_expense_id
+               AND live.resolved_expense_category_id IS NOT DISTINCT FROM stored.resolved_expense_category_id
+             WHERE ABS(COALESCE(live.amount, 0) - COALESCE(stored.amount, 0)) > %(tolerance)s
+                OR ABS(COALESCE(live.quantity, 0) - COALESCE(stored.quantity, 0)) > %(tolerance)s
+            """,
+            live=self._lines_aggregate_query(where=self._range_filters(
+                self._local_date_sql(), SQL("so.company_id"), date_from, date_to, company_ids,
+            )),
+            stored_where=self._range_filters(
+                SQL.identifier('date'), SQL.identifier('company_id'), date_from, date_to, company_ids,
+            ),
+            tolerance=tolerance,
+        ))
+        mismatches = [{
+            'key': row[:6],
+            'expected_amount': row[6],
+            'stored_amount': row[7],
+            'expected_quantity': row[8],
+            'stored_quantity': row[9],
+        } for row in self.env.cr.fetchall()]
+        if mismatches:
+            _logger.warning("Daily sales aggregate differs from the order lines in %s cells", len(mismatches))
+        return mismatches
+
+    @api.model
+    def _cron_check_consistency(self):
+        """Check the last 31 days and rebuild them if they drifted"""
+        date_from = fields.Date.subtract(fields.Date.context_today(self), days=31)
+        if self._check_consistency(date_from=date_from):
+            self._rebuild(date_from=date_from)
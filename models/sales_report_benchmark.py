@@ -0,0 +1,556 @@
+import json
+import logging
+import platform
+import resource
+import time
+import tracemalloc
+
+from odoo import models, fields, api
+from odoo.tools import SQL
+
+from . import report_payload
+from .matrix_export import DenseMatrix, MatrixExporter
+from .sales_report_cache import REPORT_CACHE
+from .sales_report_mixin import LARGE_REPORT_TABLES, iter_plan_nodes
+
+_logger = logging.getLogger(__name__)
+
+# Seeded volumes, by number of order lines
+BENCHMARK_VOLUMES = {
+    '10k': {
+        'partners': 200, 'product_categories': 20, 'products': 500, 'expense_categories': 15,
+        'locations': 10, 'orders': 2000, 'lines': 10000, 'expenses': 5000,
+    },
+    '100k': {
+        'partners': 1000, 'product_categories': 50, 'products': 2000, 'expense_categories': 25,
+        'locations': 25, 'orders': 20000, 'lines': 100000, 'expenses': 50000,
+    },
+    '1m': {
+        'partners': 5000, 'product_categories': 100, 'products': 5000, 'expense_categories': 40,
+        'locations': 50, 'orders': 200000, 'lines': 1000000, 'expenses': 500000,
+    },
+}
+# Marker of the seeded records, removed by _cleanup()
+BENCHMARK_PREFIX = 'BENCH'
+BENCHMARK_WIZARDS = ('sales.store.expense.category.wizard', 'sales.product.category.wizard', 'sales.lines.report.wizard')
+# Wizards and extra filters whose report queries are explained by _run_explain
+EXPLAIN_BENCHMARK_WIZARDS = (
+    ('sales.store.expense.category.wizard', {}),
+    ('sales.store.expense.category.wizard', {'trend_interval': 'month', 'comparison': 'previous_year'}),
+    ('sales.product.category.wizard', {}),
+    ('sales.lines.report.wizard', {}),
+)
+
+# Matrix shapes (rows, columns) of the export benchmark
+EXPORT_BENCHMARK_SHAPES = ((40, 50), (100, 200), (200, 1000), (500, 2000))
+
+
+def _peak_rss_kb():
+    """Peak resident set size of this process over its whole life (kB on Linux)"""
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _current_rss_kb():
+    """Current resident set size of this process in kB (None without /proc)"""
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * resource.getpagesize() // 1024
+    except OSError:
+        return None
+
+
+def _start_memory_probe():
+    """Memory state before a phase, for _stop_memory_probe"""
+    if not tracemalloc.is_tracing():
+        return _current_rss_kb(), None
+    tracemalloc.reset_peak()
+    return _current_rss_kb(), tracemalloc.get_traced_memory()[0]
+
+
+def _stop_memory_probe(state):
+    """
+    Memory used by a phase: the growth of the RSS and, when tracemalloc traces (see
+    ``trace_memory``), the peak of the Python allocations above their level at the start
+    """
+    rss, traced = state
+    after = _current_rss_kb()
+    values = {'rss_delta_kb': after - rss if rss is not None and after is not None else None}
+    if traced is not None and tracemalloc.is_tracing():
+        values['peak_alloc_kb'] = (tracemalloc.get_traced_memory()[1] - traced) // 1024
+    return values
+
+
+class SalesReportBenchmark(models.AbstractModel):
+    """
+    Synthetic data and timings for the three report wizards.
+
+    Meant for a dedicated database, from an Odoo shell::
+
+        env['sales.report.benchmark']._seed('100k')
+        env.cr.commit()
+        env['sales.report.benchmark']._run(output_path='/tmp/bench-100k.json', label='abc1234')
+        env['sales.report.benchmark']._compare_results('/tmp/bench-base.json', '/tmp/bench-100k.json')
+
+    The orders, lines and expenses are cloned in SQL from a template record created
+    through the ORM (so that the columns added by other modules get valid values);
+    the partners, products and categories are created through the ORM.
+    """
+    _name = 'sales.report.benchmark'
+    _description = 'Sales Report Benchmark'
+
+    # -------------------------------------------------------------------------
+    # Seeding
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _seed(self, volume='10k', date_from=None, date_to=None, seed=0.42):
+        """
+        Create the synthetic dataset of ``volume`` (key of BENCHMARK_VOLUMES) with order
+        and expense dates spread over [date_from, date_to] (default: the last 365 days).
+        The daily sales aggregate is rebuilt for the range.
+
+        :return: dict of the created record counts
+        """
+        sizes = BENCHMARK_VOLUMES[volume]
+        date_to = date_to or fields.Date.context_today(self)
+        date_from = date_from or fields.Date.subtract(date_to, days=365)
+        company = self.env.company
+        start = time.perf_counter()
+
+        partners = self.env['res.partner'].create([
+            {'name': f'{BENCHMARK_PREFIX} Customer {i}', 'ref': BENCHMARK_PREFIX, 'customer_rank': 1}
+            for i in range(sizes['partners'])
+        ])
+        product_categories = self.env['product.category'].create([
+            {'name': f'{BENCHMARK_PREFIX} Category {i}'} for i in range(sizes['product_categories'])
+        ])
+        products = self.env['product.product'].create([{
+            'name': f'{BENCHMARK_PREFIX} Product {i}',
+            'default_code': f'{BENCHMARK_PREFIX}-{i}',
+            'categ_id': product_categories[i % len(product_categories)].id,
+            'list_price': 1 + i % 100,
+        } for i in range(sizes['products'])])
+        expense_categories = self.env['store.expense.category'].create([
+            {'name': f'{BENCHMARK_PREFIX} Expense {i}', 'code': f'{BENCHMARK_PREFIX}{i}'}
+            for i in range(sizes['expense_categories'])
+        ])
+        locations = self.env['store.expense.location'].create([
+            {'name': f'{BENCHMARK_PREFIX} Location {i}', 'company_id': company.id}
+            for i in range(sizes['locations'])
+        ])
+        _logger.info("Benchmark %s: created master data in %.1fs", volume, time.perf_counter() - start)
+
+        self.env.cr.execute("SELECT setseed(%s)", (seed,))
+        order_ids = self._seed_orders(sizes, partners, products, expense_categories, company, date_from, date_to)
+        self._seed_expenses(sizes, partners, expense_categories, locations, company, date_from, date_to)
+
+        # Resolved expense categories, computed once per product and written in SQL
+        resolve = self.env['sale.order.line']._resolve_product_expense_category
+        category_by_product = {product.id: resolve(product).id for product in products}
+        self.env.cr.execute("""
+            UPDATE sale_order_line sol
+               SET resolved_expense_category_id = COALESCE(sol.store_expense_id, mapping.category_id)
+              FROM unnest(%s::int[], %s::int[]) AS mapping(product_id, category_id)
+             WHERE sol.product_id = mapping.product_id
+               AND sol.order_id = ANY(%s)
+        """, (list(category_by_product), [category_id or None for category_id in category_by_product.values()], order_ids))
+
+        self.env.invalidate_all()
+        self.env['sales.store.expense.daily']._rebuild(date_from=date_from, date_to=date_to, company_ids=company.ids)
+        self.env['sales.report.cache']._invalidate()
+        counts = dict(sizes, seconds=round(time.perf_counter() - start, 1))
+        _logger.info("Benchmark %s: seeded %s", volume, counts)
+        return counts
+
+    @api.model
+    def _clone_rows(self, table, template_id, count, overrides):
+        """
+        Insert ``count`` copies of the row ``template_id`` of ``table``; ``overrides``
+        maps column names to SQL expressions of the series number ``g`` (1 to count).
+
+        :return: the ids of the new rows, in series order
+        """
+        self.env.cr.execute(
+            """
+            SELECT column_name FROM information_schema.columns
+             WHERE table_schema = current_schema() AND table_name = %s AND column_name != 'id'
+            """,
+            (table,),
+        )
+        columns = [column for column, in self.env.cr.fetchall()]
+        self.env.cr.execute(SQL(
+            """
+            INSERT INTO %(table)s (%(columns)s)
+            SELECT %(values)s
+              FROM %(table)s t, generate_series(1, %(count)s) g
+             WHERE t.id = %(template_id)s
+          ORDER BY g
+         RETURNING id
+            """,
+            table=SQL.identifier(table),
+            columns=SQL(", ").join(SQL.identifier(column) for column in columns),
+            values=SQL(", ").join(overrides.get(column, SQL.identifier('t', column)) for column in columns),
+            count=count,
+            template_id=template_id,
+        ))
+        return [row[0] for row in self.env.cr.fetchall()]
+
+    @api.model
+    def _random_date_sql(self, date_from, date_to):
+        return SQL("%s::timestamp + random() * (%s::timestamp + interval '1 day' - %s::timestamp)",
+                   date_from, date_to, date_from)
+
+    @api.model
+    def _seed_orders(self, sizes, partners, products, expense_categories, company, date_from, date_to):
+        template = self.env['sale.order'].create({
+            'partner_id': partners[0].id,
+            'company_id': company.id,
+            'order_line': [fields.Command.create({'product_id': products[0].id, 'product_uom_qty': 1})],
+        })
+        self.env.flush_all()
+
+        # One order in ten is left in draft
+        order_ids = self._clone_rows('sale_order', template.id, sizes['orders'], {
+            'name': SQL("%s || '/' || lpad(g::text, 7, '0')", BENCHMARK_PREFIX),
+            'partner_id': SQL("(%s::int[])[1 + floor(random() * %s)::int]", partners.ids, len(partners)),
+            'date_order': self._random_date_sql(date_from, date_to),
+            'state': SQL("CASE WHEN mod(g, 10) = 0 THEN 'draft' ELSE 'sale' END"),
+        })
+        self.env.cr.execute("""
+            UPDATE sale_order
+               SET partner_invoice_id = partner_id, partner_shipping_id = partner_id
+             WHERE id = ANY(%s)
+        """, (order_ids,))
+
+        # Lines spread evenly over the orders; 30% with an explicit store expense category
+        lines_per_order = max(1, sizes['lines'] // sizes['orders'])
+        qty = SQL("(1 + floor(random() * 10))")
+        self._clone_rows('sale_order_line', template.order_line[0].id, sizes['lines'], {
+            'order_id': SQL("(%s::int[])[1 + mod((g - 1) / %s, %s)]", order_ids, lines_per_order, len(order_ids)),
+            'product_id': SQL("(%s::int[])[1 + floor(random() * %s)::int]", products.ids, len(products)),
+            'name': SQL("%s || ' line ' || g", BENCHMARK_PREFIX),
+            'sequence': SQL("mod(g, %s)", lines_per_order),
+            'product_uom_qty': qty,
+            'price_unit': SQL("round((1 + random() * 99)::numeric, 2)"),
+            'store_expense_id': SQL(
+                "CASE WHEN random() < 0.3 THEN (%s::int[])[1 + floor(random() * %s)::int] END",
+                expense_categories.ids, len(expense_categories),
+            ),
+        })
+        # Values depending on the order / product / random price of each line
+        self.env.cr.execute("""
+            UPDATE sale_order_line sol
+               SET order_partner_id = so.partner_id,
+                   state = so.state,
+                   company_id = so.company_id,
+                   currency_id = so.currency_id,
+                   product_uom = pt.uom_id,
+                   price_subtotal = sol.product_uom_qty * sol.price_unit,
+                   price_total = sol.product_uom_qty * sol.price_unit,
+                   price_tax = 0
+              FROM sale_order so, product_product pp, product_template pt
+             WHERE so.id = sol.order_id
+               AND pp.id = sol.product_id
+               AND pt.id = pp.product_tmpl_id
+               AND so.id = ANY(%s)
+        """, (order_ids,))
+        template.unlink()
+        _logger.info("Benchmark: created %s orders and %s lines", len(order_ids), sizes['lines'])
+        return order_ids
+
+    @api.model
+    def _seed_expenses(self, sizes, partners, expense_categories, locations, company, date_from, date_to):
+        template = self.env['store.expense'].create({
+            'location_id': locations[0].id,
+            'category_id': expense_categories[0].id,
+            'amount': 1,
+            'company_id': company.id,
+            'reference': BENCHMARK_PREFIX,
+        })
+        self.env.flush_all()
+        # Half of the expenses are recorded for a customer
+        self._clone_rows('store_expense', template.id, sizes['expenses'], {
+            'date': SQL("(%s)::date", self._random_date_sql(date_from, date_to)),
+            'category_id': SQL("(%s::int[])[1 + floor(random() * %s)::int]", expense_categories.ids, len(expense_categories)),
+            'location_id': SQL("(%s::int[])[1 + floor(random() * %s)::int]", locations.ids, len(locations)),
+            'customer_id': SQL(
+                "CASE WHEN random() < 0.5 THEN (%s::int[])[1 + floor(random() * %s)::int] END",
+                partners.ids, len(partners),
+            ),
+            'amount': SQL("round((1 + random() * 499)::numeric, 2)"),
+        })
+        template.unlink()
+
+    @api.model
+    def _cleanup(self):
+        """Delete every record created by _seed()"""
+        like = f'{BENCHMARK_PREFIX}%'
+        self.env.cr.execute("DELETE FROM sale_order WHERE name LIKE %s", (f'{BENCHMARK_PREFIX}/%',))
+        self.env.cr.execute("DELETE FROM store_expense WHERE reference = %s", (BENCHMARK_PREFIX,))
+        self.env.invalidate_all()
+        self.env['product.product'].search([('default_code', '=like', like)]).product_tmpl_id.unlink()
+        self.env['product.category'].search([('name', '=like', f'{BENCHMARK_PREFIX} Category %')]).unlink()
+        self.env['store.expense.category'].with_context(active_test=False).search([('code', '=like', like)]).unlink()
+        self.env['store.expense.location'].with_context(active_test=False).search([('name', '=like', like)]).unlink()
+        self.env['res.partner'].with_context(active_test=False).search([('ref', '=', BENCHMARK_PREFIX)]).unlink()
+        self.env['sales.store.expense.daily']._rebuild()
+        return True
+
+    # -------------------------------------------------------------------------
+    # Timing
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _measure(self, results, phase, func):
+        """
+        Run ``func`` and store its wall time, SQL query count and memory use (see
+        _stop_memory_probe) in ``results[phase]``
+        """
+        cr = self.env.cr
+        queries = cr.sql_log_count
+        memory = _start_memory_probe()
+        start = time.perf_counter()
+        try:
+            with cr.savepoint():
+                value = func()
+        except Exception as e:  # noqa: BLE001 - e.g. no wkhtmltopdf: keep the other phases
+            _logger.warning("Benchmark phase %s failed: %s", phase, e)
+            results[phase] = {'error': str(e)}
+            return None
+        results[phase] = {
+            'seconds': round(time.perf_counter() - start, 4),
+            'queries': cr.sql_log_count - queries,
+            **_stop_memory_probe(memory),
+        }
+        return value
+
+    @api.model
+    def _run(self, date_from=None, date_to=None, wizards=BENCHMARK_WIZARDS, outputs=('xlsx', 'pdf'),
+             output_path=None, label=None, trace_memory=False):
+        """
+        Time the phases of every wizard of ``wizards`` over [date_from, date_to] (default:
+        the last 365 days, all customers) and optionally write the results as JSON.
+
+        :param trace_memory: also measure the peak of the Python allocations of every
+            phase with tracemalloc (which slows the phases down: compare the times of
+            runs without it)
+        :return: dict ``{label, date, ..., peak_rss_kb, wizards: {model: {phase: {seconds,
+                 queries, rss_delta_kb[, peak_alloc_kb]}}}}``
+        """
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            try:
+                return self._run(date_from, date_to, wizards, outputs, output_path, label)
+            finally:
+                tracemalloc.stop()
+
+        date_to = date_to or fields.Date.context_today(self)
+        date_from = date_from or fields.Date.subtract(date_to, days=365)
+        # Same date range as the wizards (days of the user's timezone)
+        wizard = self.env['sales.lines.report.wizard'].new({'date_from': date_from, 'date_to': date_to})
+        date_range = wizard._get_date_range_sql(SQL("so.date_order"))
+        self.env.cr.execute(SQL("""
+            SELECT COUNT(*) FROM sale_order_line sol JOIN sale_order so ON so.id = sol.order_id
+             WHERE so.company_id = %s AND %s
+        """, self.env.company.id, date_range))
+        line_count = self.env.cr.fetchone()[0]
+
+        results = {
+            'label': label,
+            'date': fields.Datetime.now().isoformat(),
+            'database': self.env.cr.dbname,
+            'python': platform.python_version(),
+            'date_from': date_from.isoformat(),
+            'date_to': date_to.isoformat(),
+            'order_lines': line_count,
+            'wizards': {},
+        }
+        for model in wizards:
+            REPORT_CACHE.clear()
+            wizard = self.env[model].create({
+                'company_id': self.env.company.id,
+                'date_from': date_from,
+                'date_to': date_to,
+            })
+            phases = results['wizards'][model] = {}
+            getattr(self, f"_run_{model.replace('.', '_')}")(wizard, phases, outputs)
+            _logger.info("Benchmark %s: %s", model, phases)
+        results['peak_rss_kb'] = _peak_rss_kb()
+
+        if output_path:
+            with open(output_path, 'w') as file:
+                json.dump(results, file, indent=2)
+        return results
+
+    def _run_matrix_phases(self, wizard, phases, outputs, query):
+        rows = self._measure(phases, 'query', query)
+        if rows is not None:
+            phases['query']['rows'] = len(rows)
+        data = self._measure(phases, 'report_data', wizard._get_report_data)
+        self._measure(phases, 'cached_report_data', wizard._get_report_data)
+        if data is not None:
+            payload = self._measure(phases, 'serialization', lambda: report_payload.dumps(
+                report_payload.encode_matrix(data, wizard.company_id.currency_id.decimal_places)))
+            if payload is not None:
+                phases['serialization']['bytes'] = len(payload)
+        for output in outputs:
+            self._measure(phases, output, lambda: wizard._render_report_job(output))
+
+    def _run_sales_store_expense_category_wizard(self, wizard, phases, outputs):
+        self._run_matrix_phases(wizard, phases, outputs, wizard._get_sales_groups)
+
+    def _run_sales_product_category_wizard(self, wizard, phases, outputs):
+        wizard.product_category_ids = self.env['product.category'].search([])
+        self._run_matrix_phases(
+            wizard, phases, outputs, lambda: wizard._get_category_customer_totals(wizard.product_category_ids))
+
+    def _run_sales_lines_report_wizard(self, wizard, phases, outputs):
+        rows = self._measure(phases, 'query', wizard._fetch_sales_line_rows)
+        if rows is not None:
+            phases['query']['rows'] = len(rows)
+        del rows
+        data = self._measure(phases, 'report_data', wizard._get_matrix_report_data)
+        if data is not None:
+            payload = self._measure(phases, 'serialization', lambda: json.dumps(data))
+            if payload is not None:
+                phases['serialization']['bytes'] = len(payload)
+        del data
+        self._measure(phases, 'preview_summary', wizard._get_preview_summary)
+        groups = self._measure(phases, 'preview_groups', lambda: wizard.get_preview_groups(0, 20))
+        if groups and groups['groups']:
+            self._measure(phases, 'preview_lines', lambda: wizard.get_preview_lines(groups['groups'][0]['partner_id'], 0, 100))
+        if 'xlsx' in outputs:
+            self._measure(phases, 'xlsx', lambda: wizard._render_report_job('xlsx'))
+
+    @api.model
+    def _run_explain(self, date_from=None, date_to=None, wizards=EXPLAIN_BENCHMARK_WIZARDS, analyze=True,
+                     tables=LARGE_REPORT_TABLES, output_path=None):
+        """
+        EXPLAIN (by default EXPLAIN ANALYZE) the report queries of every ``(model,
+        filters)`` of ``wizards`` over [date_from, date_to] (default: the last 365 days)
+        and list how each of the large ``tables`` is scanned, to check on a seeded
+        database that the date range filters use the indexes on date_order.
+
+        :return: ``{"<model>[ <filters>]": {query: {planning_ms, execution_ms, scans:
+                 [{table, node, index, rows, ms}], seq_scans}}}``
+        """
+        date_to = date_to or fields.Date.context_today(self)
+        date_from = date_from or fields.Date.subtract(date_to, days=365)
+        self.env.cr.execute("ANALYZE sale_order, sale_order_line")
+        results = {}
+        for model, filters in wizards:
+            wizard = self.env[model].create(dict(
+                filters, company_id=self.env.company.id, date_from=date_from, date_to=date_to))
+            name = f"{model} {json.dumps(filters, sort_keys=True)}" if filters else model
+            queries = results[name] = {}
+            with self.env.cr.savepoint():
+                plans = wizard._get_report_query_plans(analyze=analyze)
+            for query_name, explain in plans:
+                scans = [
+                    {
+                        'table': node['Relation Name'],
+                        'node': node['Node Type'],
+                        'index': node.get('Index Name'),
+                        'rows': node.get('Actual Rows', node.get('Plan Rows')),
+                        'ms': node.get('Actual Total Time'),
+                    }
+                    for node in iter_plan_nodes(explain['Plan'])
+                    if node.get('Relation Name') in tables
+                ]
+                queries[query_name] = {
+                    'planning_ms': explain.get('Planning Time'),
+                    'execution_ms': explain.get('Execution Time'),
+                    'scans': scans,
+                    'seq_scans': [scan['table'] for scan in scans if scan['node'] == 'Seq Scan'],
+                }
+            _logger.info("Explain benchmark %s: %s", name, queries)
+
+        if output_path:
+            with open(output_path, 'w') as file:
+                json.dump(results, file, indent=2)
+        return results
+
+    @api.model
+    def _run_matrix_export(self, shapes=EXPORT_BENCHMARK_SHAPES, formats=('xlsx', 'csv', 'ods'), output_path=None,
+                           trace_memory=False):
+        """
+        Time the matrix export engine on synthetic report data of every shape of
+        ``shapes`` (no database access): the conversion of the verbose matrix dict to a
+        DenseMatrix, then the export in every format of ``formats``.
+
+        :param trace_memory: see _run
+        :return: ``{"<rows>x<columns>": {cells, dense, <format>: {seconds, bytes, rss_delta_kb[, peak_alloc_kb]}}}``
+        """
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            try:
+                return self._run_matrix_export(shapes, formats, output_path)
+            finally:
+                tracemalloc.stop()
+        results = {}
+        for row_count, column_count in shapes:
+            rows = [{'id': index, 'name': f'{BENCHMARK_PREFIX} Category {index}'} for index in range(row_count)]
+            columns = [{'id': index, 'name': f'{BENCHMARK_PREFIX} Customer {index}'} for index in range(column_count)]
+            matrix_data = {
+                'rows': rows,
+                'columns': columns,
+                'values': {
+                    f"{row['id']}_{column['id']}": float((row['id'] * 7 + column['id']) % 1000)
+                    for row in rows for column in columns
+                },
+                'row_totals': {row['id']: 0.0 for row in rows},
+                'column_totals': {column['id']: 0.0 for column in columns},
+                'grand_total': 0.0,
+            }
+            shape = results[f'{row_count}x{column_count}'] = {'cells': row_count * column_count}
+            start = time.perf_counter()
+            matrix = DenseMatrix.from_report_data(matrix_data)
+            shape['dense'] = {'seconds': round(time.perf_counter() - start, 4)}
+            del matrix_data
+            exporter = MatrixExporter(matrix, title='Benchmark', info=['Synthetic data'], label_header='Category')
+            for fmt in formats:
+                memory = _start_memory_probe()
+                start = time.perf_counter()
+                content = exporter.export(fmt)
+                shape[fmt] = {
+                    'seconds': round(time.perf_counter() - start, 4),
+                    'bytes': len(content),
+                    **_stop_memory_probe(memory),
+                }
+                del content
+            _logger.info("Matrix export benchmark %sx%s: %s", row_count, column_count, shape)
+
+        if output_path:
+            with open(output_path, 'w') as file:
+                json.dump(results, file, indent=2)
+        return results
+
+    # -------------------------------------------------------------------------
+    # Comparison
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _compare_results(self, baseline_path, current_path):
+        """
+        Compare two result files of _run().
+
+        :return: ``{model: {phase: {baseline, current, ratio}}}`` of the wall times
+                 (ratio < 1 means faster)
+        """
+        with open(baseline_path) as file:
+            baseline = json.load(file)
+        with open(current_path) as file:
+            current = json.load(file)
+        comparison = {}
+        for model, phases in current['wizards'].items():
+            for phase, values in phases.items():
+                before = baseline['wizards'].get(model, {}).get(phase, {}).get('seconds')
+                after = values.get('seconds')
+                if before is None or after is None:
+                    continue
+                comparison.setdefault(model, {})[phase] = {
+                    'baseline': before,
+                    'current': after,
+                    'ratio': round(after / before, 3) if before else None,
+                }
+        return comparison
@@ -0,0 +1,278 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from array import array
+from collections import OrderedDict
+
+from odoo import models, api
+
+_logger = logging.getLogger(__name__)
+
+# Cache limits (ir.config_parameter, with defaults)
+CACHE_TTL_PARAM = 'sales_store_expense_report.report_cache_ttl'
+CACHE_MAX_BYTES_PARAM = 'sales_store_expense_report.report_cache_max_bytes'
+CACHE_MAX_ENTRIES_PARAM = 'sales_store_expense_report.report_cache_max_entries'
+CUBE_MAX_BYTES_PARAM = 'sales_store_expense_report.report_cube_max_bytes'
+DEFAULT_TTL = 300
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+DEFAULT_MAX_ENTRIES = 256
+DEFAULT_CUBE_MAX_BYTES = 16 * 1024 * 1024
+
+# Bumped after every commit changing report data; shared by all workers
+VERSION_SEQUENCE = 'sales_report_cache_version_seq'
+
+
+class ReportResultCache:
+    """
+    LRU of report results, bounded in age, number of entries and (estimated) size.
+
+    Entries are stored with the data version they were computed for; an entry of
+    another version is dropped on lookup, as are the entries past their TTL.
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()    # key -> (value, version, timestamp, size)
+        self.size = 0
+        self.version = None
+        self.lock = threading.RLock()
+        self.stats = {
+            'hits': 0,
+            'misses': 0,
+            'evictions': 0,
+            'expirations': 0,
+            'invalidations': 0,
+        }
+
+    def get(self, key, version, ttl):
+        """Return the value cached for ``key``, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, entry_version, timestamp, _size = entry
+                if entry_version != version:
+                    self._discard(key)
+                    self.stats['invalidations'] += 1
+                elif time.monotonic() - timestamp > ttl:
+                    self._discard(key)
+                    self.stats['expirations'] += 1
+                else:
+                    self.entries.move_to_end(key)
+                    self.stats['hits'] += 1
+                    return value
+            self.stats['misses'] += 1
+            return None
+
+    def put(self, key, value, version, size, max_bytes, max_entries):
+        if size > max_bytes:
+            return
+        with self.lock:
+            if version != self.version:
+                # The data changed: every entry of an older version is dead
+                for old_key in [k for k, entry in self.entries.items() if entry[1] != version]:
+                    self._discard(old_key)
+                    self.stats['invalidations'] += 1
+                self.version = version
+            self._discard(key)
+            self.entries[key] = (value, version, time.monotonic(), size)
+            self.size += size
+            while self.entries and (self.size > max_bytes or len(self.entries) > max_entries):
+                oldest_key = next(iter(self.entries))
+                self._discard(oldest_key)
+                self.stats['evictions'] += 1
+
+    def _discard(self, key):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= entry[3]
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+    def get_stats(self):
+        with self.lock:
+            return dict(self.stats, entries=len(self.entries), bytes=self.size)
+
+
+class ReportCube:
+    """
+    Amounts and line counts of a report per (row id, column id) over all its rows and
+    columns, e.g. per category and customer for a company and date range, in four
+    parallel arrays.
+    ``column_ids`` lists every column of the period, which may be more than the columns
+    having cells (e.g. customers with orders but no line in any category).
+    """
+
+    def __init__(self, cells, column_ids=None):
+        self.row_ids = array('q')
+        self.cell_column_ids = array('q')
+        self.amounts = array('d')
+        self.counts = array('q')
+        for row_id, column_id, amount, count in cells:
+            self.row_ids.append(row_id or 0)
+            self.cell_column_ids.append(column_id or 0)
+            self.amounts.append(amount)
+            self.counts.append(count)
+        if column_ids is None:
+            column_ids = set(self.cell_column_ids) - {0}
+        self.column_ids = array('q', sorted(column_ids))
+
+    def slice(self, row_ids=None, column_ids=None):
+        """
+        Cells ``(row id, column id, amount, line count)`` of the given rows and columns
+        (all of them when None or empty); id 0 stands for no row / column
+        """
+        rows = set(row_ids) if row_ids else None
+        columns = set(column_ids) if column_ids else None
+        return [
+            (row_id, column_id, amount, count)
+            for row_id, column_id, amount, count in zip(self.row_ids, self.cell_column_ids, self.amounts, self.counts)
+            if (rows is None or row_id in rows) and (columns is None or column_id in columns)
+        ]
+
+    def get_size(self):
+        return sum(
+            values.itemsize * len(values)
+            for values in (self.row_ids, self.cell_column_ids, self.amounts, self.counts, self.column_ids)
+        )
+
+
+# Process-wide cache shared by the report wizards of all databases (keys include the database)
+REPORT_CACHE = ReportResultCache()
+
+
+class SalesReportCache(models.AbstractModel):
+    """
+    Result cache of the report wizards, keyed by a hash of the normalized filters.
+
+    Report data changes when confirmed order lines, the date / state / customer / company
+    of confirmed orders, or the store expense categories change; those writes call
+    _invalidate(), which bumps a database sequence once the transaction is committed.
+    Every lookup compares the entry with the current value of that sequence, so all
+    workers drop their entries after a change. Other changes (e.g. a renamed customer)
+    are picked up when the entries expire.
+    """
+    _name = 'sales.report.cache'
+    _description = 'Sales Report Result Cache'
+
+    def init(self):
+        self.env.cr.execute(f"CREATE SEQUENCE IF NOT EXISTS {VERSION_SEQUENCE}")
+
+    @api.model
+    def _get_version(self):
+        self.env.cr.execute(f"SELECT last_value FROM {VERSION_SEQUENCE}")
+        return self.env.cr.fetchone()[0]
+
+    @api.model
+    def _get_key(self, wizard, kind):
+        """Hash of the wizard filters, the report ``kind`` and what else changes the result"""
+        params = wizard._get_report_filter_params()
+        for fname, value in params.items():
+            if isinstance(value, list):
+                params[fname] = sorted(value)
+        user = self.env.user
+        # Salesmen restricted to their own documents get their own entries
+        scope = 'all' if user.has_group('sales_team.group_sale_salesman_all_leads') else user.id
+        key = json.dumps({
+            'db': self.env.cr.dbname,
+            'model': wizard._name,
+            'kind': kind,
+            'params': params,
+            'lang': self.env.lang,
+            # The report days are those of the user's timezone
+            'tz': wizard._get_report_tz().zone,
+            'scope': scope,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    @api.model
+    def _get_or_compute(self, wizard, kind, compute):
+        """
+        Return the cached result of ``compute()`` for the filters of ``wizard``.
+        The result is shared between requests: callers must not modify it.
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl = int(ICP.get_param(CACHE_TTL_PARAM, DEFAULT_TTL))
+        if ttl <= 0:
+            return compute()
+
+        key = self._get_key(wizard, kind)
+        version = self._get_version()
+        value = REPORT_CACHE.get(key, version, ttl)
+        if value is not None:
+            _logger.debug("Report cache hit for %s (%s)", wizard._name, kind)
+            return value
+
+        value = compute()
+        size = len(json.dumps(value, default=str))
+        REPORT_CACHE.put(
+            key, value, version, size,
+            max_bytes=int(ICP.get_param(CACHE_MAX_BYTES_PARAM, DEFAULT_MAX_BYTES)),
+            max_entries=int(ICP.get_param(CACHE_MAX_ENTRIES_PARAM, DEFAULT_MAX_ENTRIES)),
+        )
+        return value
+
+    @api.model
+    def _get_cube(self, wizard, params, build):
+        """
+        ReportCube of ``wizard``, kept per wizard record so that its later previews with
+        narrower filters are sliced from it instead of queried. The cube is rebuilt by
+        ``build()`` when ``params`` (the filters it cannot be sliced by, e.g. company and
+        dates) change, and like the other entries when the report data changes or it
+        expires. A cube larger than CUBE_MAX_BYTES_PARAM is used once but not kept.
+
+        :return: the cube, or None when the cache is disabled or the wizard not saved
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        ttl = int(ICP.get_param(CACHE_TTL_PARAM, DEFAULT_TTL))
+        if ttl <= 0 or not isinstance(wizard.id, int):
+            return None
+
+        key = hashlib.sha256(json.dumps({
+            'db': self.env.cr.dbname,
+            'model': wizard._name,
+            'kind': 'cube',
+            'id': wizard.id,
+        }, sort_keys=True).encode()).hexdigest()
+        params = json.dumps(dict(params, tz=wizard._get_report_tz().zone), sort_keys=True, default=str)
+        version = self._get_version()
+        entry = REPORT_CACHE.get(key, version, ttl)
+        if entry is not None and entry[0] == params:
+            _logger.debug("Report cube hit for %s %s", wizard._name, wizard.id)
+            wizard._report_metrics(report_cube='hit')
+            return entry[1]
+
+        cube = build()
+        wizard._report_metrics(report_cube='built')
+        size = cube.get_size()
+        if size <= int(ICP.get_param(CUBE_MAX_BYTES_PARAM, DEFAULT_CUBE_MAX_BYTES)):
+            REPORT_CACHE.put(
+                key, (params, cube), version, size,
+                max_bytes=int(ICP.get_param(CACHE_MAX_BYTES_PARAM, DEFAULT_MAX_BYTES)),
+                max_entries=int(ICP.get_param(CACHE_MAX_ENTRIES_PARAM, DEFAULT_MAX_ENTRIES)),
+            )
+        return cube
+
+    @api.model
+    def _invalidate(self, orders=None):
+        """
+        Invalidate the cached reports once the current transaction is committed.
+        With ``orders``, only when one of them is confirmed (call it with the values
+        before and after a change).
+        """
+        if orders is not None and not any(order.state in ('sale', 'done') for order in orders):
+            return
+        postcommit = self.env.cr.postcommit
+        if 'sales_report_cache.invalidate' not in postcommit.data:
+            postcommit.data['sales_report_cache.invalidate'] = True
+            cr = self.env.cr
+            # nextval() is not transactional: it is visible to every worker right away
+            postcommit.add(lambda: cr.execute(f"SELECT nextval('{VERSION_SEQUENCE}')"))
+
+    @api.model
+    def _get_report_cache_stats(self):
+        """Hit/miss/eviction counters and size of the cache (this worker only)"""
+        return REPORT_CACHE.get_stats()
@@ -0,0 +1,168 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import tempfile
+import time
+from urllib.parse import urlencode
+
+from odoo import models, api
+from odoo.tools import config
+
+from .matrix_export import EXPORT_MIMETYPES
+
+_logger = logging.getLogger(__name__)
+
+# Lifetime of the stored exports in seconds (ir.config_parameter, with default)
+EXPORT_TTL_PARAM = 'sales_store_expense_report.export_ttl'
+DEFAULT_EXPORT_TTL = 24 * 3600
+# Served content types, by file extension (anything else is a plain download)
+EXPORT_FILE_MIMETYPES = dict(EXPORT_MIMETYPES, pdf='application/pdf', json='application/json')
+TOKEN_RE = re.compile(r'^[0-9a-f]{64}$')
+# Size of the chunks read to hash the stored files
+FILE_CHUNK_SIZE = 1024 * 1024
+
+
+class SalesReportExportStore(models.AbstractModel):
+    """
+    Temporary storage of the generated reports that must outlive the request producing
+    them (background job results, large PDFs rendered by a button), instead of
+    ir.attachment records.
+
+    The files are kept in the ``sales_report_exports`` directory of the database
+    filestore, in a sub-directory per user (the user of the environment storing them),
+    named by the SHA-256 of their content: storing the same report twice keeps one file
+    and only extends its lifetime. A file is only served to the user who stored it, for
+    EXPORT_TTL_PARAM seconds after it was last stored, then removed by the cleanup cron.
+    """
+    _name = 'sales.report.export.store'
+    _description = 'Sales Report Export Storage'
+
+    @api.model
+    def _get_root_directory(self):
+        return os.path.join(config.filestore(self.env.cr.dbname), 'sales_report_exports')
+
+    @api.model
+    def _get_directory(self):
+        """Directory of the files of the current user"""
+        return os.path.join(self._get_root_directory(), str(self.env.uid))
+
+    @api.model
+    def _get_ttl(self):
+        return int(self.env['ir.config_parameter'].sudo().get_param(EXPORT_TTL_PARAM, DEFAULT_EXPORT_TTL))
+
+    @api.model
+    def _store(self, content):
+        """Store ``content`` (bytes) for the current user and return its token"""
+        token = hashlib.sha256(content).hexdigest()
+        directory = self._get_directory()
+        path = os.path.join(directory, token)
+        if os.path.exists(path):
+            # Same report again: keep the file, restart its lifetime
+            os.utime(path)
+            return token
+        os.makedirs(directory, exist_ok=True)
+        # Write under a temporary name and rename, so that a file is never served half written
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        try:
+            with os.fdopen(fd, 'wb') as file:
+                file.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            os.unlink(tmp_path)
+            raise
+        return token
+
+    @api.model
+    def _store_file(self, path):
+        """
+        Move the file ``path`` (e.g. a temporary file written in constant memory) into
+        the storage of the current user and return its token, without loading it
+        """
+        digest = hashlib.sha256()
+        with open(path, 'rb') as file:
+            for chunk in iter(lambda: file.read(FILE_CHUNK_SIZE), b''):
+                digest.update(chunk)
+        token = digest.hexdigest()
+        directory = self._get_directory()
+        target = os.path.join(directory, token)
+        if os.path.exists(target):
+            os.utime(target)
+            os.unlink(path)
+            return token
+        os.makedirs(directory, exist_ok=True)
+        # Moved under a temporary name (copied when on another file system), then renamed
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp_')
+        os.close(fd)
+        try:
+            shutil.move(path, tmp_path)
+            os.replace(tmp_path, target)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+        return token
+
+    @api.model
+    def _get_path(self, token):
+        """Path of the file of ``token`` stored by the current user, or None if unknown or expired"""
+        if not token or not TOKEN_RE.match(token):
+            return None
+        path = os.path.join(self._get_directory(), token)
+        try:
+            if time.time() - os.path.getmtime(path) > self._get_ttl():
+                return None
+        except OSError:
+            return None
+        return path
+
+    @api.model
+    def _read(self, token):
+        path = self._get_path(token)
+        if not path:
+            return None
+        with open(path, 'rb') as file:
+            return file.read()
+
+    @api.model
+    def _get_url(self, token, file_name):
+        return f'/sales_store_expense_report/export_file/{token}?{urlencode({"filename": file_name})}'
+
+    @api.model
+    def _get_download_action(self, file_name, content):
+        """Store ``content`` and return the action downloading it as ``file_name``"""
+        return {
+            'type': 'ir.actions.act_url',
+            'url': self._get_url(self._store(content), file_name),
+            'target': 'self',
+        }
+
+    @api.model
+    def _gc_exports(self):
+        """Remove the expired files (and the temporary files of interrupted writes) of all the users"""
+        root = self._get_root_directory()
+        if not os.path.isdir(root):
+            return
+        limit = time.time() - self._get_ttl()
+        removed = 0
+        with os.scandir(root) as user_entries:
+            # Files directly in the root directory were stored before the per-user directories
+            directories = [root] + [entry.path for entry in user_entries if entry.is_dir()]
+        for directory in directories:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file() and entry.stat().st_mtime < limit:
+                            os.unlink(entry.path)
+                            removed += 1
+                    except OSError:
+                        # Removed or stored again meanwhile
+                        continue
+        if removed:
+            _logger.info("Removed %s expired report exports", removed)
+
+    @api.model
+    def _cron_gc_exports(self):
+        self._gc_exports()
+
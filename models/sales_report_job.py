@@ -0,0 +1,289 @@
+import json
+import logging
+import os
+import traceback
+from datetime import timedelta
+
+from odoo import models, fields, api, _
+from odoo.exceptions import UserError
+
+from .sales_report_run import report_run
+
+_logger = logging.getLogger(__name__)
+
+# Limit of the background jobs waiting for one company (ir.config_parameter, with default)
+MAX_PENDING_PARAM = 'sales_store_expense_report.job_max_pending_per_company'
+# Running jobs older than this are considered dead (worker killed, server restarted)
+JOB_TIMEOUT = timedelta(hours=2)
+
+XLSX_MIMETYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+
+class SalesReportJobMixin(models.AbstractModel):
+    """
+    Background generation for the report wizards (on top of sales.report.mixin).
+
+    A wizard inheriting this mixin implements ``_render_report_job(report_type)``; its
+    "Run in Background" buttons then queue a sales.report.job, recreated from the
+    filters of ``_report_filter_fields``, instead of rendering in the HTTP request.
+    """
+    _name = 'sales.report.job.mixin'
+    _description = 'Sales Report Background Job Mixin'
+
+    def action_run_in_background(self):
+        """Queue the report given by the ``report_type`` context key (xlsx, pdf, preview)"""
+        self.ensure_one()
+        if self.date_from > self.date_to:
+            raise UserError(_("Start date cannot be after end date."))
+
+        report_type = self.env.context.get('report_type', 'xlsx')
+        # The users can only read the jobs: they are created and updated by the job service
+        job = self.env['sales.report.job'].sudo().create({
+            'res_model': self._name,
+            'report_type': report_type,
+            'company_id': self.company_id.id,
+            'user_id': self.env.uid,
+            'params': self._get_report_filter_params(),
+        })
+        self.env.ref('sales_store_expense_report.ir_cron_process_report_jobs').sudo()._trigger()
+        return job.sudo(False)._get_form_action()
+
+    def _report_progress(self, phase, progress=None, rows=None):
+        """Record the progress of the background job running this wizard, if any"""
+        job_id = self.env.context.get('report_job_id')
+        if job_id:
+            self.env['sales.report.job'].browse(job_id)._set_progress(phase, progress, rows)
+
+    def _render_report_job(self, report_type):
+        """
+        Render the report for a background job.
+
+        :return: tuple ``(file_name, content, mimetype)``; the content is bytes, or the
+                 path of a temporary file, moved into the export storage without being
+                 read in memory
+        """
+        raise UserError(_("Background generation is not available for this report."))
+
+    def _get_preview_job_payload(self):
+        """JSON payload stored by a 'preview' job, restored by _open_preview_job_payload"""
+        raise UserError(_("Background preview is not available for this report."))
+
+    def _open_preview_job_payload(self, payload):
+        raise UserError(_("Background preview is not available for this report."))
+
+
+class SalesReportJob(models.Model):
+    _name = 'sales.report.job'
+    _description = 'Sales Report Background Job'
+    _order = 'create_date desc, id desc'
+
+    name = fields.Char(string='Report', compute='_compute_name')
+    res_model = fields.Selection([
+        ('sales.store.expense.category.wizard', 'Store Expense Category Report'),
+        ('sales.product.category.wizard', 'Product Category Report'),
+        ('sales.lines.report.wizard', 'Sales Lines Report'),
+    ], string='Report Type', required=True, readonly=True)
+    report_type = fields.Selection([
+        ('preview', 'Preview'),
+        ('xlsx', 'Excel'),
+        ('pdf', 'PDF'),
+    ], string='Output', required=True, readonly=True)
+    params = fields.Json(string='Filters', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', required=True, readonly=True)
+    user_id = fields.Many2one('res.users', string='Requested By', default=lambda self: self.env.user, readonly=True)
+    state = fields.Selection([
+        ('queued', 'Queued'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='queued', required=True, readonly=True, index=True)
+    phase = fields.Char(string='Phase', readonly=True)
+    progress = fields.Float(string='Progress (%)', readonly=True)
+    rows_processed = fields.Integer(string='Rows Processed', readonly=True)
+    date_started = fields.Datetime(string='Started', readonly=True)
+    date_finished = fields.Datetime(string='Finished', readonly=True)
+    result_token = fields.Char(string='Result', readonly=True, copy=False)
+    result_file_name = fields.Char(string='Result File Name', readonly=True, copy=False)
+    error = fields.Text(string='Error', readonly=True)
+
+    @api.depends('res_model', 'report_type', 'create_date')
+    def _compute_name(self):
+        models_names = dict(self._fields['res_model'].selection)
+        types_names = dict(self._fields['report_type'].selection)
+        for job in self:
+            job.name = f"{models_names.get(job.res_model, '')} ({types_names.get(job.report_type, '')})"
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        ICP = self.env['ir.config_parameter'].sudo()
+        max_pending = int(ICP.get_param(MAX_PENDING_PARAM, 5))
+        for vals in vals_list:
+            # Serialize the creations for the company, so that concurrent requests cannot
+            # all pass the check
+            self.env.cr.execute(
+                "SELECT pg_advisory_xact_lock(hashtext('sales_report_job'), %s)", (vals.get('company_id') or 0,))
+            pending = self.sudo().search_count([
+                ('company_id', '=', vals.get('company_id')),
+                ('state', 'in', ('queued', 'running')),
+            ])
+            if pending >= max_pending:
+                raise UserError(_(
+                    "There are already %s reports waiting for this company. "
+                    "Please try again when they are finished.", pending))
+        return super().create(vals_list)
+
+    def _get_form_action(self):
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Report Job'),
+            'res_model': self._name,
+            'view_mode': 'form',
+            'res_id': self.id,
+            'target': 'new',
+        }
+
+    # -------------------------------------------------------------------------
+    # Progress
+    # -------------------------------------------------------------------------
+
+    def _set_progress(self, phase, progress=None, rows=None):
+        """Write the progress in a separate transaction so that it is visible while the job runs"""
+        self.ensure_one()
+        with self.env.registry.cursor() as cr:
+            cr.execute("""
+                UPDATE sales_report_job
+                   SET phase = %s,
+                       progress = COALESCE(%s, progress),
+                       rows_processed = COALESCE(%s, rows_processed)
+                 WHERE id = %s
+            """, (phase, progress, rows, self.id))
+
+    @api.model
+    def get_job_status(self, job_id):
+        """Polled by the job form while the report is being generated"""
+        job = self.browse(job_id).exists()
+        if not job:
+            return {}
+        return {
+            'state': job.state,
+            'phase': job.phase,
+            'progress': job.progress,
+            'rows_processed': job.rows_processed,
+            'error': job.error,
+        }
+
+    # -------------------------------------------------------------------------
+    # Processing
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _cron_process_jobs(self):
+        """
+        Run the queued jobs one at a time. Odoo never runs a cron twice at the same time,
+        so this is the only runner; the number of jobs waiting per company is limited by
+        MAX_PENDING_PARAM when they are created.
+
+        The companies take turns: the next job is the oldest one of the company whose last
+        job started the longest ago (or never), so that the queue of one company does not
+        hold the reports of the others behind it.
+        """
+        self._fail_stale_jobs()
+        while True:
+            # Locked, in case the method is also called outside of the cron
+            self.env.cr.execute("""
+                SELECT job.id
+                  FROM sales_report_job job
+                 WHERE job.state = 'queued'
+              ORDER BY (SELECT MAX(started.date_started)
+                          FROM sales_report_job started
+                         WHERE started.company_id = job.company_id) ASC NULLS FIRST,
+                       job.create_date, job.id
+                 LIMIT 1
+                   FOR UPDATE OF job SKIP LOCKED
+            """)
+            row = self.env.cr.fetchone()
+            if not row:
+                break
+            job = self.browse(row[0])
+            job.write({'state': 'running', 'date_started': fields.Datetime.now(), 'phase': _('Starting'), 'progress': 0})
+            self.env.cr.commit()
+            vals = job._run()
+            # The final state is written in a new transaction: the job row was updated by
+            # _set_progress meanwhile, which would conflict with the job's own snapshot
+            self.env.cr.commit()
+            job.write(vals)
+            self.env.cr.commit()
+
+    @api.model
+    def _fail_stale_jobs(self):
+        stale = self.search([
+            ('state', '=', 'running'),
+            ('date_started', '<', fields.Datetime.now() - JOB_TIMEOUT),
+        ])
+        stale.write({'state': 'failed', 'error': _("The job did not finish in time."), 'date_finished': fields.Datetime.now()})
+
+    def _run(self):
+        """Generate the report and keep it in the export storage.
+
+        :return: values for the final state of the job
+        """
+        self.ensure_one()
+        content = None
+        try:
+            with self.env.cr.savepoint():
+                wizard_model = self.env[self.res_model].with_user(self.user_id).with_company(self.company_id)
+                wizard = wizard_model._create_from_report_filter_params(self.params).with_context(report_job_id=self.id)
+                with report_run(wizard, f'job_{self.report_type}'):
+                    if self.report_type == 'preview':
+                        file_name = 'preview.json'
+                        content = json.dumps(wizard._get_preview_job_payload()).encode()
+                    else:
+                        # The content type is served from the file name extension
+                        file_name, content, _mimetype = wizard._render_report_job(self.report_type)
+                    size = len(content) if isinstance(content, bytes) else os.path.getsize(content)
+                    wizard._report_metrics(payload_bytes=size, job_id=self.id)
+
+                self._set_progress(_('Storing result'), 95)
+                # Stored for the requesting user: only they can download it
+                Store = self.env['sales.report.export.store'].with_user(self.user_id)
+                token = Store._store(content) if isinstance(content, bytes) else Store._store_file(content)
+        except Exception as e:
+            if isinstance(content, str) and os.path.exists(content):
+                os.unlink(content)
+            _logger.exception("Report job %s failed", self.id)
+            return {
+                'state': 'failed',
+                'error': str(e) if isinstance(e, UserError) else traceback.format_exc(),
+                'date_finished': fields.Datetime.now(),
+            }
+        return {
+            'state': 'done',
+            'phase': _('Done'),
+            'progress': 100,
+            'result_token': token,
+            'result_file_name': file_name,
+            'date_finished': fields.Datetime.now(),
+        }
+
+    # -------------------------------------------------------------------------
+    # Result
+    # -------------------------------------------------------------------------
+
+    def action_download(self):
+        """Download the generated file, or reopen the wizard with the generated preview"""
+        self.ensure_one()
+        if self.state != 'done' or not self.result_token:
+            raise UserError(_("The report is not ready yet."))
+        Store = self.env['sales.report.export.store']
+        if not Store._get_path(self.result_token):
+            raise UserError(_("The generated report has expired, please run it again."))
+        if self.report_type == 'preview':
+            payload = json.loads(Store._read(self.result_token))
+            wizard = self.env[self.res_model]._create_from_report_filter_params(self.params)
+            return wizard._open_preview_job_payload(payload)
+        return {
+            'type': 'ir.actions.act_url',
+            'url': Store._get_url(self.result_token, self.result_file_name),
+            'target': 'self',
+        }
@@ -0,0 +1,267 @@
+import hashlib
+import json
+import logging
+from contextlib import nullcontext
+from datetime import datetime, time, timedelta
+
+import pytz
+
+from odoo import models, fields, api, _
+from odoo.exceptions import AccessError, UserError
+from odoo.tools import SQL
+
+from .sales_report_run import current_recorder
+
+_logger = logging.getLogger(__name__)
+
+# Users allowed to read the reports through the export and data routes
+REPORT_USER_GROUP = 'sales_team.group_sale_salesman'
+# Users reading all the sale orders (the others only see theirs, per the record rules)
+ALL_ORDERS_GROUP = 'sales_team.group_sale_salesman_all_leads'
+
+# Tables that the report queries must never read with a sequential scan
+LARGE_REPORT_TABLES = ('sale_order_line', 'sale_order', 'store_expense', 'sales_store_expense_daily')
+
+# Small tables whose last write_date is part of the data version of the reports (the
+# changes of the sales lines, orders and store expenses bump the report cache version)
+REPORT_WATERMARK_TABLES = ('product_category', 'store_expense_category', 'store_expense_location')
+
+
+def iter_plan_nodes(plan):
+    """Nodes of an EXPLAIN (FORMAT JSON) plan tree, ``plan`` included"""
+    nodes = [plan]
+    while nodes:
+        node = nodes.pop()
+        yield node
+        nodes.extend(node.get('Plans', ()))
+
+
+class SalesReportMixin(models.AbstractModel):
+    """
+    Common base of the report wizards.
+
+    A wizard inheriting this mixin lists its filter fields in ``_report_filter_fields``
+    (the filters serialized for the report cache, the background jobs and the HTTP
+    exports) and gets the report date ranges, the instrumentation of its phases, the
+    query plan checks and the data version (ETag) of the data API.
+    """
+    _name = 'sales.report.mixin'
+    _description = 'Sales Report Mixin'
+
+    _report_filter_fields = ()
+
+    def _get_report_filter_params(self):
+        """Serialize the filter fields, e.g. so that the wizard can be recreated by a background job"""
+        self.ensure_one()
+        params = {}
+        for fname in self._report_filter_fields:
+            field = self._fields[fname]
+            value = self[fname]
+            if field.type == 'many2one':
+                params[fname] = value.id
+            elif field.type in ('many2many', 'one2many'):
+                params[fname] = value.ids
+            else:
+                params[fname] = field.convert_to_write(value, self)
+        return params
+
+    @api.model
+    def _create_from_report_filter_params(self, params):
+        vals = {}
+        for fname, value in params.items():
+            if self._fields[fname].type == 'many2many':
+                value = [fields.Command.set(value)]
+            vals[fname] = value
+        return self.create(vals)
+
+    def _new_from_http_params(self, params):
+        """
+        In-memory wizard (not saved) with the filters given as HTTP query parameters,
+        for the export and data API controllers: the fields of _report_filter_fields, ids
+        comma separated, dates in ISO format; date_from and date_to are required.
+
+        :raise ValueError: for a missing or invalid filter
+        :raise AccessError: for a company of another user
+        """
+        vals = {}
+        for fname in self._report_filter_fields:
+            value = params.get(fname)
+            if value in (None, ''):
+                continue
+            field = self._fields[fname]
+            if field.type in ('many2one', 'many2many'):
+                ids = [int(record_id) for record_id in str(value).split(',') if record_id]
+                if len(self.env[field.comodel_name].browse(ids).exists()) != len(set(ids)):
+                    raise ValueError(f"Unknown record in {fname}: {value}")
+                vals[fname] = [fields.Command.set(ids)] if field.type == 'many2many' else ids[0]
+            elif field.type == 'date':
+                vals[fname] = fields.Date.to_date(value)
+            elif field.type == 'boolean':
+                vals[fname] = str(value).lower() in ('1', 'true', 'yes')
+            elif field.type == 'selection':
+                if value not in dict(field._description_selection(self.env)):
+                    raise ValueError(f"Invalid value for {fname}: {value}")
+                vals[fname] = value
+            else:
+                vals[fname] = value
+        if not vals.get('date_from') or not vals.get('date_to'):
+            raise ValueError("date_from and date_to are required")
+        if vals['date_from'] > vals['date_to']:
+            raise ValueError("date_from cannot be after date_to")
+
+        company = self.env['res.company'].browse(vals.get('company_id') or self.env.company.id)
+        if company not in self.env.user.company_ids:
+            raise AccessError(_("You do not have access to this company."))
+        vals['company_id'] = company.id
+        wizard = self.with_company(company).new(vals)
+        try:
+            wizard._check_report_filters()
+        except UserError as e:
+            raise ValueError(str(e)) from e
+        return wizard
+
+    def _check_report_filters(self):
+        """
+        Reject the filter combinations that the report does not support
+
+        :raise UserError: with the reason
+        """
+
+    def _get_visible_orders_sql(self, column):
+        """
+        SQL condition keeping the sale orders of id ``column`` that the user can read under
+        the record rules, for the raw SQL report queries (which bypass them): TRUE for the
+        users seeing all the orders, else a subquery of the orders they can read
+        """
+        if self.env.su or self.env.user.has_group(ALL_ORDERS_GROUP):
+            return SQL("TRUE")
+        return SQL("%s IN %s", column, self.env['sale.order']._search([]).subselect())
+
+    # -------------------------------------------------------------------------
+    # Instrumentation and downloads
+    # -------------------------------------------------------------------------
+
+    def _report_phase(self, name):
+        """Context manager timing the phase ``name`` of the instrumented report run, if any"""
+        recorder = current_recorder()
+        return recorder.phase(name) if recorder else nullcontext()
+
+    def _report_metrics(self, rows=None, payload_bytes=None, **extra):
+        """Add scanned rows / payload bytes (and other values) to the instrumented report run"""
+        recorder = current_recorder()
+        if not recorder:
+            return
+        if rows:
+            recorder.rows += rows
+        if payload_bytes:
+            recorder.payload_bytes += payload_bytes
+        recorder.extra.update(extra)
+
+    def _get_direct_download_action(self, export_format):
+        """Action downloading the export of the wizard, generated by the download route itself"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_url',
+            'url': f'/sales_store_expense_report/download/{self._name}/{self.id}.{export_format}',
+            'target': 'self',
+        }
+
+    def _get_report_download_action(self, file_name, content):
+        """Keep a generated report in the export storage and return the action downloading it"""
+        return self.env['sales.report.export.store']._get_download_action(file_name, content)
+
+
+    # -------------------------------------------------------------------------
+    # Date ranges, query plans and data version
+    # -------------------------------------------------------------------------
+
+    def _get_report_tz(self):
+        """Timezone of the report dates: the one of the context, else of the user"""
+        return pytz.timezone(self.env.context.get('tz') or self.env.user.tz or 'UTC')
+
+    def _get_utc_bounds(self, date_from=None, date_to=None):
+        """
+        UTC datetimes bounding the days ``date_from`` to ``date_to`` (default: the dates
+        of the wizard) of the report timezone, as the half-open range [start, end): the
+        orders of the whole last day are included, whatever their time.
+        """
+        tz = self._get_report_tz()
+        date_from = date_from or self.date_from
+        date_to = date_to or self.date_to
+        start = tz.localize(datetime.combine(date_from, time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        end = tz.localize(datetime.combine(date_to + timedelta(days=1), time.min)).astimezone(pytz.utc).replace(tzinfo=None)
+        return start, end
+
+    def _get_date_range_domain(self, field_name='date_order', date_from=None, date_to=None):
+        """
+        Domain restricting the Datetime field ``field_name`` to the days of the report
+        (see _get_utc_bounds). The field is compared to constants only, so that an index
+        on its column can be used.
+        """
+        start, end = self._get_utc_bounds(date_from, date_to)
+        return [(field_name, '>=', start), (field_name, '<', end)]
+
+    def _get_date_range_sql(self, column, date_from=None, date_to=None):
+        """SQL condition of _get_date_range_domain for the timestamp expression ``column``"""
+        start, end = self._get_utc_bounds(date_from, date_to)
+        return SQL("(%s >= %s AND %s < %s)", column, start, column, end)
+
+    def _get_report_queries(self):
+        """Main queries of the report for the current filters, as ``[(name, SQL)]``"""
+        return []
+
+    def _get_report_query_plans(self, analyze=False):
+        """
+        EXPLAIN (FORMAT JSON) of the report queries, with ``analyze`` EXPLAIN ANALYZE
+        (the queries are run, their plan nodes get the actual rows and times).
+
+        :return: list of ``(query name, explain dict)`` (keys 'Plan', 'Planning Time'...)
+        """
+        self.ensure_one()
+        self.env.flush_all()
+        options = SQL("ANALYZE, BUFFERS, FORMAT JSON") if analyze else SQL("FORMAT JSON")
+        plans = []
+        for name, query in self._get_report_queries():
+            self.env.cr.execute(SQL("EXPLAIN (%s) %s", options, query))
+            plans.append((name, self.env.cr.fetchone()[0][0]))
+        return plans
+
+    def _explain_report_queries(self, tables=LARGE_REPORT_TABLES):
+        """
+        EXPLAIN the report queries and list the sequential scans on ``tables``.
+        Meant to be run on a database of realistic size (on a small one the planner
+        rightly prefers sequential scans), e.g. from a shell after seeding data, or
+        with sequential scans disabled as in tests/test_report_queries.py.
+
+        :return: list of ``(query name, table)``, empty when every scan uses an index
+        """
+        seq_scans = [
+            (name, node['Relation Name'])
+            for name, explain in self._get_report_query_plans()
+            for node in iter_plan_nodes(explain['Plan'])
+            if node['Node Type'] == 'Seq Scan' and node.get('Relation Name') in tables
+        ]
+        if seq_scans:
+            _logger.warning("Sequential scans in the queries of %s: %s", self._name, seq_scans)
+        return seq_scans
+
+    def _get_report_watermark_tables(self):
+        return REPORT_WATERMARK_TABLES
+
+    def _get_report_data_etag(self, **options):
+        """
+        ETag of the report data for the current filters and ``options``: a hash of the
+        report cache key (filters, user scope, language), the report cache version and
+        the last write_date of the small tables of _get_report_watermark_tables. It
+        changes whenever the data of the report may have changed.
+        """
+        self.ensure_one()
+        Cache = self.env['sales.report.cache']
+        self.env.cr.execute(SQL("SELECT %s", SQL(", ").join(
+            SQL("(SELECT MAX(write_date) FROM %s)", SQL.identifier(table))
+            for table in self._get_report_watermark_tables()
+        )))
+        watermark = [Cache._get_version(), *self.env.cr.fetchone()]
+        key = [Cache._get_key(self, 'api'), sorted(options.items()), watermark]
+        return hashlib.sha256(json.dumps(key, default=str).encode()).hexdigest()[:32]
+
@@ -0,0 +1,169 @@
+import logging
+import os
+import subprocess
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from odoo import models, api, _
+from odoo.exceptions import UserError
+from odoo.tools.pdf import merge_pdf
+from odoo.addons.base.models.ir_actions_report import _get_wkhtmltopdf_bin
+
+from .sales_report_run import current_recorder
+
+_logger = logging.getLogger(__name__)
+
+# Chunking of the large PDF reports (ir.config_parameter, with defaults)
+PDF_WORKERS_PARAM = 'sales_store_expense_report.pdf_workers'
+PDF_MATRIX_COLUMNS_PARAM = 'sales_store_expense_report.pdf_matrix_columns'
+PDF_MATRIX_ROWS_PARAM = 'sales_store_expense_report.pdf_matrix_rows'
+PDF_LINES_PER_CHUNK_PARAM = 'sales_store_expense_report.pdf_lines_per_chunk'
+DEFAULT_PDF_WORKERS = 4
+DEFAULT_PDF_MATRIX_COLUMNS = 8
+DEFAULT_PDF_MATRIX_ROWS = 40
+DEFAULT_PDF_LINES_PER_CHUNK = 500
+
+
+def _run_wkhtmltopdf(command):
+    """Run one wkhtmltopdf process (called from the worker threads: no ORM access here)"""
+    process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    return process.returncode, process.stderr.decode(errors='replace')[-1000:]
+
+
+class SalesReportPdf(models.AbstractModel):
+    """
+    Chunked PDF rendering of the large reports.
+
+    The report is cut into chunks of a few pages (column bands and row batches of the
+    matrix, batches of detailed lines). Every chunk is rendered to HTML by QWeb in the
+    current transaction, then converted by its own wkhtmltopdf process; up to
+    ``pdf_workers`` processes run in parallel while the next chunks are rendered. The
+    chunk PDFs are merged at the end, so that only a few chunks of HTML are held in
+    memory at any time.
+    """
+    _name = 'sales.report.pdf'
+    _description = 'Sales Report Chunked PDF Rendering'
+
+    @api.model
+    def _get_chunk_param(self, param, default):
+        return max(1, int(self.env['ir.config_parameter'].sudo().get_param(param, default)))
+
+    # -------------------------------------------------------------------------
+    # Chunking
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _split_matrix_values(self, values):
+        """
+        Split the values of the store_expense_category_pdf template in page-sized chunks
+        for store_expense_category_pdf_chunk: bands of ``pdf_matrix_columns`` columns,
+        each in batches of ``pdf_matrix_rows`` rows. The row totals are shown with the
+        last band, the column totals after the last batch of every band.
+        """
+        band_size = self._get_chunk_param(PDF_MATRIX_COLUMNS_PARAM, DEFAULT_PDF_MATRIX_COLUMNS)
+        batch_size = self._get_chunk_param(PDF_MATRIX_ROWS_PARAM, DEFAULT_PDF_MATRIX_ROWS)
+        column_names = values['location_names']
+        row_names = values['category_names']
+        band_starts = list(range(0, len(column_names), band_size)) or [0]
+        batch_starts = list(range(0, len(row_names), batch_size)) or [0]
+
+        chunks = []
+        for band_index, band_start in enumerate(band_starts):
+            band_end = band_start + band_size
+            last_band = band_index == len(band_starts) - 1
+            for batch_index, batch_start in enumerate(batch_starts):
+                batch_rows = row_names[batch_start:batch_start + batch_size]
+                chunks.append(dict(
+                    values,
+                    location_names=column_names[band_start:band_end],
+                    category_names=batch_rows,
+                    table_data={name: values['table_data'].get(name, [])[band_start:band_end] for name in batch_rows},
+                    column_totals=values['column_totals'][band_start:band_end],
+                    show_row_totals=last_band,
+                    show_column_totals=batch_index == len(batch_starts) - 1,
+                    chunk_info=_(
+                        "Columns %(first)s-%(last)s of %(columns)s, rows %(first_row)s-%(last_row)s of %(rows)s",
+                        first=band_start + 1, last=min(band_end, len(column_names)), columns=len(column_names),
+                        first_row=batch_start + 1, last_row=batch_start + len(batch_rows), rows=len(row_names),
+                    ) if len(band_starts) > 1 or len(batch_starts) > 1 else False,
+                ))
+        return chunks
+
+    # -------------------------------------------------------------------------
+    # Rendering
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _render_chunks(self, report_ref, chunks, docids=None):
+        """
+        Render every chunk (``data`` of the QWeb report ``report_ref``) to PDF in
+        parallel wkhtmltopdf processes and merge them in order.
+
+        :param chunks: iterable of report data dicts, consumed lazily
+        :return: PDF content
+        """
+        Report = self.env['ir.actions.report']
+        report = Report._get_report(report_ref)
+        workers = self._get_chunk_param(PDF_WORKERS_PARAM, DEFAULT_PDF_WORKERS)
+        paperformat = report.get_paperformat()
+        command_args = Report._build_wkhtmltopdf_args(paperformat, self.env.context.get('landscape'))
+
+        with tempfile.TemporaryDirectory(prefix='sales_report_pdf_') as tmpdir, \
+                ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = []
+            pdf_paths = []
+            for index, data in enumerate(chunks):
+                html = Report._render_qweb_html(report_ref, docids, data=data)[0]
+                command, pdf_path = self._prepare_chunk_command(Report, report, html, command_args, tmpdir, index)
+                del html
+                futures.append(executor.submit(_run_wkhtmltopdf, command))
+                pdf_paths.append(pdf_path)
+                # Do not render further ahead than the workers can convert
+                pending = [future for future in futures if not future.done()]
+                if len(pending) >= 2 * workers:
+                    wait(pending, return_when=FIRST_COMPLETED)
+                if current_recorder():
+                    current_recorder().extra['pdf_chunks'] = index + 1
+            for future in futures:
+                returncode, error = future.result()
+                if returncode not in (0, 1):
+                    # 1 is returned for warnings such as unreachable assets
+                    raise UserError(_(
+                        "Wkhtmltopdf failed (error code: %(code)s). Message: %(message)s",
+                        code=returncode, message=error,
+                    ))
+            if not pdf_paths:
+                return b''
+
+            _logger.debug("Merging %s PDF chunks of %s", len(pdf_paths), report.report_name)
+            contents = []
+            for pdf_path in pdf_paths:
+                with open(pdf_path, 'rb') as file:
+                    contents.append(file.read())
+            return contents[0] if len(contents) == 1 else merge_pdf(contents)
+
+    @api.model
+    def _prepare_chunk_command(self, Report, report, html, command_args, tmpdir, index):
+        """Write the HTML files of a chunk and return its wkhtmltopdf command and output path"""
+        bodies, _res_ids, header, footer, specific_paperformat_args = Report._prepare_html(html, report_model=report.model)
+        if specific_paperformat_args:
+            command_args = Report._build_wkhtmltopdf_args(
+                report.get_paperformat(), self.env.context.get('landscape'),
+                specific_paperformat_args=specific_paperformat_args,
+            )
+
+        def write(name, content):
+            path = os.path.join(tmpdir, f'{index}_{name}.html')
+            with open(path, 'wb') as file:
+                file.write(content.encode() if isinstance(content, str) else content)
+            return path
+
+        files_args = []
+        if header:
+            files_args += ['--header-html', write('header', header)]
+        if footer:
+            files_args += ['--footer-html', write('footer', footer)]
+        body_paths = [write(f'body_{i}', body) for i, body in enumerate(bodies)]
+        pdf_path = os.path.join(tmpdir, f'{index}.pdf')
+        command = [_get_wkhtmltopdf_bin()] + command_args + files_args + body_paths + [pdf_path]
+        return command, pdf_path
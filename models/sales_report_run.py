@@ -0,0 +1,213 @@
+import cProfile
+import functools
+import io
+import json
+import logging
+import pstats
+import threading
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+
+from odoo import models, fields, api
+
+_logger = logging.getLogger(__name__)
+
+# Store every instrumented report run in sales.report.run (the log record is always emitted)
+HISTORY_PARAM = 'sales_store_expense_report.report_run_history'
+# Profile the next report run: 'cprofile' or 'pyinstrument' (reset once used)
+PROFILE_PARAM = 'sales_store_expense_report.profile_next_report'
+HISTORY_DAYS = 30
+
+# Recorder of the report run in progress in this thread
+_local = threading.local()
+
+
+class ReportRunRecorder:
+    """Wall time and SQL query count per phase of one report run, plus its rows and payload size"""
+
+    def __init__(self, env, res_model, action):
+        self.env = env
+        self.res_model = res_model
+        self.action = action
+        self.phases = {}
+        self.rows = 0
+        self.payload_bytes = 0
+        self.extra = {}
+        self.error = None
+        self.start = time.perf_counter()
+        self.start_queries = env.cr.sql_log_count
+        # Running phases: [seconds, queries] spent in their nested phases
+        self.stack = []
+
+    @contextmanager
+    def phase(self, name):
+        """
+        Time a phase. A phase run several times is summed; a nested phase is not
+        counted in the phase around it, so that the phases add up to the run.
+        """
+        start = time.perf_counter()
+        queries = self.env.cr.sql_log_count
+        nested = [0.0, 0]
+        self.stack.append(nested)
+        try:
+            yield
+        finally:
+            self.stack.pop()
+            seconds = time.perf_counter() - start
+            query_count = self.env.cr.sql_log_count - queries
+            phase = self.phases.setdefault(name, {'seconds': 0.0, 'queries': 0})
+            phase['seconds'] = round(phase['seconds'] + seconds - nested[0], 4)
+            phase['queries'] += query_count - nested[1]
+            if self.stack:
+                self.stack[-1][0] += seconds
+                self.stack[-1][1] += query_count
+
+    def to_dict(self):
+        return {
+            'model': self.res_model,
+            'action': self.action,
+            'uid': self.env.uid,
+            'company_id': self.env.company.id,
+            'seconds': round(time.perf_counter() - self.start, 4),
+            'queries': self.env.cr.sql_log_count - self.start_queries,
+            'rows': self.rows,
+            'payload_bytes': self.payload_bytes,
+            'phases': self.phases,
+            **self.extra,
+            **({'error': self.error} if self.error else {}),
+        }
+
+
+def current_recorder():
+    return getattr(_local, 'recorder', None)
+
+
+@contextmanager
+def report_run(records, action):
+    """
+    Instrument a report run of ``records`` (a report wizard). Nested runs (e.g. a
+    background job rendering the report) are part of the outer one.
+    """
+    if current_recorder():
+        yield current_recorder()
+        return
+    Run = records.env['sales.report.run']
+    recorder = _local.recorder = ReportRunRecorder(records.env, records._name, action)
+    profiler = Run._start_profiler()
+    try:
+        yield recorder
+    except Exception as e:
+        recorder.error = str(e)
+        raise
+    finally:
+        _local.recorder = None
+        profile = Run._stop_profiler(profiler)
+        Run._record(recorder, profile)
+
+
+def instrumented_report(action):
+    """Decorator of the report wizard actions: run the method under report_run()"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            with report_run(self, action):
+                return method(self, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+class SalesReportRun(models.Model):
+    """History of the instrumented report runs (when enabled by HISTORY_PARAM)"""
+    _name = 'sales.report.run'
+    _description = 'Sales Report Run'
+    _order = 'create_date desc, id desc'
+
+    res_model = fields.Char(string='Report', readonly=True, index=True)
+    action = fields.Char(string='Action', readonly=True)
+    user_id = fields.Many2one('res.users', string='User', readonly=True)
+    company_id = fields.Many2one('res.company', string='Company', readonly=True)
+    duration = fields.Float(string='Duration (s)', readonly=True, digits=(16, 3))
+    query_count = fields.Integer(string='SQL Queries', readonly=True)
+    rows = fields.Integer(string='Rows Scanned', readonly=True)
+    payload_bytes = fields.Integer(string='Payload Size (bytes)', readonly=True)
+    phases = fields.Json(string='Phases', readonly=True)
+    phases_display = fields.Text(string='Phase Timings', compute='_compute_phases_display')
+    profile = fields.Text(string='Profile', readonly=True)
+
+    @api.depends('phases')
+    def _compute_phases_display(self):
+        for run in self:
+            run.phases_display = json.dumps(run.phases or {}, indent=2, sort_keys=True)
+
+    @api.model
+    def _record(self, recorder, profile=None):
+        """Emit the run as one structured log record, and store it if the history is enabled"""
+        values = recorder.to_dict()
+        _logger.info("Report run: %s", json.dumps(values, sort_keys=True, default=str))
+        if profile:
+            _logger.info("Report run profile (%s, %s):\n%s", recorder.res_model, recorder.action, profile)
+        if recorder.error:
+            return  # The transaction is about to be rolled back
+        if self.env['ir.config_parameter'].sudo().get_param(HISTORY_PARAM) not in ('1', 'True', 'true'):
+            return
+        self.sudo().create({
+            'res_model': values['model'],
+            'action': values['action'],
+            'user_id': values['uid'],
+            'company_id': values['company_id'],
+            'duration': values['seconds'],
+            'query_count': values['queries'],
+            'rows': values['rows'],
+            'payload_bytes': values['payload_bytes'],
+            'phases': values['phases'],
+            'profile': profile,
+        })
+
+    # -------------------------------------------------------------------------
+    # Profiling
+    # -------------------------------------------------------------------------
+
+    @api.model
+    def _start_profiler(self):
+        """
+        Start a profiler if requested by the ``report_profile`` context key or by
+        PROFILE_PARAM (which is then reset, so that only one run is profiled)
+        """
+        mode = self.env.context.get('report_profile')
+        if not mode:
+            ICP = self.env['ir.config_parameter'].sudo()
+            mode = ICP.get_param(PROFILE_PARAM)
+            if not mode:
+                return None
+            ICP.set_param(PROFILE_PARAM, False)
+
+        if mode == 'pyinstrument':
+            try:
+                import pyinstrument
+            except ImportError:
+                _logger.warning("pyinstrument is not installed, profiling the report with cProfile")
+            else:
+                profiler = pyinstrument.Profiler()
+                profiler.start()
+                return profiler
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    @api.model
+    def _stop_profiler(self, profiler):
+        """Stop the profiler and return its report as text"""
+        if profiler is None:
+            return None
+        if isinstance(profiler, cProfile.Profile):
+            profiler.disable()
+            output = io.StringIO()
+            pstats.Stats(profiler, stream=output).sort_stats('cumulative').print_stats(60)
+            return output.getvalue()
+        profiler.stop()
+        return profiler.output_text(unicode=True)
+
+    @api.autovacuum
+    def _gc_report_runs(self):
+        self.sudo().search([('create_date', '<', fields.Datetime.now() - timedelta(days=HISTORY_DAYS))]).unlink()
@@ -1,4 +1,103 @@
-from odoo import models, fields
+import re
+
+from odoo import api, models, fields, tools
+
+# Process-wide counters for the compiled keyword matcher (see StoreExpenseCategory)
+KEYWORD_MATCHER_STATS = {
+    'matcher_hits': 0,
+    'matcher_misses': 0,
+    'match_hits': 0,
+    'match_misses': 0,
+}
+
+
+class ExpenseCategoryKeywordMatcher:
+    """
+    Keyword index over the active store expense categories.
+
+    Categories are tried in order, and within a category its keywords in order; the
+    first keyword found (as a substring) in the text wins. All keywords are compiled
+    into a single overlapping regex, and results are memoized per text so that
+    repeated product / product category names resolve with a dictionary lookup.
+    """
+
+    EXCLUDE_WORDS = {'expense', 'expenses', 'category', 'and', 'the', 'for', 'of', 'in', 'on', 'at', 'to'}
+    MAX_MEMO_SIZE = 100000
+
+    def __init__(self, categories):
+        """
+        :param categories: list of ``(id, name)`` in matching priority order
+        """
+        self.names = {}
+        category_keywords = {}
+        for category_id, name in categories:
+            self.names.setdefault(category_id, name)
+            # Categories sharing a name share a single entry
+            category_keywords.setdefault(name, (category_id, self.extract_keywords(name.lower())))
+
+        self.category_by_keyword = {}
+        self.priority = {}
+        for category_id, keywords in category_keywords.values():
+            for keyword in keywords:
+                if keyword not in self.category_by_keyword:
+                    self.category_by_keyword[keyword] = category_id
+                    self.priority[keyword] = len(self.priority)
+
+        self.pattern = None
+        if self.priority:
+            alternatives = '|'.join(re.escape(keyword) for keyword in self.priority)
+            self.pattern = re.compile(f'(?=({alternatives}))')
+
+        # Fallback: a "General" or "Other" category, else the first one
+        self.default_id = False
+        for category_id, name in categories:
+            if 'general' in name.lower() or 'other' in name.lower():
+                self.default_id = category_id
+                break
+        else:
+            if categories:
+                self.default_id = categories[0][0]
+
+        self._memo = {}
+
+    @classmethod
+    def extract_keywords(cls, category_name):
+        """
+        Extract relevant keywords from expense category names for matching
+        """
+        words = category_name.split()
+        return [word for word in words if word.lower() not in cls.EXCLUDE_WORDS and len(word) > 2]
+
+    def _match_text(self, text):
+        """Return the category id of the highest priority keyword found in ``text``"""
+        if text in self._memo:
+            KEYWORD_MATCHER_STATS['match_hits'] += 1
+            return self._memo[text]
+        KEYWORD_MATCHER_STATS['match_misses'] += 1
+
+        category_id = False
+        if self.pattern:
+            found = {match.group(1) for match in self.pattern.finditer(text.lower())}
+            if found:
+                category_id = self.category_by_keyword[min(found, key=self.priority.__getitem__)]
+
+        if len(self._memo) >= self.MAX_MEMO_SIZE:
+            self._memo.clear()
+        self._memo[text] = category_id
+        return category_id
+
+    def match(self, *texts):
+        """
+        Return the category id for the first text (in argument order) that matches a
+        keyword, falling back to the default category. ``False`` if there are no categories.
+        """
+        for text in texts:
+            if text:
+                category_id = self._match_text(text)
+                if category_id:
+                    return category_id
+        return self.default_id
+
 
 class StoreExpenseLocation(models.Model):
     _name = 'store.expense.location'
@@ -19,6 +118,51 @@ class StoreExpenseCategory(models.Model):
     code = fields.Char(string='Code')
     active = fields.Boolean(default=True)
 
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env.registry.clear_cache()
+        self.env['sales.report.cache']._invalidate()
+        # The keywords changed: the stored categories of the lines may be stale
+        self.env['sale.order.line']._schedule_resolve_all_expense_categories()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        if {'name', 'active'} & set(vals):
+            self.env.registry.clear_cache()
+            self.env['sale.order.line']._schedule_resolve_all_expense_categories()
+        self.env['sales.report.cache']._invalidate()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env.registry.clear_cache()
+        self.env['sales.report.cache']._invalidate()
+        self.env['sale.order.line']._schedule_resolve_all_expense_categories()
+        return res
+
+    @api.model
+    def _get_keyword_matcher(self):
+        """Return the compiled keyword matcher, built once per registry and
+        rebuilt after categories are created, renamed, archived or deleted."""
+        misses = KEYWORD_MATCHER_STATS['matcher_misses']
+        matcher = self._compiled_keyword_matcher()
+        if KEYWORD_MATCHER_STATS['matcher_misses'] == misses:
+            KEYWORD_MATCHER_STATS['matcher_hits'] += 1
+        return matcher
+
+    @tools.ormcache()
+    def _compiled_keyword_matcher(self):
+        KEYWORD_MATCHER_STATS['matcher_misses'] += 1
+        categories = self.sudo().with_context(active_test=True).search_read([], ['name'])
+        return ExpenseCategoryKeywordMatcher([(category['id'], category['name']) for category in categories])
+
+    @api.model
+    def _get_keyword_matcher_stats(self):
+        """Hit/miss counters of the matcher cache and of its per-text memo (this worker only)"""
+        return dict(KEYWORD_MATCHER_STATS)
+
 class StoreExpense(models.Model):
     _name = 'store.expense'
     _description = 'Store Expense'
@@ -28,11 +172,39 @@ class StoreExpense(models.Model):
     customer_id = fields.Many2one(
         'res.partner', 
         string='Customer',
-        domain=[('customer_rank', '>', 0)]  # Only show customers
+        domain=[('customer_rank', '>', 0)],  # Only show customers
+        index='btree_not_null',
     )
-    location_id = fields.Many2one('store.expense.location', string='Location', required=True)
+    location_id = fields.Many2one('store.expense.location', string='Location', required=True, index=True)
     category_id = fields.Many2one('store.expense.category', string='Expense Category', required=True)
     amount = fields.Float(string='Amount', required=True)
     description = fields.Text(string='Description')
     company_id = fields.Many2one('res.company', string='Company', default=lambda self: self.env.company)
-    reference = fields.Char(string='Reference')
\ No newline at end of file
+    reference = fields.Char(string='Reference')
+
+    def init(self):
+        # Reporting indexes: the reports filter on company and a date range, optionally
+        # on categories (also created concurrently by the 18.0.1.1.0 migration)
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS store_expense_company_date_index
+                ON store_expense (company_id, date);
+            CREATE INDEX IF NOT EXISTS store_expense_company_category_date_index
+                ON store_expense (company_id, category_id, date);
+        """)
+
+    # Expenses are reported by the Sales vs Store Expenses mode of the category report
+    @api.model_create_multi
+    def create(self, vals_list):
+        records = super().create(vals_list)
+        self.env['sales.report.cache']._invalidate()
+        return records
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['sales.report.cache']._invalidate()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['sales.report.cache']._invalidate()
+        return res
\ No newline at end of file
@@ -1,21 +1,61 @@
 from odoo import models, fields, api
 from odoo.exceptions import UserError
-import io
-import base64
-import xlsxwriter
+from odoo.tools import SQL
 import json
-from datetime import datetime
+from datetime import datetime, timedelta
+from dateutil.relativedelta import relativedelta
+
+from . import report_payload
+from .matrix_export import DenseMatrix, MatrixExporter
+from .sales_report_cache import ReportCube
+from .sales_report_job import XLSX_MIMETYPE
+from .sales_report_run import instrumented_report
 
 class SalesStoreExpenseCategoryWizard(models.TransientModel):
     _name = 'sales.store.expense.category.wizard'
+    _inherit = ['sales.report.mixin', 'sales.report.job.mixin']
     _description = 'Sales Store Expense Category Report Wizard'
 
+    _report_filter_fields = (
+        'company_id', 'customer_ids', 'store_expense_category_ids', 'date_from', 'date_to',
+        'report_mode', 'combined_column', 'consolidated', 'company_ids', 'currency_id',
+        'trend_interval', 'comparison',
+    )
+
     company_id = fields.Many2one(
         'res.company',
         string='Company',
         default=lambda self: self.env.company,
         required=True
     )
+    consolidated = fields.Boolean(
+        string='Consolidate Companies',
+        help='Report on several companies at once, with a subtotal per company and the '
+             'amounts converted to the report currency at the rate of the end date.'
+    )
+    company_ids = fields.Many2many(
+        'res.company',
+        'sales_store_expense_wizard_company_rel',
+        string='Companies',
+        default=lambda self: self.env.company
+    )
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Report Currency',
+        default=lambda self: self.env.company.currency_id
+    )
+    trend_interval = fields.Selection([
+        ('none', 'None'),
+        ('day', 'Day'),
+        ('week', 'Week'),
+        ('month', 'Month'),
+    ], string='Trend', default='none', required=True,
+        help='Split every cell of the sales report per day, week or month (in your timezone).')
+    comparison = fields.Selection([
+        ('none', 'None'),
+        ('previous_period', 'Previous Period'),
+        ('previous_year', 'Same Period Last Year'),
+    ], string='Compare With', default='none', required=True)
     customer_ids = fields.Many2many(
         'res.partner',
         string='Customers',
@@ -27,6 +67,16 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
     )
     date_from = fields.Date(string='From Date', required=True)
     date_to = fields.Date(string='To Date', required=True)
+    report_mode = fields.Selection([
+        ('sales', 'Sales'),
+        ('combined', 'Sales vs Store Expenses'),
+    ], string='Report Mode', default='sales', required=True)
+    combined_column = fields.Selection([
+        ('customer', 'Customer'),
+        ('location', 'Location'),
+    ], string='Columns', default='customer', required=True,
+        help='Columns of the Sales vs Store Expenses report. Sales have no location: '
+             'by location, all the sales are reported in the "No Location" column.')
     
     # Preview & Display Fields (NEW)
     preview_data = fields.Text(string="Preview Data")
@@ -69,25 +119,177 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
         res['date_to'] = today
         return res
 
+    @api.onchange('report_mode', 'consolidated')
+    def _onchange_report_mode(self):
+        # The trend and comparison are hidden (and not supported) in the other modes
+        if self.report_mode != 'sales' or self.consolidated:
+            self.trend_interval = 'none'
+            self.comparison = 'none'
+
+    def _check_report_filters(self):
+        super()._check_report_filters()
+        if self.trend_interval == 'none' and self.comparison == 'none':
+            return
+        if self.report_mode != 'sales' or self.consolidated:
+            raise UserError("The trend and comparison are only available in the Sales mode of a single company.")
+        if self.comparison == 'previous_year' and self.date_to - relativedelta(years=1) >= self.date_from:
+            raise UserError("The comparison with the same period last year needs a date range of one year at most.")
+
     def _get_report_data(self):
-        """Get sale order line data grouped by store expense categories in matrix format for preview"""
-        domain = [
-            ('order_id.date_order', '>=', self.date_from),
-            ('order_id.date_order', '<=', self.date_to),
-            ('order_id.company_id', '=', self.company_id.id),
-            ('order_id.state', 'in', ['sale', 'done']),  # Only confirmed sales
+        """Report data for the current filters, from the report cache when possible"""
+        self.ensure_one()
+        self._check_report_filters()
+        if self.consolidated:
+            build = self._build_consolidated_report_data
+        elif self.report_mode == 'combined':
+            build = self._build_combined_report_data
+        elif self.trend_interval != 'none' or self.comparison != 'none':
+            build = self._build_trend_report_data
+        else:
+            build = self._build_report_data
+        with self._report_phase('aggregation'):
+            return self.env['sales.report.cache']._get_or_compute(self, 'matrix', build)
+
+    def _get_report_companies(self):
+        """Companies of the report: the selected ones when consolidating, else the wizard company"""
+        if not self.consolidated:
+            return self.company_id
+        if not self.company_ids:
+            raise UserError("Please select the companies to consolidate.")
+        if self.company_ids - self.env.user.company_ids:
+            raise UserError("You can only consolidate the companies you have access to.")
+        return self.company_ids
+
+    def _get_report_currency(self):
+        return self.currency_id if self.consolidated and self.currency_id else self.company_id.currency_id
+
+    def _get_report_currency_rate(self, currency, company, rates):
+        """Rate from ``currency`` to the report currency at the end date, memoized in ``rates``"""
+        key = (currency.id, company.id)
+        if key not in rates:
+            rates[key] = self.env['res.currency']._get_conversion_rate(
+                currency, self._get_report_currency(), company, self.date_to)
+        return rates[key]
+
+    def _get_sales_domain(self):
+        """Domain of the confirmed sale order lines matching the filters"""
+        # The order conditions in a single subquery on sale_order (one per field with
+        # 'order_id.<field>' paths), matching its (company_id, date_order) index
+        order_domain = [
+            ('company_id', 'in', self._get_report_companies().ids),
+            ('state', 'in', ['sale', 'done']),  # Only confirmed sales
+            *self._get_date_range_domain('date_order'),
         ]
 
         # Add customer filter if selected
         if self.customer_ids:
-            domain.append(('order_id.partner_id', 'in', self.customer_ids.ids))
+            order_domain.append(('partner_id', 'in', self.customer_ids.ids))
+        domain = [('order_id', 'any', order_domain), ('display_type', '=', False)]
 
-        # Add category filter if selected
+        # Add category filter if selected: on the resolved category, like the grouping
+        # of the matrix and the sales lines report
         if self.store_expense_category_ids:
-            domain.append(('store_expense_id', 'in', self.store_expense_category_ids.ids))
+            domain.append(('resolved_expense_category_id', 'in', self.store_expense_category_ids.ids))
+        return domain
+
+    def _get_sales_groups(self, groupby_partner=True, groupby_company=False):
+        """
+        Confirmed sales summed in the database per store expense category (and customer)
 
-        # Get all sale order lines in the date range
-        sale_order_lines = self.env['sale.order.line'].search(domain)
+        :return: list of ``(category, partner, amount, line count)`` (``partner`` is
+                 None when ``groupby_partner`` is False); with ``groupby_company``, list
+                 of ``(company, category, partner, amount, line count)`` with the amounts
+                 converted to the report currency
+        """
+        # Aggregate in the database: one group per (category, customer) cell
+        Daily = self.env['sales.store.expense.daily']
+        # The daily amounts are sums of line subtotals of any order currency: they cannot
+        # be converted to the report currency, the consolidated groups use the lines
+        use_daily = not groupby_company and Daily._is_enabled_for(self, self._get_report_companies())
+        # The resolved category: the explicit one of the line, else the product mapping
+        groupby = ['resolved_expense_category_id']
+        if groupby_partner:
+            groupby.append('partner_id' if use_daily else 'order_partner_id')
+        if groupby_company:
+            # Line subtotals are in the order currency
+            groupby += ['company_id', 'currency_id']
+
+        if use_daily:
+            with self._report_phase('domain'):
+                daily_domain = Daily._get_domain(
+                    self._get_report_companies(), self.date_from, self.date_to, self.customer_ids.ids)
+                if self.store_expense_category_ids:
+                    daily_domain.append(('resolved_expense_category_id', 'in', self.store_expense_category_ids.ids))
+            with self._report_phase('fetch'):
+                groups = Daily._read_group(daily_domain, groupby, aggregates=['amount:sum', 'line_count:sum'])
+        else:
+            with self._report_phase('domain'):
+                domain = self._get_sales_domain()
+            with self._report_phase('fetch'):
+                groups = self.env['sale.order.line']._read_group(
+                    domain, groupby, aggregates=['price_subtotal:sum', '__count'])
+        self._report_metrics(rows=sum(group[-1] for group in groups))
+
+        if not groupby_company:
+            if not groupby_partner:
+                groups = [(category, None, amount, count) for category, amount, count in groups]
+            return groups
+
+        # Convert the groups to the report currency and merge them per (company, category, customer)
+        rates = {}
+        cells = {}
+        for group in groups:
+            category, *keys, amount, count = group
+            partner = keys.pop(0) if groupby_partner else None
+            company, currency = keys
+            currency = currency or company.currency_id
+            cell = cells.setdefault((company, category, partner), [0.0, 0])
+            cell[0] += amount * self._get_report_currency_rate(currency, company, rates)
+            cell[1] += count
+        return [
+            (company, category, partner, amount, count)
+            for (company, category, partner), (amount, count) in cells.items()
+        ]
+
+    def _get_sales_cube(self):
+        """
+        Sales per (store expense category, customer) of the company and dates, over all
+        the categories and customers, kept for the wizard by the report cache: changing
+        the customers or categories of the wizard slices it instead of querying again.
+        """
+        def build():
+            wizard = self.new({'company_id': self.company_id.id, 'date_from': self.date_from, 'date_to': self.date_to})
+            return ReportCube(
+                (category.id, partner.id, amount, count) for category, partner, amount, count in wizard._get_sales_groups()
+            )
+
+        params = {'company_id': self.company_id.id, 'date_from': self.date_from, 'date_to': self.date_to}
+        return self.env['sales.report.cache']._get_cube(self, params, build)
+
+    def _get_sliced_sales_groups(self):
+        """Same as _get_sales_groups(), sliced from the sales cube of the wizard when possible"""
+        cube = self._get_sales_cube()
+        if cube is None:
+            return self._get_sales_groups()
+        cells = cube.slice(self.store_expense_category_ids.ids, self.customer_ids.ids)
+        category_ids = [category_id for category_id, _partner_id, _amount, _count in cells if category_id]
+        partner_ids = [partner_id for _category_id, partner_id, _amount, _count in cells if partner_id]
+        Category = self.env['store.expense.category']
+        Partner = self.env['res.partner']
+        return [
+            (
+                Category.browse(category_id or ()).with_prefetch(category_ids),
+                Partner.browse(partner_id or ()).with_prefetch(partner_ids),
+                amount,
+                count,
+            )
+            for category_id, partner_id, amount, count in cells
+        ]
+
+    def _build_report_data(self, groups=None):
+        """Get sale order line data grouped by store expense categories in matrix format for preview"""
+        if groups is None:
+            groups = self._get_sliced_sales_groups()
 
         # Build matrix data for the new table structure
         matrix_data = {
@@ -110,64 +312,41 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
 
         # Define columns: Only Customers
         if self.customer_ids:
-            for customer in self.customer_ids.sorted('name'):
-                matrix_data['columns'].append({
-                    'id': f'customer_{customer.id}',
-                    'name': customer.name
-                })
+            customers = self.customer_ids.sorted('name')
         else:
-            # If no customers selected, show all customers from sale orders
-            customer_ids = sale_order_lines.mapped('order_id.partner_id')
-            unique_customers = []
-            seen_customer_ids = set()
-            for customer in customer_ids.sorted('name'):
-                if customer and customer.id not in seen_customer_ids:
-                    unique_customers.append(customer)
-                    seen_customer_ids.add(customer.id)
-            
-            for customer in unique_customers:
-                matrix_data['columns'].append({
-                    'id': f'customer_{customer.id}',
-                    'name': customer.name
-                })
+            # If no customers selected, show all customers found in the groups
+            customers = self.env['res.partner'].union(
+                *(partner for _category, partner, _amount, _count in groups)
+            ).sorted('name')
+
+        for customer in customers:
+            matrix_data['columns'].append({
+                'id': f'customer_{customer.id}',
+                'name': customer.name
+            })
 
         # Define rows: Store Expense Categories + Total row
-        category_rows = []
         if self.store_expense_category_ids:
             # Use selected categories
-            for category in self.store_expense_category_ids.sorted('name'):
-                category_rows.append({
-                    'id': f'category_{category.id}',
-                    'name': category.name
-                })
-                matrix_data['category_names'].append(category.name)
+            categories = self.store_expense_category_ids.sorted('name')
         else:
             # If no categories selected, show ALL categories that appear in the sale order lines
-            category_ids = sale_order_lines.mapped('store_expense_id')
-            unique_categories = []
-            seen_category_ids = set()
-            for category in category_ids.sorted('name'):
-                if category and category.id not in seen_category_ids:
-                    unique_categories.append(category)
-                    seen_category_ids.add(category.id)
-            
+            categories = self.env['store.expense.category'].union(
+                *(category for category, _partner, _amount, _count in groups)
+            ).sorted('name')
+
             # If no categories found, show all active categories
-            if not unique_categories:
-                all_categories = self.env['store.expense.category'].search([('active', '=', True)])
-                for category in all_categories.sorted('name'):
-                    category_rows.append({
-                        'id': f'category_{category.id}',
-                        'name': category.name
-                    })
-                    matrix_data['category_names'].append(category.name)
-            else:
-                for category in unique_categories:
-                    category_rows.append({
-                        'id': f'category_{category.id}',
-                        'name': category.name
-                    })
-                    matrix_data['category_names'].append(category.name)
-        
+            if not categories:
+                categories = self.env['store.expense.category'].search([('active', '=', True)]).sorted('name')
+
+        category_rows = []
+        for category in categories:
+            category_rows.append({
+                'id': f'category_{category.id}',
+                'name': category.name
+            })
+            matrix_data['category_names'].append(category.name)
+
         # Add all category rows and Total row
         matrix_data['rows'] = category_rows + [{'id': 'total', 'name': 'Total'}]
 
@@ -177,22 +356,21 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
             for column in matrix_data['columns']:
                 key = f"{row['id']}_{column['id']}"
                 matrix_data['values'][key] = 0.0
-        
+
         for column in matrix_data['columns']:
             matrix_data['column_totals'][column['id']] = 0.0
 
-        # Fill the values matrix with sale order line data
-        for line in sale_order_lines:
-            if line.order_id.partner_id and line.store_expense_id:
-                customer_id = f'customer_{line.order_id.partner_id.id}'
-                category_id = f'category_{line.store_expense_id.id}'
-                price_subtotal = line.price_subtotal  # Use subtotal instead of order total
-                
+        # Fill the values matrix from the grouped cells
+        for category, partner, price_subtotal, _count in groups:
+            if partner and category:
+                customer_id = f'customer_{partner.id}'
+                category_id = f'category_{category.id}'
+
                 # Update category-customer cell
                 key = f"{category_id}_{customer_id}"
                 if key in matrix_data['values']:
                     matrix_data['values'][key] += price_subtotal
-                
+
                 # Update running totals
                 matrix_data['row_totals'][category_id] += price_subtotal
                 matrix_data['column_totals'][customer_id] += price_subtotal
@@ -202,15 +380,399 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
         for column in matrix_data['columns']:
             total_key = f"total_{column['id']}"
             matrix_data['values'][total_key] = matrix_data['column_totals'][column['id']]
+        matrix_data['row_totals']['total'] = matrix_data['grand_total']
+
+        return matrix_data
+
+    def _get_comparison_dates(self):
+        """Dates of the comparison period, or None"""
+        if self.comparison == 'previous_period':
+            date_to = self.date_from - timedelta(days=1)
+            return date_to - (self.date_to - self.date_from), date_to
+        if self.comparison == 'previous_year':
+            return self.date_from - relativedelta(years=1), self.date_to - relativedelta(years=1)
+        return None
+
+    def _get_trend_buckets(self):
+        """First day of the trend buckets covering the report dates"""
+        if self.trend_interval == 'none':
+            return []
+        start = self.date_from
+        if self.trend_interval == 'week':
+            start -= timedelta(days=start.weekday())  # date_trunc('week') starts on Monday
+        elif self.trend_interval == 'month':
+            start = start.replace(day=1)
+        step = {'day': relativedelta(days=1), 'week': relativedelta(weeks=1), 'month': relativedelta(months=1)}
+        buckets = []
+        while start <= self.date_to:
+            buckets.append(start)
+            start += step[self.trend_interval]
+        return buckets
+
+    def _get_trend_bucket_name(self, bucket):
+        if self.trend_interval == 'month':
+            return bucket.strftime('%b %Y')
+        if self.trend_interval == 'week':
+            year, week, _weekday = bucket.isocalendar()
+            return f'W{week} {year}'
+        return bucket.isoformat()
+
+    def _get_trend_groups_query(self):
+        """
+        Grouped query of _get_trend_groups: the sales of the report period per trend
+        bucket and those of the comparison period, in a single pass over the lines
+        """
+        tz = self._get_report_tz().zone
+        start, _end = self._get_utc_bounds()
+        date_order = SQL("so.date_order")
+        periods = [self._get_date_range_sql(date_order)]
+        comparison_dates = self._get_comparison_dates()
+        if comparison_dates:
+            periods.append(self._get_date_range_sql(date_order, *comparison_dates))
+
+        if self.trend_interval != 'none':
+            # Truncate in the user's timezone: an order at 23:30 local time belongs to that day
+            bucket = SQL(
+                "CASE WHEN so.date_order >= %s THEN date_trunc(%s, timezone(%s, timezone('UTC', so.date_order)))::date END",
+                start, self.trend_interval, tz,
+            )
+        else:
+            bucket = SQL("NULL::date")
+
+        filters = [
+            SQL("so.company_id = %s", self.company_id.id),
+            SQL("so.state IN ('sale', 'done')"),
+            SQL("sol.display_type IS NULL"),
+            SQL("(%s)", SQL(" OR ").join(periods)),
+            # The record rules of the user (the raw SQL bypasses them)
+            self._get_visible_orders_sql(SQL("so.id")),
+        ]
+        if self.customer_ids:
+            filters.append(SQL("so.partner_id = ANY(%s)", self.customer_ids.ids))
+        if self.store_expense_category_ids:
+            filters.append(SQL("sol.resolved_expense_category_id = ANY(%s)", self.store_expense_category_ids.ids))
+
+        return SQL(
+            """
+            SELECT sol.resolved_expense_category_id,
+                   so.partner_id,
+                   so.date_order >= %(start)s AS is_current,
+                   %(bucket)s AS bucket,
+                   SUM(sol.price_subtotal),
+                   COUNT(*)
+              FROM sale_order_line sol
+              JOIN sale_order so ON so.id = sol.order_id
+             WHERE %(filters)s
+          GROUP BY 1, 2, 3, 4
+            """,
+            start=start,
+            bucket=bucket,
+            filters=SQL(" AND ").join(filters),
+        )
+
+    def _get_trend_groups(self):
+        """
+        :return: list of ``(category_id, partner_id, is_current, bucket, amount, line count)``
+                 (``bucket`` is None for the comparison period or without trend)
+        """
+        self.env.flush_all()
+        with self._report_phase('domain'):
+            query = self._get_trend_groups_query()
+        with self._report_phase('fetch'):
+            self.env.cr.execute(query)
+            groups = self.env.cr.fetchall()
+        self._report_metrics(rows=sum(group[-1] for group in groups))
+        return groups
+
+    def _build_trend_report_data(self):
+        """
+        Sales matrix of _build_report_data for the report period, with from the same
+        grouped query the amount of every cell and row total per trend bucket
+        (``series``, aligned with ``buckets``) and the amounts of the comparison period
+        (``comparison``)
+        """
+        groups = self._get_trend_groups()
+        categories = self.env['store.expense.category'].browse({group[0] for group in groups if group[0]})
+        partners = self.env['res.partner'].browse({group[1] for group in groups if group[1]})
+        category_by_id = {category.id: category for category in categories}
+        partner_by_id = {partner.id: partner for partner in partners}
+
+        # Report period totals per cell, in the format of _get_sales_groups
+        current = {}
+        for category_id, partner_id, is_current, _bucket, amount, count in groups:
+            if is_current:
+                cell = current.setdefault((category_id, partner_id), [0.0, 0])
+                cell[0] += amount
+                cell[1] += count
+        matrix_data = self._build_report_data([
+            (category_by_id.get(category_id, categories.browse()), partner_by_id.get(partner_id, partners.browse()),
+             amount, count)
+            for (category_id, partner_id), (amount, count) in current.items()
+        ])
+        row_ids = {row['id'] for row in matrix_data['rows']}
+        column_ids = {column['id'] for column in matrix_data['columns']}
+
+        def cell_keys(category_id, partner_id):
+            """Keys of the cell, its row total, its column total and the grand total"""
+            row_id, column_id = f'category_{category_id}', f'customer_{partner_id}'
+            if not category_id or not partner_id or row_id not in row_ids or column_id not in column_ids:
+                return []
+            return [f'{row_id}_{column_id}', f'{row_id}_total', f'total_{column_id}', 'total_total']
+
+        buckets = self._get_trend_buckets()
+        if buckets:
+            bucket_index = {bucket: index for index, bucket in enumerate(buckets)}
+            series = {}
+            for category_id, partner_id, is_current, bucket, amount, _count in groups:
+                if is_current and bucket in bucket_index:
+                    for key in cell_keys(category_id, partner_id):
+                        series.setdefault(key, [0.0] * len(buckets))[bucket_index[bucket]] += amount
+            matrix_data['buckets'] = [
+                {'id': bucket.isoformat(), 'name': self._get_trend_bucket_name(bucket)} for bucket in buckets
+            ]
+            matrix_data['series'] = series
+
+        comparison_dates = self._get_comparison_dates()
+        if comparison_dates:
+            amounts = {}
+            for category_id, partner_id, is_current, _bucket, amount, _count in groups:
+                if not is_current:
+                    for key in cell_keys(category_id, partner_id):
+                        amounts[key] = amounts.get(key, 0.0) + amount
+            matrix_data['comparison'] = {
+                'label': dict(self._fields['comparison'].selection)[self.comparison],
+                'date_from': comparison_dates[0].isoformat(),
+                'date_to': comparison_dates[1].isoformat(),
+                'values': {key: amount for key, amount in amounts.items() if not key.endswith('_total')},
+                'row_totals': {
+                    key[:-len('_total')]: amount for key, amount in amounts.items()
+                    if key.endswith('_total') and key != 'total_total'
+                },
+                'column_totals': {
+                    column['id']: amounts.get(f"total_{column['id']}", 0.0) for column in matrix_data['columns']
+                },
+                'grand_total': amounts.get('total_total', 0.0),
+            }
+            matrix_data['comparison']['row_totals']['total'] = matrix_data['comparison']['grand_total']
+        return matrix_data
+
+    def _get_expense_domain(self):
+        """Domain of the store expenses matching the filters"""
+        domain = [
+            ('date', '>=', self.date_from),
+            ('date', '<=', self.date_to),
+            ('company_id', 'in', self._get_report_companies().ids),
+        ]
+        if self.customer_ids:
+            domain.append(('customer_id', 'in', self.customer_ids.ids))
+        if self.store_expense_category_ids:
+            domain.append(('category_id', 'in', self.store_expense_category_ids.ids))
+        return domain
+
+    def _get_expense_groups(self, groupby_company=False):
+        """
+        Recorded store expenses summed in the database per category and column
+        (customer or location, see combined_column)
+
+        :return: list of ``(category, customer or location, amount)``; with
+                 ``groupby_company``, list of ``(company, category, customer or location,
+                 amount)`` with the amounts converted to the report currency
+        """
+        column_field = 'customer_id' if self.combined_column == 'customer' else 'location_id'
+        groupby = ['category_id', column_field] + (['company_id'] if groupby_company else [])
+        with self._report_phase('domain'):
+            domain = self._get_expense_domain()
+        with self._report_phase('fetch'):
+            groups = self.env['store.expense']._read_group(domain, groupby, ['amount:sum', '__count'])
+        self._report_metrics(rows=sum(group[-1] for group in groups))
+        if not groupby_company:
+            return [(category, column, amount) for category, column, amount, _count in groups]
+
+        # Expenses are recorded in the currency of their company
+        rates = {}
+        return [
+            (company, category, column, amount * self._get_report_currency_rate(company.currency_id, company, rates))
+            for category, column, company, amount, _count in groups
+        ]
 
-        # Debug: Print totals to verify
-        print("Row totals:", matrix_data['row_totals'])
-        print("Column totals:", matrix_data['column_totals'])
-        print("Grand total:", matrix_data['grand_total'])
-        print(f"Processed {len(sale_order_lines)} sale order lines")
+    def _build_combined_report_data(self, sales_groups=None, expense_groups=None):
+        """
+        Sales vs store expenses matrix: for every category, the rows Sales, Expenses,
+        Net (sales - expenses) and Margin % (net / sales) per customer or location,
+        followed by the same four total rows. The cells and totals have the layout of
+        _build_report_data, so that the preview, XLSX and PDF render it unchanged;
+        the column totals and the grand total are the net amounts.
+        """
+        by_location = self.combined_column == 'location'
+        if sales_groups is None:
+            sales_groups = self._get_sales_groups(groupby_partner=not by_location)
+        if expense_groups is None:
+            expense_groups = self._get_expense_groups()
 
+        # Merge both sides into {(category, column record): [sales, expenses]}
+        cells = {}
+        for category, partner, amount, _count in sales_groups:
+            if not category:
+                continue  # Not reported in the sales mode either
+            # Sales have no location: they all go to the empty location column
+            column = self.env['store.expense.location'] if by_location else partner
+            cells.setdefault((category, column), [0.0, 0.0])[0] += amount
+        for category, column, amount in expense_groups:
+            cells.setdefault((category, column), [0.0, 0.0])[1] += amount
+
+        # Columns: selected customers or the customers / locations found, the empty one last
+        if self.customer_ids and not by_location:
+            column_records = self.customer_ids.sorted('name')
+        else:
+            column_records = self.env['store.expense.location' if by_location else 'res.partner'].union(
+                *(column for _category, column in cells)
+            ).sorted('name')
+        empty_column_name = 'No Location' if by_location else 'No Customer'
+        has_empty_column = any(not column for _category, column in cells)
+        prefix = 'location' if by_location else 'customer'
+        columns = [{'id': f'{prefix}_{record.id}', 'name': record.name} for record in column_records]
+        if has_empty_column:
+            columns.append({'id': f'{prefix}_none', 'name': empty_column_name})
+
+        if self.store_expense_category_ids:
+            categories = self.store_expense_category_ids.sorted('name')
+        else:
+            categories = self.env['store.expense.category'].union(
+                *(category for category, _column in cells)
+            ).sorted('name')
+
+        def column_id(column):
+            return f'{prefix}_{column.id}' if column else f'{prefix}_none'
+
+        # Sales and expenses per (row key, column id); row key is a category id or 'total'
+        sales = {}
+        expenses = {}
+        for (category, column), (sales_amount, expense_amount) in cells.items():
+            for row_key in (category.id, 'total'):
+                for col_key in (column_id(column), None):
+                    sales[row_key, col_key] = sales.get((row_key, col_key), 0.0) + sales_amount
+                    expenses[row_key, col_key] = expenses.get((row_key, col_key), 0.0) + expense_amount
+
+        matrix_data = {
+            'columns': columns,
+            'rows': [],
+            'values': {},
+            'column_totals': {},
+            'row_totals': {},
+            'grand_total': 0.0,
+            'customer_info': ', '.join(self.customer_ids.mapped('name')) if self.customer_ids else 'All Customers',
+            'category_names': [],
+            'report_mode': 'combined',
+        }
+
+        def add_rows(row_key, row_id, name):
+            for measure, label in (('sales', 'Sales'), ('expenses', 'Expenses'), ('net', 'Net'), ('margin', 'Margin %')):
+                row = {'id': f'{row_id}_{measure}', 'name': f'{name} / {label}'}
+                matrix_data['rows'].append(row)
+                if row_key != 'total':
+                    matrix_data['category_names'].append(row['name'])
+                for col_key in [column['id'] for column in columns] + [None]:
+                    sales_amount = sales.get((row_key, col_key), 0.0)
+                    expense_amount = expenses.get((row_key, col_key), 0.0)
+                    net = sales_amount - expense_amount
+                    value = {
+                        'sales': sales_amount,
+                        'expenses': expense_amount,
+                        'net': net,
+                        'margin': net / sales_amount * 100 if sales_amount else 0.0,
+                    }[measure]
+                    if col_key is None:
+                        matrix_data['row_totals'][row['id']] = value
+                    else:
+                        matrix_data['values'][f"{row['id']}_{col_key}"] = value
+
+        for category in categories:
+            add_rows(category.id, f'category_{category.id}', category.name)
+        add_rows('total', 'total', 'Total')
+
+        for column in columns:
+            matrix_data['column_totals'][column['id']] = (
+                sales.get(('total', column['id']), 0.0) - expenses.get(('total', column['id']), 0.0)
+            )
+        matrix_data['sales_total'] = sales.get(('total', None), 0.0)
+        matrix_data['expense_total'] = expenses.get(('total', None), 0.0)
+        matrix_data['grand_total'] = matrix_data['sales_total'] - matrix_data['expense_total']
+        return matrix_data
+
+    def _build_consolidated_report_data(self):
+        """
+        Matrix of several companies from a single grouped query per source (sales, and
+        expenses in the combined mode): for every company with data, its rows as in the
+        single company report followed by its subtotal row(s), then the total rows of all
+        the companies. Amounts are converted to the report currency.
+        """
+        companies = self._get_report_companies()
+        # Read the documents of all the consolidated companies, whatever the active ones
+        wizard = self.with_context(allowed_company_ids=companies.ids)
+        combined = self.report_mode == 'combined'
+        by_location = combined and self.combined_column == 'location'
+        sales_groups = wizard._get_sales_groups(groupby_partner=not by_location, groupby_company=True)
+        expense_groups = wizard._get_expense_groups(groupby_company=True) if combined else []
+
+        def build(sales, expenses):
+            if combined:
+                return wizard._build_combined_report_data(sales, expenses)
+            return wizard._build_report_data(sales)
+
+        # Columns and totals of all the companies together
+        matrix_data = build([group[1:] for group in sales_groups], [group[1:] for group in expense_groups])
+        total_rows = [row for row in matrix_data['rows'] if str(row['id']).startswith('total')]
+        column_ids = [column['id'] for column in matrix_data['columns']]
+        rows = []
+        values = {}
+        row_totals = {}
+        category_names = []
+
+        for company in companies.sorted('name'):
+            company_sales = [group[1:] for group in sales_groups if group[0] == company]
+            company_expenses = [group[1:] for group in expense_groups if group[0] == company]
+            if not company_sales and not company_expenses:
+                continue
+            company_data = build(company_sales, company_expenses)
+            for row in company_data['rows']:
+                if str(row['id']).startswith('total'):
+                    # Keep the 'total' prefix: company subtotals are styled as totals
+                    row_id = f"total_company_{company.id}{row['id'][len('total'):]}"
+                else:
+                    row_id = f"company_{company.id}_{row['id']}"
+                name = f"{company.name} / {row['name']}"
+                rows.append({'id': row_id, 'name': name})
+                category_names.append(name)
+                row_totals[row_id] = company_data['row_totals'].get(row['id'], 0.0)
+                for column_id in column_ids:
+                    values[f'{row_id}_{column_id}'] = company_data['values'].get(f"{row['id']}_{column_id}", 0.0)
+
+        for row in total_rows:
+            rows.append(row)
+            row_totals[row['id']] = matrix_data['row_totals'].get(row['id'], 0.0)
+            for column_id in column_ids:
+                key = f"{row['id']}_{column_id}"
+                values[key] = matrix_data['values'].get(key, 0.0)
+
+        matrix_data.update({
+            'rows': rows,
+            'values': values,
+            'row_totals': row_totals,
+            'category_names': category_names,
+            'company_names': companies.sorted('name').mapped('name'),
+            'currency': self._get_report_currency().name,
+        })
         return matrix_data
 
+    def _get_report_queries(self):
+        queries = [('sales', self.env['sale.order.line']._search(self._get_sales_domain()).select())]
+        if self.report_mode == 'combined':
+            queries.append(('expenses', self.env['store.expense']._search(self._get_expense_domain()).select()))
+        elif self.trend_interval != 'none' or self.comparison != 'none':
+            queries.append(('trend', self._get_trend_groups_query()))
+        return queries
+
+    @instrumented_report('preview')
     def action_preview(self):
         """Show preview of the report"""
         self.ensure_one()
@@ -219,15 +781,21 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
         if self.date_from > self.date_to:
             raise UserError("Start date cannot be after end date.")
 
-        # Get report data (handles empty categories)
-        report_data = self._get_report_data()
-        
+        # Get report data in the compact preview format (handles empty categories)
+        payload = self._get_preview_payload()
+        with self._report_phase('serialization'):
+            preview_data = report_payload.dumps_compact(payload)
+        self._report_metrics(payload_bytes=len(preview_data))
+
         # Store preview data as JSON and set flag to True
         self.write({
-            'preview_data': json.dumps(report_data),
+            'preview_data': preview_data,
             'has_preview': True
         })
 
+        return self._get_preview_action()
+
+    def _get_preview_action(self):
         return {
             'type': 'ir.actions.act_window',
             'name': f'Store Expense Category Report Preview - {self.date_from} to {self.date_to}',
@@ -240,6 +808,47 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
             }
         }
 
+    def _get_preview_payload(self):
+        """Report data in the compact wire format of the preview widget"""
+        matrix = self._get_report_api_data()
+        with self._report_phase('serialization'):
+            return report_payload.compress(matrix)
+
+    def _get_report_api_data(self, **options):
+        """Encoded matrix (not compressed: the HTTP response is)"""
+        matrix_data = self._get_report_data()
+        with self._report_phase('serialization'):
+            return report_payload.encode_matrix(matrix_data, self._get_report_currency().decimal_places)
+
+    def _get_report_watermark_tables(self):
+        tables = super()._get_report_watermark_tables()
+        if self.consolidated:
+            tables += ('res_currency_rate',)
+        return tables
+
+    def _get_preview_job_payload(self):
+        return self._get_preview_payload()
+
+    def _open_preview_job_payload(self, payload):
+        self.write({
+            'preview_data': report_payload.dumps_compact(payload),
+            'has_preview': True
+        })
+        return self._get_preview_action()
+
+    def _render_report_job(self, report_type):
+        """Render the XLS or PDF report for a background job"""
+        if report_type == 'xlsx':
+            self._report_progress('Building Excel report', 10)
+            return self._get_xlsx_file_name(), self._build_xlsx_report(), XLSX_MIMETYPE
+        if report_type == 'pdf':
+            self._report_progress('Computing report data', 10)
+            report_data = self._get_pdf_report_values()
+            self._report_progress('Rendering PDF', 50)
+            return self._get_pdf_file_name(), self._build_pdf_report(report_data), 'application/pdf'
+        return super()._render_report_job(report_type)
+
+    @instrumented_report('pdf')
     def print_pdf_report(self):
         """Generate PDF report"""
         self.ensure_one()
@@ -248,19 +857,58 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
         if self.date_from > self.date_to:
             raise UserError("Start date cannot be after end date.")
 
+        report_data = self._get_pdf_report_values()
+        if len(self.env['sales.report.pdf']._split_matrix_values(report_data)) == 1:
+            return self.env.ref('sales_store_expense_report.action_store_expense_report_pdf').report_action(
+                self, data=report_data
+            )
+        # Large matrix: render it in chunks now and download the merged document
+        content = self._build_pdf_report(report_data)
+        self._report_metrics(payload_bytes=len(content))
+        return self._get_report_download_action(self._get_pdf_file_name(), content)
+
+    def _get_pdf_file_name(self):
+        return f'Store_Expense_Category_Report_{self.date_from}_{self.date_to}.pdf'
+
+    def _build_pdf_report(self, report_data):
+        """
+        PDF content of the report: in one wkhtmltopdf pass when the matrix fits in one
+        chunk, else in column bands / row batches rendered in parallel (sales.report.pdf)
+        """
+        Pdf = self.env['sales.report.pdf']
+        chunks = Pdf._split_matrix_values(report_data)
+        with self._report_phase('render'):
+            if len(chunks) == 1:
+                content, _report_format = self.env['ir.actions.report']._render_qweb_pdf(
+                    'sales_store_expense_report.action_store_expense_report_pdf', self.ids, data=report_data
+                )
+                return content
+            return Pdf._render_chunks('sales_store_expense_report.action_store_expense_report_pdf_chunk', chunks, self.ids)
+
+    def _get_pdf_report_values(self):
+        """Values for the store_expense_category_pdf template"""
         matrix_data = self._get_report_data()
+        with self._report_phase('serialization'):
+            return self._prepare_pdf_report_values(matrix_data)
+
+    def _prepare_pdf_report_values(self, matrix_data):
 
         # Prepare data for the template
+        if self.consolidated:
+            company_name = f"{', '.join(matrix_data['company_names'])} ({matrix_data['currency']})"
+        else:
+            company_name = self.company_id.name
         report_data = {
-            'display_company_name': self.company_id.name,
+            'display_company_name': company_name,
             'date_from': self.date_from.strftime('%Y-%m-%d'),
             'date_to': self.date_to.strftime('%Y-%m-%d'),
             'datetime_now': fields.Datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'customer_names': ', '.join(self.customer_ids.mapped('name')) if self.customer_ids else False,
             'column_names': [col['name'] for col in matrix_data['columns']],
+            'location_names': [col['name'] for col in matrix_data['columns']],
             'category_names': matrix_data['category_names'],
             'table_data': {},
-            'row_totals': matrix_data['row_totals'],
+            'row_totals': {row['name']: matrix_data['row_totals'].get(row['id'], 0.0) for row in matrix_data['rows']},
             'column_totals': [matrix_data['column_totals'].get(col['id'], 0.0) for col in matrix_data['columns']],
             'grand_total': matrix_data['grand_total']
         }
@@ -275,120 +923,112 @@ class SalesStoreExpenseCategoryWizard(models.TransientModel):
                 amount = matrix_data['values'].get(key, 0.0)
                 report_data['table_data'][row_name].append(amount)
 
-        return self.env.ref('sales_store_expense_report.action_store_expense_report_pdf').report_action(
-            self, data=report_data
-        )
+        return report_data
 
     def print_xls_report(self):
-        """Generate Excel report"""
+        """Download the Excel report (CSV or ODS with the ``export_format`` context key)"""
         self.ensure_one()
 
         # Validate dates
         if self.date_from > self.date_to:
             raise UserError("Start date cannot be after end date.")
 
+        # Generated by the download route and streamed, nothing is stored
+        return self._get_direct_download_action(self.env.context.get('export_format', 'xlsx'))
+
+    def _get_xlsx_file_name(self, export_format='xlsx'):
+        return f'Store_Expense_Category_Report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.{export_format}'
+
+    def _build_xlsx_report(self, export_format='xlsx', path=None):
+        """Build the Excel workbook (or the CSV / ODS file) and return its content, or write it to ``path``"""
         matrix_data = self._get_report_data()
+        with self._report_phase('render'):
+            return self._write_xlsx_report(matrix_data, export_format, path)
 
-        # Create Excel file
-        output = io.BytesIO()
-        workbook = xlsxwriter.Workbook(output, {'in_memory': True})
-        worksheet = workbook.add_worksheet('Store Expense Category Report')
+    def _write_xlsx_report(self, matrix_data, export_format='xlsx', path=None):
+        info = [
+            f"Date From: {self.date_from}",
+            f"Date To: {self.date_to}",
+            f"Customers: {matrix_data.get('customer_info', 'All Customers')}",
+        ]
+        if matrix_data.get('company_names'):
+            info.append(f"Companies: {', '.join(matrix_data['company_names'])} ({matrix_data['currency']})")
+        # The matrix rows already contain the (sub)totals rows
+        exporter = MatrixExporter(
+            DenseMatrix.from_report_data(matrix_data),
+            title='Sales Store Expense Report',
+            info=info,
+            label_header='Store Expense',
+            sheet_name='Store Expense Category Report',
+            row_totals=False,
+            column_totals=False,
+        )
 
-        # Styles
-        header_style = workbook.add_format({
-            'bold': True, 'bg_color': '#F0F0F0', 'border': 1, 'align': 'center'
-        })
-        cell_style = workbook.add_format({'border': 1, 'align': 'right', 'num_format': '#,##0.00'})
-        title_style = workbook.add_format({
-            'bold': True, 'font_size': 16, 'align': 'center'
-        })
-        total_style = workbook.add_format({
-            'bold': True, 'bg_color': '#E6E6E6', 'border': 1, 'align': 'right', 'num_format': '#,##0.00'
-        })
-        category_style = workbook.add_format({
-            'bold': True, 'border': 1, 'align': 'left', 'bg_color': '#F0F0F0'
-        })
+        def write_extra_sheets(workbook, formats):
+            styles = {'header': formats['header'], 'cell': formats['cell'], 'total': formats['total'], 'category': formats['label']}
+            if matrix_data.get('buckets'):
+                self._write_xlsx_trend_sheet(workbook, matrix_data, styles)
+            if matrix_data.get('comparison'):
+                self._write_xlsx_comparison_sheet(workbook, matrix_data, styles)
 
-        # Title
-        worksheet.merge_range(0, 0, 0, len(matrix_data['columns']),
-                             'Sales Store Expense Report', title_style)
-
-        # Company and Date info
-        worksheet.write(1, 0, f"Date From: {self.date_from}")
-        worksheet.write(1, 1, f"Date To: {self.date_to}")
-        
-        # Customer info
-        customer_info = matrix_data.get('customer_info', 'All Customers')
-        worksheet.write(2, 0, f"Customers: {customer_info}")
-
-        # Headers
-        row_idx = 4
-        col_idx = 0
-        
-        # Write category header in first column
-        worksheet.write(row_idx, col_idx, 'Store Expense', header_style)
-        col_idx += 1
-        
-        # Write customer headers
-        for column in matrix_data['columns']:
-            worksheet.write(row_idx, col_idx, column['name'], header_style)
-            col_idx += 1
+        return exporter.export(export_format, extra_sheets=write_extra_sheets, path=path)
 
-        # Data rows
-        row_idx = 5
+    def _iter_xlsx_cells(self, matrix_data):
+        """(row, column name, key) of every cell, then of the row total (column name 'Total')"""
         for row in matrix_data['rows']:
-            col_idx = 0
-            
-            # Write category name in first column
-            if row['id'] == 'total':
-                worksheet.write(row_idx, col_idx, row['name'], total_style)
-            else:
-                worksheet.write(row_idx, col_idx, row['name'], category_style)
-            col_idx += 1
-            
-            # Write amount data for each customer column
             for column in matrix_data['columns']:
-                key = f"{row['id']}_{column['id']}"
-                amount = matrix_data['values'].get(key, 0.0)
-                
-                # Apply different styles based on cell type
-                if row['id'] == 'total':
-                    # This is a total row cell
-                    worksheet.write(row_idx, col_idx, amount, total_style)
-                else:
-                    # Regular amount cell
-                    worksheet.write(row_idx, col_idx, amount, cell_style)
-                
-                col_idx += 1
-            row_idx += 1
-
-        # Adjust column widths
-        worksheet.set_column(0, 0, 25)  # Store Expense column
-        for i in range(1, len(matrix_data['columns']) + 1):
-            worksheet.set_column(i, i, 15)  # Amount columns
-
-        workbook.close()
-        output.seek(0)
-
-        # Create download record
-        export_id = self.env['store.expense.report.download'].create({
-            'excel_file': base64.b64encode(output.read()),
-            'file_name': f'Store_Expense_Category_Report_{datetime.now().strftime("%Y%m%d_%H%M%S")}.xlsx'
-        })
-
-        return {
-            'type': 'ir.actions.act_window',
-            'name': 'Download Store Expense Report',
-            'res_model': 'store.expense.report.download',
-            'view_mode': 'form',
-            'res_id': export_id.id,
-            'target': 'new'
-        }
-    
+                yield row, column['name'], f"{row['id']}_{column['id']}"
+            yield row, 'Total', f"{row['id']}_total"
 
-class StoreExpenseReportDownload(models.TransientModel):
-    _name = 'store.expense.report.download'
-    _description = 'Store Expense Report Download'
+    def _write_xlsx_trend_sheet(self, workbook, matrix_data, styles):
+        """One line per non-empty cell with its amount in every trend bucket"""
+        worksheet = workbook.add_worksheet('Trend')
+        buckets = matrix_data['buckets']
+        series = matrix_data['series']
+        headers = ['Store Expense', 'Customer'] + [bucket['name'] for bucket in buckets] + ['Total']
+        worksheet.write_row(0, 0, headers, styles['header'])
+        row_idx = 1
+        for row, column_name, key in self._iter_xlsx_cells(matrix_data):
+            points = series.get(key)
+            if not points:
+                continue
+            is_total = str(row['id']).startswith('total') or column_name == 'Total'
+            style = styles['total'] if is_total else styles['cell']
+            worksheet.write(row_idx, 0, row['name'], styles['total'] if is_total else styles['category'])
+            worksheet.write(row_idx, 1, column_name, styles['total'] if is_total else styles['category'])
+            worksheet.write_row(row_idx, 2, points, style)
+            worksheet.write(row_idx, 2 + len(points), sum(points), style)
+            row_idx += 1
+        worksheet.set_column(0, 1, 25)
+        worksheet.set_column(2, len(headers) - 1, 12)
+        worksheet.freeze_panes(1, 2)
 
-    excel_file = fields.Binary(string='Excel File', readonly=True)
-    file_name = fields.Char(string='File Name', size=256)
\ No newline at end of file
+    def _write_xlsx_comparison_sheet(self, workbook, matrix_data, styles):
+        """Amount of every cell in the report period and in the comparison period"""
+        comparison = matrix_data['comparison']
+        worksheet = workbook.add_worksheet('Comparison')
+        worksheet.write(0, 0, f"{comparison['label']}: {comparison['date_from']} to {comparison['date_to']}")
+        headers = ['Store Expense', 'Customer', 'Amount', comparison['label'], 'Change', 'Change %']
+        worksheet.write_row(2, 0, headers, styles['header'])
+        previous_values = dict(comparison['values'])
+        previous_values.update((f'{row_id}_total', amount) for row_id, amount in comparison['row_totals'].items())
+        percent_style = workbook.add_format({'border': 1, 'align': 'right', 'num_format': '0.0%'})
+        row_idx = 3
+        for row, column_name, key in self._iter_xlsx_cells(matrix_data):
+            if column_name == 'Total':
+                amount = matrix_data['row_totals'].get(row['id'], 0.0)
+            else:
+                amount = matrix_data['values'].get(key, 0.0)
+            previous = previous_values.get(key, 0.0)
+            if not amount and not previous:
+                continue
+            is_total = str(row['id']).startswith('total') or column_name == 'Total'
+            style = styles['total'] if is_total else styles['cell']
+            worksheet.write(row_idx, 0, row['name'], styles['total'] if is_total else styles['category'])
+            worksheet.write(row_idx, 1, column_name, styles['total'] if is_total else styles['category'])
+            worksheet.write_row(row_idx, 2, [amount, previous, amount - previous], style)
+            if previous:
+                worksheet.write(row_idx, 5, (amount - previous) / abs(previous), percent_style)
+            row_idx += 1
+        worksheet.set_column(0, 1, 25)
+        worksheet.set_column(2, 5, 15)
@@ -2,50 +2,177 @@
 
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
-import { Component, onWillUpdateProps } from "@odoo/owl"; 
+import {
+    Component,
+    onMounted,
+    onWillStart,
+    onWillUnmount,
+    onWillUpdateProps,
+    useExternalListener,
+    useRef,
+    useState,
+} from "@odoo/owl";
+import { decodeMatrix, parsePayload } from "./report_payload";
+
+// Size of the trend sparklines drawn in the cells (SVG user units)
+const SPARKLINE_WIDTH = 60;
+const SPARKLINE_HEIGHT = 14;
+
+// Virtualized matrix: only the cells in the scrolled viewport (plus OVERSCAN rows and
+// columns around it) are rendered, the rest of the table is replaced by spacers of the
+// same size. Rows and columns have a fixed size so that the window is computed from the
+// scroll position alone. Sizes in px.
+const ROW_HEIGHT = 32;
+const TREND_ROW_HEIGHT = 20;  // Added to the rows for the sparkline
+const COMPARISON_ROW_HEIGHT = 18;  // Added to the rows for the change against the comparison
+const COLUMN_WIDTH = 120;
+const LABEL_WIDTH = 200;
+const TOTAL_WIDTH = 130;
+const HEADER_HEIGHT = 40;
+const OVERSCAN = 4;
+// Viewport size assumed until the widget is mounted and measured
+const DEFAULT_VIEWPORT_WIDTH = 1200;
+const DEFAULT_VIEWPORT_HEIGHT = 480;
 
 export class ProductCategoryReportWidget extends Component {
     setup() {
         super.setup();
         this.orm = useService("orm");
         this.action = useService("action");
+        this.viewportRef = useRef("viewport");
+        // Visible window of the matrix: [rowStart, rowEnd) x [columnStart, columnEnd)
+        this.state = useState({ rowStart: 0, rowEnd: 0, columnStart: 0, columnEnd: 0 });
+        this.viewport = {
+            scrollTop: 0,
+            scrollLeft: 0,
+            width: DEFAULT_VIEWPORT_WIDTH,
+            height: DEFAULT_VIEWPORT_HEIGHT,
+        };
+        this.animationFrame = null;
         
         // Initialize report data
-        this.reportData = this._parseReportData(this.props.record.data.report_data_json);
+        onWillStart(async () => {
+            this._setReportData(await this._parseReportData(this.props.record.data.report_data_json));
+        });
         
         // Update when props change
-        onWillUpdateProps((nextProps) => {
-            this.reportData = this._parseReportData(nextProps.record.data.report_data_json);
+        onWillUpdateProps(async (nextProps) => {
+            this._setReportData(await this._parseReportData(nextProps.record.data.report_data_json));
+        });
+
+        onMounted(() => this._measureViewport());
+        onWillUnmount(() => cancelAnimationFrame(this.animationFrame));
+        useExternalListener(window, "resize", () => this._measureViewport());
+    }
+
+    _setReportData(reportData) {
+        this.reportData = reportData;
+        // Sparkline points by cell slot, computed once per cell scrolled into view
+        this.sparklines = new Map();
+        this.rowHeight = ROW_HEIGHT
+            + (reportData.series ? TREND_ROW_HEIGHT : 0)
+            + (reportData.comparison ? COMPARISON_ROW_HEIGHT : 0);
+        this._updateWindow();
+    }
+
+    // --------------------------------------------------------------------------
+    // Virtualization
+    // --------------------------------------------------------------------------
+
+    _measureViewport() {
+        const el = this.viewportRef.el;
+        if (!el) {
+            return;
+        }
+        Object.assign(this.viewport, {
+            scrollTop: el.scrollTop,
+            scrollLeft: el.scrollLeft,
+            width: el.clientWidth,
+            height: el.clientHeight,
         });
+        this._updateWindow();
+    }
+
+    /**
+     * Scroll handler: the window is recomputed at most once per animation frame, and
+     * the component only renders again when the window changes
+     */
+    onScroll(ev) {
+        this.viewport.scrollTop = ev.target.scrollTop;
+        this.viewport.scrollLeft = ev.target.scrollLeft;
+        if (this.animationFrame === null) {
+            this.animationFrame = requestAnimationFrame(() => {
+                this.animationFrame = null;
+                this._updateWindow();
+            });
+        }
+    }
+
+    _updateWindow() {
+        const { scrollTop, scrollLeft, width, height } = this.viewport;
+        const rowCount = this.reportData.rows.length;
+        const columnCount = this.reportData.columns.length;
+        // The header, totals row, label and totals columns are sticky: they hide part of the viewport
+        const bodyHeight = Math.max(height - HEADER_HEIGHT - this.rowHeight, this.rowHeight);
+        const bodyWidth = Math.max(width - LABEL_WIDTH - TOTAL_WIDTH, COLUMN_WIDTH);
+        Object.assign(this.state, {
+            rowStart: Math.max(0, Math.floor(scrollTop / this.rowHeight) - OVERSCAN),
+            rowEnd: Math.min(rowCount, Math.ceil((scrollTop + bodyHeight) / this.rowHeight) + OVERSCAN),
+            columnStart: Math.max(0, Math.floor(scrollLeft / COLUMN_WIDTH) - OVERSCAN),
+            columnEnd: Math.min(columnCount, Math.ceil((scrollLeft + bodyWidth) / COLUMN_WIDTH) + OVERSCAN),
+        });
+    }
+
+    get visibleRows() {
+        return this.reportData.rows.slice(this.state.rowStart, this.state.rowEnd);
+    }
+
+    get visibleColumns() {
+        return this.reportData.columns.slice(this.state.columnStart, this.state.columnEnd);
+    }
+
+    /** Sizes of the spacers standing for the rows / columns outside the window */
+    get spacers() {
+        return {
+            top: this.state.rowStart * this.rowHeight,
+            bottom: (this.reportData.rows.length - this.state.rowEnd) * this.rowHeight,
+            left: this.state.columnStart * COLUMN_WIDTH,
+            right: (this.reportData.columns.length - this.state.columnEnd) * COLUMN_WIDTH,
+        };
+    }
+
+    get tableWidth() {
+        return LABEL_WIDTH + this.reportData.columns.length * COLUMN_WIDTH + TOTAL_WIDTH;
+    }
+
+    get sizes() {
+        return {
+            row: this.rowHeight,
+            column: COLUMN_WIDTH,
+            label: LABEL_WIDTH,
+            total: TOTAL_WIDTH,
+            header: HEADER_HEIGHT,
+            viewport: DEFAULT_VIEWPORT_HEIGHT,
+        };
     }
 
     /**
-     * Parses the JSON string from the report_data_json field
+     * Decodes the compact matrix payload of the report_data_json field
+     * (see models/report_payload.py)
      */
-    _parseReportData(jsonValue) {
+    async _parseReportData(jsonValue) {
         const defaultData = {
             rows: [
-                { id: 1, name: "All" },
-                { id: 2, name: "Total" }
+                { id: 1, name: "All", index: 0 },
+                { id: 2, name: "Total", index: 1 }
             ],
             columns: [
-                { id: 1, name: "SAL CAPITEM CLAVIN" },
-                { id: 2, name: "SAL Kitchen" }
+                { id: 1, name: "SAL CAPITEM CLAVIN", index: 0 },
+                { id: 2, name: "SAL Kitchen", index: 1 }
             ],
-            values: {
-                "1_1": 0.00,
-                "1_2": 0.00,
-                "2_1": 0.00,
-                "2_2": 0.00
-            },
-            row_totals: {
-                1: 0.00,
-                2: 0.00
-            },
-            column_totals: {
-                1: 0.00,
-                2: 0.00
-            },
+            values: new Float64Array(4),
+            rowTotals: new Float64Array(2),
+            columnTotals: new Float64Array(2),
             grand_total: 0.00,
             has_data: false
         };
@@ -54,16 +181,10 @@ export class ProductCategoryReportWidget extends Component {
             return defaultData;
         }
         try {
-            const parsedData = JSON.parse(jsonValue);
+            const parsedData = decodeMatrix(await parsePayload(jsonValue));
             // Always show the table structure, even with no real data
-            if (!parsedData.rows || parsedData.rows.length === 0) {
-                parsedData.rows = defaultData.rows;
-            }
-            if (!parsedData.columns || parsedData.columns.length === 0) {
-                parsedData.columns = defaultData.columns;
-            }
-            if (!parsedData.values) {
-                parsedData.values = defaultData.values;
+            if (!parsedData.rows.length || !parsedData.columns.length) {
+                return defaultData;
             }
             parsedData.has_data = true; // Always show table
             return parsedData;
@@ -91,25 +212,72 @@ export class ProductCategoryReportWidget extends Component {
     }
 
     /**
-     * Get the amount for a specific category and customer
+     * Get the amount for a specific category and customer (row / column index)
      */
-    getAmount(categoryId, customerId) {
-        const key = `${categoryId}_${customerId}`;
-        return this.reportData.values[key] || 0;
+    getAmount(rowIndex, columnIndex) {
+        return this.reportData.values[rowIndex * this.reportData.columns.length + columnIndex];
+    }
+
+    /**
+     * SVG polyline points of the trend series of a cell, or null without trend
+     */
+    getSparkline(rowIndex, columnIndex) {
+        if (!this.reportData.series) {
+            return null;
+        }
+        const columnCount = this.reportData.columns.length;
+        const slot = rowIndex * (columnCount + 1) + (columnIndex < 0 ? columnCount : columnIndex);
+        if (!this.sparklines.has(slot)) {
+            this.sparklines.set(slot, this._computeSparkline(this.reportData.getSeries(rowIndex, columnIndex)));
+        }
+        return this.sparklines.get(slot);
+    }
+
+    _computeSparkline(points) {
+        if (!points || points.length < 2) {
+            return null;
+        }
+        const max = Math.max(...points);
+        const min = Math.min(0, ...points);
+        const range = max - min || 1;
+        const step = SPARKLINE_WIDTH / (points.length - 1);
+        return Array.from(points, (value, index) =>
+            `${(index * step).toFixed(1)},${(SPARKLINE_HEIGHT - ((value - min) / range) * SPARKLINE_HEIGHT).toFixed(1)}`
+        ).join(" ");
+    }
+
+    /**
+     * Change of a cell against the comparison period, or null without comparison
+     */
+    getDelta(rowIndex, columnIndex) {
+        if (!this.reportData.comparison) {
+            return null;
+        }
+        const previous = this.reportData.getComparison(rowIndex, columnIndex);
+        const amount = columnIndex < 0 ? this.getRowTotal(rowIndex) : this.getAmount(rowIndex, columnIndex);
+        if (!previous) {
+            return amount ? { text: "new", className: "text-success" } : null;
+        }
+        const change = ((amount - previous) / Math.abs(previous)) * 100;
+        return {
+            text: `${change >= 0 ? "+" : ""}${change.toFixed(1)}%`,
+            className: change >= 0 ? "text-success" : "text-danger",
+            title: `${this.reportData.comparison.label}: ${this.formatAmount(previous)}`,
+        };
     }
 
     /**
      * Get row total for a category
      */
-    getRowTotal(categoryId) {
-        return this.reportData.row_totals[categoryId] || 0;
+    getRowTotal(rowIndex) {
+        return this.reportData.rowTotals[rowIndex];
     }
 
     /**
      * Get column total for a customer
      */
-    getColumnTotal(customerId) {
-        return this.reportData.column_totals[customerId] || 0;
+    getColumnTotal(columnIndex) {
+        return this.reportData.columnTotals[columnIndex];
     }
 
     /**
@@ -140,6 +308,14 @@ export class ProductCategoryReportWidget extends Component {
     get hasData() {
         return true; // Always show the table structure
     }
+
+    get sparklineWidth() {
+        return SPARKLINE_WIDTH;
+    }
+
+    get sparklineHeight() {
+        return SPARKLINE_HEIGHT;
+    }
 }
 
 // --------------------------------------------------------------------------------
@@ -0,0 +1,72 @@
+/** @odoo-module **/
+
+import { registry } from "@web/core/registry";
+import { useService } from "@web/core/utils/hooks";
+import { Component, useState, onMounted, onWillUnmount } from "@odoo/owl";
+
+const POLL_INTERVAL = 2000;
+
+export class ReportJobStatusWidget extends Component {
+    setup() {
+        super.setup();
+        this.orm = useService("orm");
+        this.action = useService("action");
+
+        this.status = useState({
+            state: this.props.record.data.state,
+            phase: false,
+            progress: 0,
+            rows_processed: 0,
+            error: false,
+        });
+
+        onMounted(() => {
+            if (this.isPending) {
+                this.timer = setInterval(() => this._poll(), POLL_INTERVAL);
+            }
+        });
+        onWillUnmount(() => this._stopPolling());
+    }
+
+    get isPending() {
+        return ["queued", "running"].includes(this.status.state);
+    }
+
+    _stopPolling() {
+        if (this.timer) {
+            clearInterval(this.timer);
+            this.timer = null;
+        }
+    }
+
+    /**
+     * Refresh the job status; once the job is done, reload the record and start the download
+     */
+    async _poll() {
+        const jobId = this.props.record.resId;
+        const status = await this.orm.call("sales.report.job", "get_job_status", [jobId]);
+        Object.assign(this.status, status);
+        if (!this.isPending) {
+            this._stopPolling();
+            await this.props.record.load();
+            if (status.state === "done") {
+                const action = await this.orm.call("sales.report.job", "action_download", [[jobId]]);
+                await this.action.doAction(action);
+            }
+        }
+    }
+
+    get progressPercent() {
+        return Math.round(this.status.progress || 0);
+    }
+
+    get progressStyle() {
+        return `width: ${this.progressPercent}%`;
+    }
+}
+
+ReportJobStatusWidget.template = "sales_store_expense_report.ReportJobStatusWidget";
+
+registry.category("fields").add("report_job_status", {
+    component: ReportJobStatusWidget,
+});
@@ -2,19 +2,153 @@
 
 import { registry } from "@web/core/registry";
 import { useService } from "@web/core/utils/hooks";
-import { Component } from "@odoo/owl"; 
+import { Component, markRaw, onWillStart, onWillUpdateProps, useState } from "@odoo/owl"; 
+import { decodeLines, parsePayload } from "./report_payload";
+
+// Page sizes of the server-side paging: at most one customer's line page is loaded
+// at a time, so the browser holds GROUP_PAGE_SIZE groups and LINE_PAGE_SIZE lines.
+const GROUP_PAGE_SIZE = 20;
+const LINE_PAGE_SIZE = 100;
 
 export class ReportMatrixWidget extends Component {
     setup() {
         super.setup();
         this.orm = useService("orm");
-        
-        // Initialize report data
-        this.reportData = this._parseReportData(this.props.record.data.report_data_json);
+        this.state = useState({
+            groups: [],
+            groupCount: 0,
+            groupOffset: 0,
+            openGroupKey: null,
+            lines: null,
+            lineOffset: 0,
+            loading: false,
+        });
+
+        // Initialize report data (only the summary, groups and lines are paged in)
+        this.reportDataJson = this.props.record.data.report_data_json;
+        this.reportData = this._parseReportData(this.reportDataJson);
+        onWillStart(() => this.loadGroups(0));
+        onWillUpdateProps(async (nextProps) => {
+            // The record is updated in place: compare with the value the groups were loaded for
+            const jsonValue = nextProps.record.data.report_data_json;
+            if (jsonValue !== this.reportDataJson) {
+                this.reportDataJson = jsonValue;
+                this.reportData = this._parseReportData(jsonValue);
+                await this.loadGroups(0, nextProps.record);
+            }
+        });
     }
 
-    willUpdateProps(nextProps) {
-        this.reportData = this._parseReportData(nextProps.record.data.report_data_json);
+    // --------------------------------------------------------------------------
+    // Server-side paging
+    // --------------------------------------------------------------------------
+
+    /**
+     * Load a page of customer groups (the report filters are read from the wizard record)
+     */
+    async loadGroups(offset, record = this.props.record) {
+        this.state.openGroupKey = null;
+        this.state.lines = null;
+        if (!this.reportData.paged || !record.resId) {
+            this.state.groups = [];
+            this.state.groupCount = 0;
+            return;
+        }
+        this.state.loading = true;
+        try {
+            const result = await this.orm.call(record.resModel, "get_preview_groups", [[record.resId]], {
+                offset: offset,
+                limit: GROUP_PAGE_SIZE,
+            });
+            this.state.groups = result.groups;
+            this.state.groupCount = result.count;
+            this.state.groupOffset = offset;
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    /**
+     * Load a page of lines of one customer group, replacing the lines loaded before
+     */
+    async loadLines(group, offset) {
+        const record = this.props.record;
+        this.state.loading = true;
+        try {
+            const payload = await this.orm.call(record.resModel, "get_preview_lines", [[record.resId], group.partner_id], {
+                offset: offset,
+                limit: LINE_PAGE_SIZE,
+            });
+            // Columnar page, kept out of the reactive state (rows are read by index)
+            const lines = decodeLines(await parsePayload(payload), ["quantity", "price", "total"]);
+            this.state.openGroupKey = group.key;
+            this.state.lineOffset = offset;
+            this.state.lines = markRaw(lines);
+        } finally {
+            this.state.loading = false;
+        }
+    }
+
+    onToggleGroup(group) {
+        if (this.state.openGroupKey === group.key) {
+            this.state.openGroupKey = null;
+            this.state.lines = null;
+        } else if (group.lines) {
+            this.loadLines(group, 0);
+        }
+    }
+
+    onGroupPage(direction) {
+        this.loadGroups(this.state.groupOffset + direction * GROUP_PAGE_SIZE);
+    }
+
+    onLinePage(group, direction) {
+        this.loadLines(group, this.state.lineOffset + direction * LINE_PAGE_SIZE);
+    }
+
+    get hasPreviousGroups() {
+        return this.state.groupOffset > 0;
+    }
+
+    get hasNextGroups() {
+        return this.state.groupOffset + GROUP_PAGE_SIZE < this.state.groupCount;
+    }
+
+    /**
+     * Indexes of the loaded lines, for the template loop
+     */
+    get lineIndexes() {
+        return this.state.lines ? Array.from({ length: this.state.lines.length }, (_, index) => index) : [];
+    }
+
+    line(index, column) {
+        return this.state.lines.get(index, column);
+    }
+
+    hasPreviousLines() {
+        return this.state.lineOffset > 0;
+    }
+
+    hasNextLines(group) {
+        return this.state.lineOffset + LINE_PAGE_SIZE < group.lines;
+    }
+
+    /**
+     * Range of the displayed page, e.g. "21-40 of 135"
+     */
+    pageRange(offset, size, count) {
+        if (!count) {
+            return "0";
+        }
+        return `${offset + 1}-${Math.min(offset + size, count)} of ${count}`;
+    }
+
+    get groupRange() {
+        return this.pageRange(this.state.groupOffset, GROUP_PAGE_SIZE, this.state.groupCount);
+    }
+
+    lineRange(group) {
+        return this.pageRange(this.state.lineOffset, LINE_PAGE_SIZE, group.lines);
     }
 
     /**
@@ -22,7 +156,10 @@ export class ReportMatrixWidget extends Component {
      */
     _parseReportData(jsonValue) {
         const defaultData = {
-            grouped_data: {},
+            paged: false,
+            line_count: 0,
+            group_count: 0,
+            total: 0,
             columns: [],
             date_from: false,
             date_to: false,
@@ -72,21 +209,6 @@ export class ReportMatrixWidget extends Component {
         return `${quantity} ${uom || ''}`.trim();
     }
 
-    /**
-     * Get location groups for display with unique keys
-     */
-    get locationGroups() {
-        const groups = Object.entries(this.reportData.grouped_data || {}).map(([location, lines], index) => ({
-            location: location,
-            lines: lines.map((line, lineIndex) => ({
-                ...line,
-                uniqueKey: `${location}_${lineIndex}_${line.order_reference || 'line'}` // Create unique key
-            })),
-            uniqueKey: `group_${index}_${location}` // Create unique key for group
-        }));
-        return groups;
-    }
-    
     /**
      * Check if there's actual transaction data to display
      */
@@ -0,0 +1,106 @@
+/** @odoo-module **/
+
+/**
+ * Decoding of the compact preview payloads built by models/report_payload.py
+ */
+
+export const PAYLOAD_VERSION = 1;
+
+/**
+ * Parse a payload (JSON string or already parsed object), inflating the gzip envelope
+ */
+export async function parsePayload(value) {
+    let payload = typeof value === "string" ? JSON.parse(value) : value;
+    if (payload && payload.encoding === "gzip") {
+        const bytes = Uint8Array.from(atob(payload.data), (char) => char.charCodeAt(0));
+        const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream("gzip"));
+        payload = JSON.parse(await new Response(stream).text());
+    }
+    if (payload && payload.format && payload.version > PAYLOAD_VERSION) {
+        throw new Error(`Unsupported report payload version ${payload.version}`);
+    }
+    return payload;
+}
+
+/**
+ * Decode a matrix payload into dimension arrays and dense typed arrays:
+ * the value of row r / column c is ``values[r * columns.length + c]``.
+ */
+export function decodeMatrix(payload) {
+    const rows = payload.rows.ids.map((id, index) => ({ id, name: payload.rows.names[index], index }));
+    const columns = payload.columns.ids.map((id, index) => ({ id, name: payload.columns.names[index], index }));
+    const values = new Float64Array(rows.length * columns.length);
+    const { row, column, value } = payload.cells;
+    for (let i = 0; i < value.length; i++) {
+        values[row[i] * columns.length + column[i]] = value[i];
+    }
+    // Optional trend series / comparison amounts: one slot per cell plus one per row total
+    // (column -1), at ``r * (columns.length + 1) + c`` with the row total last
+    const stride = columns.length + 1;
+    const slot = (r, c) => r * stride + (c < 0 ? columns.length : c);
+    let series = null;
+    if (payload.series) {
+        series = new Array(rows.length * stride);
+        payload.series.values.forEach((points, i) => {
+            series[slot(payload.series.row[i], payload.series.column[i])] = Float64Array.from(points);
+        });
+    }
+    let comparison = null;
+    if (payload.comparison) {
+        const cells = payload.comparison.cells;
+        comparison = {
+            ...payload.comparison,
+            values: new Float64Array(rows.length * stride),
+            columnTotals: Float64Array.from(payload.comparison.column_totals),
+        };
+        for (let i = 0; i < cells.value.length; i++) {
+            comparison.values[slot(cells.row[i], cells.column[i])] = cells.value[i];
+        }
+    }
+    return {
+        ...payload,
+        rows,
+        columns,
+        values,
+        rowTotals: Float64Array.from(payload.row_totals),
+        columnTotals: Float64Array.from(payload.column_totals),
+        series,
+        comparison,
+        /** Trend points of a cell (``columnIndex`` -1: row total), or undefined */
+        getSeries(rowIndex, columnIndex) {
+            return series && series[slot(rowIndex, columnIndex)];
+        },
+        /** Comparison period amount of a cell (``columnIndex`` -1: row total) */
+        getComparison(rowIndex, columnIndex) {
+            return comparison ? comparison.values[slot(rowIndex, columnIndex)] : 0;
+        },
+    };
+}
+
+/**
+ * Decode a lines payload: numeric columns become Float64Array, dictionary encoded
+ * columns keep their dictionary and a Uint32Array of indices; ``get(i, column)``
+ * reads one value.
+ */
+export function decodeLines(payload, numericColumns = []) {
+    const columns = {};
+    for (const column of payload.columns) {
+        const data = payload.data[column];
+        const dictionary = payload.dictionaries[column];
+        if (dictionary) {
+            columns[column] = { codes: Uint32Array.from(data), dictionary };
+        } else if (numericColumns.includes(column)) {
+            columns[column] = { values: Float64Array.from(data) };
+        } else {
+            columns[column] = { values: data };
+        }
+    }
+    return {
+        length: payload.length,
+        columns,
+        get(index, column) {
+            const col = columns[column];
+            return col.codes ? col.dictionary[col.codes[index]] : col.values[index];
+        },
+    };
+}
@@ -0,0 +1,6 @@
+from . import test_date_ranges
+from . import test_expense_category_matcher
+from . import test_matrix_export
+from . import test_report_cache
+from . import test_report_payload
+from . import test_report_queries
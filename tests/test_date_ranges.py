@@ -0,0 +1,73 @@
+from datetime import date, datetime
+
+from odoo.fields import Command
+from odoo.tests import TransactionCase
+
+from odoo.addons.sales_store_expense_report.models.sales_daily_aggregate import USE_DAILY_AGGREGATE_PARAM
+
+
+class TestDateRanges(TransactionCase):
+    """Report days of the user's timezone as half-open UTC ranges (sales.report.mixin)"""
+
+    def _new_wizard(self, tz, date_from, date_to):
+        return self.env['sales.store.expense.category.wizard'].with_context(tz=tz).new({
+            'company_id': self.env.company.id,
+            'date_from': date_from,
+            'date_to': date_to,
+        })
+
+    def test_utc_bounds_utc(self):
+        wizard = self._new_wizard('UTC', date(2024, 6, 1), date(2024, 6, 30))
+        self.assertEqual(wizard._get_utc_bounds(), (datetime(2024, 6, 1), datetime(2024, 7, 1)))
+
+    def test_utc_bounds_local_timezone(self):
+        # Brussels is UTC+1 on March 1st and UTC+2 after the switch of March 31st
+        wizard = self._new_wizard('Europe/Brussels', date(2024, 3, 1), date(2024, 3, 31))
+        self.assertEqual(wizard._get_utc_bounds(), (datetime(2024, 2, 29, 23), datetime(2024, 3, 31, 22)))
+        self.assertEqual(
+            wizard._get_utc_bounds(date(2024, 1, 1), date(2024, 1, 1)),
+            (datetime(2023, 12, 31, 23), datetime(2024, 1, 1, 23)),
+        )
+
+    def test_date_range_domain_is_half_open(self):
+        wizard = self._new_wizard('Asia/Tokyo', date(2024, 6, 1), date(2024, 6, 1))
+        self.assertEqual(wizard._get_date_range_domain('date_order'), [
+            ('date_order', '>=', datetime(2024, 5, 31, 15)),
+            ('date_order', '<', datetime(2024, 6, 1, 15)),
+        ])
+
+    def test_last_day_included(self):
+        partner = self.env['res.partner'].create({'name': 'Date Range Customer'})
+        orders = self.env['sale.order'].create([
+            {'partner_id': partner.id, 'date_order': date_order}
+            for date_order in (
+                datetime(2024, 6, 30, 23, 59, 59),  # last second of the range
+                datetime(2024, 7, 1, 0, 0, 0),      # first second after it
+            )
+        ])
+        wizard = self._new_wizard('UTC', date(2024, 6, 1), date(2024, 6, 30))
+        domain = [('id', 'in', orders.ids), *wizard._get_date_range_domain('date_order')]
+        self.assertEqual(self.env['sale.order'].search(domain), orders[0])
+
+    def test_daily_aggregate_days(self):
+        Daily = self.env['sales.store.expense.daily']
+        company = self.env.company
+        company.partner_id.tz = 'Europe/Brussels'
+        self.assertEqual(Daily._get_local_date(company, datetime(2024, 3, 1, 23, 30)), date(2024, 3, 2))
+
+        self.env['ir.config_parameter'].sudo().set_param(USE_DAILY_AGGREGATE_PARAM, '1')
+        self.assertTrue(Daily._is_enabled())
+        manager, salesman = self.env['res.users'].create([{
+            'name': f'Daily Aggregate {group}',
+            'login': f'daily_aggregate_{group}',
+            'company_id': company.id,
+            'company_ids': [Command.set(company.ids)],
+            'groups_id': [Command.set([self.env.ref(f'sales_team.{group}').id])],
+        } for group in ('group_sale_salesman_all_leads', 'group_sale_salesman')])
+        local_wizard = self._new_wizard('Europe/Brussels', date(2024, 3, 1), date(2024, 3, 31))
+        utc_wizard = self._new_wizard('UTC', date(2024, 3, 1), date(2024, 3, 31))
+        # The aggregate is only read when its days are the report days
+        self.assertTrue(Daily.with_user(manager)._is_enabled_for(local_wizard, company))
+        self.assertFalse(Daily.with_user(manager)._is_enabled_for(utc_wizard, company))
+        # and by the users seeing all the orders
+        self.assertFalse(Daily.with_user(salesman)._is_enabled_for(local_wizard, company))
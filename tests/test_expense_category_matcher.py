@@ -0,0 +1,43 @@
+from odoo.tests.common import BaseCase
+
+from odoo.addons.sales_store_expense_report.models.store_expense_models import ExpenseCategoryKeywordMatcher
+
+
+class TestExpenseCategoryKeywordMatcher(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.matcher = ExpenseCategoryKeywordMatcher([
+            (1, 'Food Expenses'),
+            (2, 'Cleaning Supplies'),
+            (3, 'General and Other'),
+        ])
+
+    def test_extract_keywords(self):
+        self.assertEqual(ExpenseCategoryKeywordMatcher.extract_keywords('food and the expenses of it'), ['food'])
+        self.assertEqual(ExpenseCategoryKeywordMatcher.extract_keywords('cleaning supplies'), ['cleaning', 'supplies'])
+
+    def test_match(self):
+        self.assertEqual(self.matcher.match('Frozen FOOD pack'), 1)
+        # Substrings match too
+        self.assertEqual(self.matcher.match('Seafood'), 1)
+        self.assertEqual(self.matcher.match('Floor cleaning spray'), 2)
+
+    def test_match_priority(self):
+        # The category listed first wins over the position in the text
+        self.assertEqual(self.matcher.match('Supplies for food'), 1)
+        # The texts are tried in order: the product name before its category
+        self.assertEqual(self.matcher.match('Office supplies', 'Food'), 2)
+        self.assertEqual(self.matcher.match(False, 'Unknown', 'Food'), 1)
+
+    def test_default_category(self):
+        # No keyword found: the "General" / "Other" category, else the first one
+        self.assertEqual(self.matcher.match('Screws'), 3)
+        self.assertEqual(ExpenseCategoryKeywordMatcher([(4, 'Fuel'), (5, 'Rent')]).match('Screws'), 4)
+        self.assertIs(ExpenseCategoryKeywordMatcher([]).match('Food'), False)
+
+    def test_memo(self):
+        self.assertEqual(self.matcher.match('Frozen food'), 1)
+        self.assertEqual(self.matcher._memo, {'Frozen food': 1})
+        self.assertEqual(self.matcher.match('Frozen food'), 1)
+        self.assertEqual(len(self.matcher._memo), 1)
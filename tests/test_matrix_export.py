@@ -0,0 +1,94 @@
+import io
+import tempfile
+import zipfile
+from array import array
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.sales_store_expense_report.models.matrix_export import DenseMatrix, MatrixExporter
+
+MATRIX_DATA = {
+    'rows': [{'id': 1, 'name': 'Food'}, {'id': 2, 'name': 'Drinks'}, {'id': 'total_sales', 'name': 'Total Sales'}],
+    'columns': [{'id': 10, 'name': 'Customer A'}, {'id': 20, 'name': 'Customer B'}],
+    'values': {'1_10': 1.5, '2_20': 2.0, 'total_sales_10': 1.5, 'total_sales_20': 2.0},
+    'row_totals': {1: 1.5, 2: 2.0, 'total_sales': 3.5},
+    'column_totals': {10: 1.5, 20: 2.0},
+    'grand_total': 3.5,
+}
+
+
+class TestMatrixExport(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.matrix = DenseMatrix.from_report_data(MATRIX_DATA)
+
+    def test_dense_matrix(self):
+        self.assertEqual(self.matrix.shape, (3, 2))
+        self.assertEqual(self.matrix.row(0), array('d', [1.5, 0.0]))
+        self.assertEqual(self.matrix.row(1), array('d', [0.0, 2.0]))
+        self.assertEqual(self.matrix.row_totals, array('d', [1.5, 2.0, 3.5]))
+        self.assertEqual(self.matrix.column_totals, array('d', [1.5, 2.0]))
+        self.assertEqual(self.matrix.total_rows, {2})
+
+    def test_iter_lines(self):
+        exporter = MatrixExporter(self.matrix, 'Sales', info=['Company: Test'], label_header='Category')
+        lines = [(kind, label, list(values)) for kind, _style, label, _value_style, values in exporter.iter_lines()]
+        self.assertEqual(lines, [
+            ('title', 'Sales', []),
+            ('info', 'Company: Test', []),
+            ('blank', None, []),
+            ('header', 'Category', ['Customer A', 'Customer B', 'Total']),
+            ('row', 'Food', [1.5, 0.0, 1.5]),
+            ('row', 'Drinks', [0.0, 2.0, 2.0]),
+            ('total', 'Total Sales', [1.5, 2.0, 3.5]),
+            ('total', 'TOTAL', [1.5, 2.0, 3.5]),
+        ])
+
+    def test_iter_lines_without_totals(self):
+        exporter = MatrixExporter(self.matrix, 'Sales', row_totals=False, column_totals=False)
+        lines = [(kind, list(values)) for kind, _style, _label, _value_style, values in exporter.iter_lines(False)]
+        self.assertEqual(lines, [
+            ('header', ['Customer A', 'Customer B']),
+            ('row', [1.5, 0.0]),
+            ('row', [0.0, 2.0]),
+            ('total', [1.5, 2.0]),
+        ])
+
+    def test_csv(self):
+        content = MatrixExporter(self.matrix, 'Sales', label_header='Category').export('csv')
+        self.assertEqual(content.decode().splitlines(), [
+            'Category,Customer A,Customer B,Total',
+            'Food,1.5,0.0,1.5',
+            'Drinks,0.0,2.0,2.0',
+            'Total Sales,1.5,2.0,3.5',
+            'TOTAL,1.5,2.0,3.5',
+        ])
+
+    def test_ods(self):
+        content = MatrixExporter(self.matrix, 'Sales & Drinks').export('ods')
+        with zipfile.ZipFile(io.BytesIO(content)) as ods:
+            self.assertEqual(ods.namelist()[0], 'mimetype')
+            self.assertEqual(ods.read('mimetype'), b'application/vnd.oasis.opendocument.spreadsheet')
+            xml = ods.read('content.xml').decode()
+        self.assertIn('<text:p>Sales &amp; Drinks</text:p>', xml)
+        self.assertIn('office:value="3.5"', xml)
+        # Title, blank line, header, three rows and the totals
+        self.assertEqual(xml.count('<table:table-row>'), 7)
+
+    def test_xlsx(self):
+        content = MatrixExporter(self.matrix, 'Sales').export('xlsx')
+        with zipfile.ZipFile(io.BytesIO(content)) as xlsx:
+            self.assertIn('xl/worksheets/sheet1.xml', xlsx.namelist())
+
+    def test_export_to_path(self):
+        exporter = MatrixExporter(self.matrix, 'Sales', label_header='Category')
+        for fmt in ('csv', 'ods', 'xlsx'):
+            with tempfile.NamedTemporaryFile(suffix=f'.{fmt}') as file:
+                self.assertIsNone(exporter.export(fmt, path=file.name))
+                with open(file.name, 'rb') as written:
+                    content = written.read()
+                if fmt == 'csv':
+                    self.assertEqual(content, exporter.export('csv'))
+                else:
+                    self.assertTrue(zipfile.is_zipfile(io.BytesIO(content)))
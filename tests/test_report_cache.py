@@ -0,0 +1,86 @@
+from array import array
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.sales_store_expense_report.models.sales_report_cache import ReportCube, ReportResultCache
+
+
+class TestReportResultCache(BaseCase):
+
+    def _put(self, cache, key, value, version=1, size=10, max_bytes=100, max_entries=10):
+        cache.put(key, value, version, size, max_bytes=max_bytes, max_entries=max_entries)
+
+    def test_hit_and_miss(self):
+        cache = ReportResultCache()
+        self.assertIsNone(cache.get('a', 1, ttl=60))
+        self._put(cache, 'a', {'total': 1})
+        self.assertEqual(cache.get('a', 1, ttl=60), {'total': 1})
+        self.assertEqual(cache.get_stats(), dict(
+            hits=1, misses=1, evictions=0, expirations=0, invalidations=0, entries=1, bytes=10))
+
+    def test_version_invalidates(self):
+        cache = ReportResultCache()
+        self._put(cache, 'a', 1)
+        self._put(cache, 'b', 2)
+        self.assertIsNone(cache.get('a', 2, ttl=60))
+        # Storing an entry of a newer version drops the older ones
+        self._put(cache, 'c', 3, version=2)
+        self.assertEqual(list(cache.entries), ['c'])
+        self.assertEqual(cache.size, 10)
+        self.assertEqual(cache.stats['invalidations'], 2)
+
+    def test_ttl_expires(self):
+        cache = ReportResultCache()
+        self._put(cache, 'a', 1)
+        self.assertIsNone(cache.get('a', 1, ttl=-1))
+        self.assertEqual(cache.stats['expirations'], 1)
+        self.assertFalse(cache.entries)
+
+    def test_lru_eviction(self):
+        cache = ReportResultCache()
+        self._put(cache, 'a', 1, max_entries=2)
+        self._put(cache, 'b', 2, max_entries=2)
+        cache.get('a', 1, ttl=60)
+        self._put(cache, 'c', 3, max_entries=2)
+        self.assertEqual(list(cache.entries), ['a', 'c'])
+        # Evicted by size as well
+        self._put(cache, 'd', 4, size=95, max_entries=10)
+        self.assertEqual(list(cache.entries), ['d'])
+        self.assertEqual(cache.stats['evictions'], 3)
+
+    def test_too_large_not_stored(self):
+        cache = ReportResultCache()
+        self._put(cache, 'a', 1, size=101)
+        self.assertFalse(cache.entries)
+        self.assertEqual(cache.size, 0)
+
+
+class TestReportCube(BaseCase):
+
+    def setUp(self):
+        super().setUp()
+        self.cube = ReportCube([
+            (1, 10, 5.0, 2),
+            (1, 20, 3.0, 1),
+            (2, 10, 4.0, 1),
+            (None, 30, 1.0, 1),
+        ])
+
+    def test_column_ids(self):
+        self.assertEqual(self.cube.column_ids, array('q', [10, 20, 30]))
+        # Columns of the period without cells
+        cube = ReportCube([(1, 10, 5.0, 2)], column_ids=[40, 10])
+        self.assertEqual(cube.column_ids, array('q', [10, 40]))
+
+    def test_slice(self):
+        self.assertEqual(self.cube.slice(), [
+            (1, 10, 5.0, 2), (1, 20, 3.0, 1), (2, 10, 4.0, 1), (0, 30, 1.0, 1),
+        ])
+        self.assertEqual(self.cube.slice([1]), [(1, 10, 5.0, 2), (1, 20, 3.0, 1)])
+        self.assertEqual(self.cube.slice(None, [10]), [(1, 10, 5.0, 2), (2, 10, 4.0, 1)])
+        self.assertEqual(self.cube.slice([2], [20]), [])
+        self.assertEqual(self.cube.slice([0]), [(0, 30, 1.0, 1)])
+
+    def test_size(self):
+        # Four 8-byte values per cell, plus the three column ids
+        self.assertEqual(self.cube.get_size(), 4 * 4 * 8 + 3 * 8)
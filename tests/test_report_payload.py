@@ -0,0 +1,74 @@
+import base64
+import gzip
+import json
+
+from odoo.tests.common import BaseCase
+
+from odoo.addons.sales_store_expense_report.models import report_payload
+
+
+class TestReportPayload(BaseCase):
+
+    def test_encode_matrix(self):
+        matrix = {
+            'rows': [{'id': 1, 'name': 'Food'}, {'id': 2, 'name': 'Drinks'}],
+            'columns': [{'id': 10, 'name': 'Customer A'}, {'id': 20, 'name': 'Customer B'}],
+            'values': {'1_10': 1.234, '1_20': 0.0, '2_20': 2.0},
+            'row_totals': {1: 1.234, 2: 2.0},
+            'column_totals': {10: 1.234, 20: 2.0},
+            'grand_total': 3.234,
+            'has_data': True,
+        }
+        self.assertEqual(report_payload.encode_matrix(matrix), {
+            'format': 'matrix',
+            'version': report_payload.PAYLOAD_VERSION,
+            'rows': {'ids': [1, 2], 'names': ['Food', 'Drinks']},
+            'columns': {'ids': [10, 20], 'names': ['Customer A', 'Customer B']},
+            # Only the non-zero cells
+            'cells': {'row': [0, 1], 'column': [0, 1], 'value': [1.23, 2.0]},
+            'row_totals': [1.23, 2.0],
+            'column_totals': [1.23, 2.0],
+            'grand_total': 3.23,
+            'has_data': True,
+        })
+
+    def test_encode_matrix_series(self):
+        matrix = {
+            'rows': [{'id': 1, 'name': 'Food'}],
+            'columns': [{'id': 10, 'name': 'Customer A'}],
+            'values': {'1_10': 3.0},
+            'series': {'1_10': [1.0, 2.0], '1_total': [1.0, 2.0], '2_10': [0.0, 0.0]},
+        }
+        payload = report_payload.encode_matrix(matrix)
+        # Column -1 is the row total
+        self.assertEqual(payload['series'], {'row': [0, 0], 'column': [0, -1], 'values': [[1.0, 2.0], [1.0, 2.0]]})
+
+    def test_encode_lines(self):
+        lines = [
+            {'order_reference': 'S1', 'customer_name': 'A', 'total': 1.0},
+            {'order_reference': 'S2', 'customer_name': 'B', 'total': 2.0},
+            {'order_reference': 'S3', 'customer_name': 'A', 'total': 3.0},
+        ]
+        payload = report_payload.encode_lines(lines, ['order_reference', 'customer_name'], ['customer_name'])
+        self.assertEqual(payload, {
+            'format': 'lines',
+            'version': report_payload.PAYLOAD_VERSION,
+            'length': 3,
+            'columns': ['order_reference', 'customer_name'],
+            'data': {'order_reference': ['S1', 'S2', 'S3'], 'customer_name': [0, 1, 0]},
+            'dictionaries': {'customer_name': ['A', 'B']},
+        })
+
+    def test_compress(self):
+        payload = {'format': 'matrix', 'grand_total': 5.0, 'rows': {'ids': list(range(100))}}
+        self.assertIs(report_payload.compress(payload), payload)
+
+        envelope = report_payload.compress(payload, threshold=10)
+        self.assertEqual(envelope['encoding'], 'gzip')
+        self.assertEqual(envelope['format'], 'matrix')
+        self.assertEqual(envelope['grand_total'], 5.0)
+        self.assertEqual(json.loads(gzip.decompress(base64.b64decode(envelope['data']))), payload)
+
+    def test_dumps(self):
+        self.assertEqual(report_payload.dumps({'format': 'lines', 'length': 0}), '{"format":"lines","length":0}')
+        self.assertEqual(json.loads(report_payload.dumps({'format': 'lines'}, threshold=1))['encoding'], 'gzip')
@@ -0,0 +1,45 @@
+from datetime import date
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestReportQueries(TransactionCase):
+    """
+    The report queries of every wizard must read the large tables through their
+    indexes (see _explain_report_queries).
+
+    The seeded dataset is the smallest benchmark volume: on it the planner rightly
+    prefers sequential scans, so they are disabled for the transaction. A sequential
+    scan left in a plan then means that no index can serve the query.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['sales.report.benchmark']._seed('10k', date_from=date(2024, 1, 1), date_to=date(2024, 12, 31))
+        cls.env.flush_all()
+        cls.env.cr.execute("ANALYZE sale_order, sale_order_line, store_expense")
+
+    def _assert_no_seq_scan(self, model, **filters):
+        wizard = self.env[model].create(dict(
+            filters, company_id=self.env.company.id, date_from=date(2024, 6, 1), date_to=date(2024, 6, 30)))
+        # Reverted with the savepoint of the test
+        self.env.cr.execute("SET LOCAL enable_seqscan = off")
+        self.assertEqual(wizard._explain_report_queries(), [], f"Sequential scans in {model} {filters}")
+
+    def test_store_expense_category_queries(self):
+        self._assert_no_seq_scan('sales.store.expense.category.wizard')
+
+    def test_store_expense_category_trend_queries(self):
+        self._assert_no_seq_scan(
+            'sales.store.expense.category.wizard', trend_interval='month', comparison='previous_year')
+
+    def test_store_expense_category_combined_queries(self):
+        self._assert_no_seq_scan('sales.store.expense.category.wizard', report_mode='combined')
+
+    def test_product_category_queries(self):
+        self._assert_no_seq_scan('sales.product.category.wizard')
+
+    def test_sales_lines_queries(self):
+        self._assert_no_seq_scan('sales.lines.report.wizard')